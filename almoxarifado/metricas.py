@@ -0,0 +1,217 @@
+"""
+Instrumentação das requisições: latência, número de consultas e tempo de banco por view.
+
+O MetricasMiddleware mede cada requisição e acumula os números em memória, no
+próprio processo; a view ``metricas`` expõe o acumulado no formato texto do
+Prometheus. Requisições que passam de METRICAS_ORCAMENTO_CONSULTAS consultas
+geram um aviso no log com a consulta mais repetida, o sinal típico de N+1.
+
+O custo por consulta é uma chamada de função e duas leituras de relógio, e por
+requisição uma atualização de contadores sob trava; pode ficar ligado em produção.
+Com vários processos (ex.: gunicorn), cada um expõe apenas os próprios números.
+Em respostas em fluxo (exportações), a medição termina quando o envio começa.
+
+O acesso a /metrics é de usuários da equipe (is_staff) ou de quem envia o
+token de METRICAS_TOKEN no cabeçalho ``Authorization: Bearer <token>`` (o
+``bearer_token`` da configuração de coleta do Prometheus). O endereço de origem
+não é usado: atrás de um proxy reverso, REMOTE_ADDR é sempre o do proxy.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Métodos fora desta lista viram "other": o método vem do cliente e não pode criar séries novas
+METODOS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class Histograma:
+    """Histograma cumulativo no estilo do Prometheus, com limites fixos."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def acumulados(self):
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield limite, acumulado
+        yield "+Inf", self.total
+
+
+class _MetricasView:
+    def __init__(self):
+        self.latencia = Histograma(LIMITES_LATENCIA)
+        self.consultas = Histograma(LIMITES_CONSULTAS)
+        self.tempo_banco = 0.0
+        self.acima_orcamento = 0
+
+
+class Registro:
+    """Números acumulados por (view, método, classe do status)."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._views = {}
+
+    def registrar(self, rotulos, segundos, consultas, tempo_banco, acima_orcamento):
+        with self._trava:
+            metricas = self._views.get(rotulos)
+            if metricas is None:
+                metricas = self._views[rotulos] = _MetricasView()
+            metricas.latencia.observar(segundos)
+            metricas.consultas.observar(consultas)
+            metricas.tempo_banco += tempo_banco
+            metricas.acima_orcamento += acima_orcamento
+
+    def limpar(self):
+        with self._trava:
+            self._views.clear()
+
+    def texto_prometheus(self):
+        with self._trava:
+            itens = sorted(self._views.items())
+            linhas = []
+            _histograma(
+                linhas,
+                "almox_http_request_duration_seconds",
+                "Latência das requisições por view, em segundos.",
+                [(rotulos, metricas.latencia) for rotulos, metricas in itens],
+            )
+            _histograma(
+                linhas,
+                "almox_db_queries_per_request",
+                "Consultas ao banco por requisição.",
+                [(rotulos, metricas.consultas) for rotulos, metricas in itens],
+            )
+            linhas.append("# HELP almox_db_duration_seconds_total Tempo total gasto no banco, em segundos.")
+            linhas.append("# TYPE almox_db_duration_seconds_total counter")
+            for rotulos, metricas in itens:
+                linhas.append(f"almox_db_duration_seconds_total{{{_rotulos(rotulos)}}} {metricas.tempo_banco:.6f}")
+            linhas.append(
+                "# HELP almox_requests_over_query_budget_total Requisições acima do orçamento de consultas."
+            )
+            linhas.append("# TYPE almox_requests_over_query_budget_total counter")
+            for rotulos, metricas in itens:
+                linhas.append(f"almox_requests_over_query_budget_total{{{_rotulos(rotulos)}}} {metricas.acima_orcamento}")
+        return "\n".join(linhas) + "\n"
+
+
+def _rotulos(rotulos, **extras):
+    view, metodo, status = rotulos
+    pares = {"view": view, "method": metodo, "status": status, **extras}
+    return ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares.items())
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histograma(linhas, nome, ajuda, series):
+    linhas.append(f"# HELP {nome} {ajuda}")
+    linhas.append(f"# TYPE {nome} histogram")
+    for rotulos, histograma in series:
+        for limite, acumulado in histograma.acumulados():
+            linhas.append(f"{nome}_bucket{{{_rotulos(rotulos, le=limite)}}} {acumulado}")
+        linhas.append(f"{nome}_sum{{{_rotulos(rotulos)}}} {histograma.soma:.6f}")
+        linhas.append(f"{nome}_count{{{_rotulos(rotulos)}}} {histograma.total}")
+
+
+registro = Registro()
+
+
+class _Medidor:
+    """execute_wrapper que conta as consultas, soma o tempo e guarda quantas vezes cada SQL se repetiu."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+        self.repeticoes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.consultas += 1
+            self.repeticoes[sql] = self.repeticoes.get(sql, 0) + 1
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.ativo = getattr(settings, "METRICAS_ATIVAS", True)
+        self.orcamento = getattr(settings, "METRICAS_ORCAMENTO_CONSULTAS", 50)
+
+    def __call__(self, request):
+        if not self.ativo:
+            return self.get_response(request)
+
+        medidor = _Medidor()
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medidor))
+            response = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+
+        correspondencia = getattr(request, "resolver_match", None)
+        # Só o nome da rota vira rótulo, nunca o caminho: mantém a cardinalidade limitada
+        view = (correspondencia.view_name if correspondencia else None) or "nao_resolvida"
+        acima = self.orcamento is not None and medidor.consultas > self.orcamento
+        if acima:
+            sql, vezes = max(medidor.repeticoes.items(), key=lambda par: par[1])
+            logger.warning(
+                "%s %s (%s) fez %d consultas (orçamento %d); mais repetida (%dx): %s",
+                request.method,
+                request.path,
+                view,
+                medidor.consultas,
+                self.orcamento,
+                vezes,
+                sql[:300],
+            )
+        metodo = request.method if request.method in METODOS else "other"
+        registro.registrar(
+            (view, metodo, f"{response.status_code // 100}xx"),
+            segundos,
+            medidor.consultas,
+            medidor.tempo,
+            int(acima),
+        )
+        return response
+
+
+def metricas(request):
+    """Números acumulados neste processo, no formato texto do Prometheus."""
+    usuario = getattr(request, "user", None)
+    if not (usuario and usuario.is_staff) and not _token_valido(request):
+        return HttpResponseForbidden("Acesso restrito.")
+    return HttpResponse(registro.texto_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _token_valido(request):
+    token = getattr(settings, "METRICAS_TOKEN", "")
+    if not token:
+        return False
+    tipo, _, enviado = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    return tipo.lower() == "bearer" and hmac.compare_digest(enviado.strip().encode(), token.encode())
@@ -0,0 +1,121 @@
+"""
+Roteamento de leituras para a réplica do banco (alias "replica" em DATABASES).
+
+Só as views marcadas com ``@somente_leitura`` leem da réplica, e apenas em
+GET/HEAD; todo o resto (escritas, formulários, APIs usadas durante uma
+movimentação) continua no banco principal. A réplica fica alguns instantes
+atrás do principal, então:
+
+- dentro de uma transação, as leituras vão ao principal, junto com as escritas;
+- depois que uma requisição grava algo, o ReplicaMiddleware marca o navegador
+  com um cookie e, por REPLICA_ATRASO_MAXIMO segundos, as leituras daquele
+  usuário voltam ao principal (ele vê o que acabou de gravar);
+- valores guardados em cache (indicadores do dashboard) são calculados no
+  principal com ``primario()``, para não guardar por minutos um retrato
+  defasado.
+
+Sem o alias "replica" configurado, o roteador não muda nada.
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+COOKIE_PRIMARIO = "almox_primario"
+
+# Estado da requisição em curso: {"replica": bool, "escreveu": bool}; None fora de requisições
+_estado = contextvars.ContextVar("almox_roteamento", default=None)
+
+
+def replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+def somente_leitura(view):
+    """Marca a view como apta a ler da réplica."""
+    view.somente_leitura = True
+    return view
+
+
+@contextmanager
+def primario():
+    """Força as leituras do bloco para o banco principal."""
+    estado = _estado.get()
+    if estado is None:
+        yield
+        return
+    anterior = estado["replica"]
+    estado["replica"] = False
+    try:
+        yield
+    finally:
+        estado["replica"] = anterior
+
+
+def no_primario(funcao):
+    """Decorador equivalente a ``with primario():`` em volta da função."""
+
+    @functools.wraps(funcao)
+    def envolvida(*args, **kwargs):
+        with primario():
+            return funcao(*args, **kwargs)
+
+    return envolvida
+
+
+class RoteadorReplica:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if not estado or not estado["replica"] or estado["escreveu"]:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            # Daqui em diante a requisição lê o que gravou
+            estado["escreveu"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.ativo = replica_configurada()
+        self.atraso_maximo = getattr(settings, "REPLICA_ATRASO_MAXIMO", 5)
+
+    def __call__(self, request):
+        if not self.ativo:
+            return self.get_response(request)
+        estado = {"replica": False, "escreveu": False}
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        if estado["escreveu"]:
+            response.set_cookie(COOKIE_PRIMARIO, "1", max_age=self.atraso_maximo, httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado.get()
+        if estado is None:
+            return None
+        estado["replica"] = (
+            getattr(view_func, "somente_leitura", False)
+            and request.method in ("GET", "HEAD")
+            and COOKIE_PRIMARIO not in request.COOKIES
+        )
+        return None
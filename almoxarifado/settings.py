@@ -1,5 +1,8 @@
 from pathlib import Path
 import os
+
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -26,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'almoxarifado.metricas.MetricasMiddleware',
+    'almoxarifado.roteador.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,12 +60,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'almoxarifado.wsgi.application'
 
-DATABASES = {
-    'default': {
+# Banco de dados, configurado por variáveis de ambiente.
+# ALMOX_DB_ENGINE: "sqlite" (padrão) ou "postgresql" (exige requirements-postgresql.txt).
+DB_ENGINE = os.environ.get('ALMOX_DB_ENGINE', 'sqlite')
+# Perfil de produção do SQLite: conexões persistentes e os PRAGMAs de SQLITE_PRAGMAS,
+# aplicados em cada conexão por almoxarifado/sqlite.py. ALMOX_SQLITE_AJUSTADO=0 volta aos padrões.
+SQLITE_AJUSTADO = os.environ.get('ALMOX_SQLITE_AJUSTADO', '1') != '0'
+if DB_ENGINE == 'postgresql':
+    # O Django 4.2 não tem pool próprio: cada processo mantém suas conexões abertas por
+    # CONN_MAX_AGE segundos. Com ALMOX_DB_POOL=pgbouncer, HOST/PORT apontam para o PgBouncer
+    # em modo transação, que divide poucas conexões reais entre todos os processos.
+    DB_POOL = os.environ.get('ALMOX_DB_POOL', '')
+    _PRINCIPAL = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('ALMOX_DB_NAME', 'almoxarifado'),
+        'USER': os.environ.get('ALMOX_DB_USER', 'almoxarifado'),
+        'PASSWORD': os.environ.get('ALMOX_DB_PASSWORD', ''),
+        'HOST': os.environ.get('ALMOX_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('ALMOX_DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('ALMOX_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # Em modo transação o PgBouncer não mantém cursores no servidor entre transações
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOL == 'pgbouncer',
+        'OPTIONS': {'connect_timeout': int(os.environ.get('ALMOX_DB_CONNECT_TIMEOUT', 5))},
+    }
+elif DB_ENGINE == 'sqlite':
+    _PRINCIPAL = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('ALMOX_DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        # Segundos que uma conexão é reaproveitada entre requisições (0 = uma por requisição)
+        'CONN_MAX_AGE': int(os.environ.get('ALMOX_DB_CONN_MAX_AGE', 600 if SQLITE_AJUSTADO else 0)),
+        'CONN_HEALTH_CHECKS': SQLITE_AJUSTADO,
     }
-}
+else:
+    raise ImproperlyConfigured(f'ALMOX_DB_ENGINE inválido: {DB_ENGINE!r} (use "sqlite" ou "postgresql").')
+DATABASES = {'default': _PRINCIPAL}
+# Réplica de leitura (ver almoxarifado/roteador.py): ativada por ALMOX_DB_REPLICA_HOST ou
+# ALMOX_DB_REPLICA_NAME. Para testar localmente, aponte ALMOX_DB_REPLICA_NAME para o mesmo banco.
+if os.environ.get('ALMOX_DB_REPLICA_HOST') or os.environ.get('ALMOX_DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **_PRINCIPAL,
+        'NAME': os.environ.get('ALMOX_DB_REPLICA_NAME', _PRINCIPAL['NAME']),
+        'HOST': os.environ.get('ALMOX_DB_REPLICA_HOST', _PRINCIPAL.get('HOST', '')),
+        'PORT': os.environ.get('ALMOX_DB_REPLICA_PORT', _PRINCIPAL.get('PORT', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['almoxarifado.roteador.RoteadorReplica']
+# Segundos em que o usuário lê do principal depois de gravar; deve cobrir o atraso da réplica
+REPLICA_ATRASO_MAXIMO = int(os.environ.get('ALMOX_DB_REPLICA_ATRASO', 5))
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('ALMOX_SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.environ.get('ALMOX_SQLITE_SYNCHRONOUS', 'normal'),
+    # Milissegundos que uma escrita espera pelo bloqueio antes de "database is locked"
+    'busy_timeout': int(os.environ.get('ALMOX_SQLITE_BUSY_TIMEOUT', 10000)),
+    'mmap_size': int(os.environ.get('ALMOX_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negativo: tamanho em KiB (64 MiB por conexão)
+    'cache_size': int(os.environ.get('ALMOX_SQLITE_CACHE_SIZE', -64000)),
+    'temp_store': os.environ.get('ALMOX_SQLITE_TEMP_STORE', 'memory'),
+} if SQLITE_AJUSTADO else {}
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -69,6 +126,49 @@ TIME_ZONE = 'America/Cuiaba'
 USE_I18N = True
 USE_TZ = True
 
+# Cache dos indicadores do dashboard, séries de saldo e reposição: "locmem" (padrão), "file" ou "db".
+# O "locmem" é da memória de cada processo: com vários workers (ou para aquecer o cache com
+# calcular_reposicao) use "file" ou "db", compartilhados. O "db" exige `python manage.py createcachetable`.
+KPI_CACHE_BACKEND = os.environ.get('ALMOX_KPI_CACHE', 'locmem')
+_KPI_CACHES = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'almoxarifado-kpis',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('ALMOX_KPI_CACHE_DIR', str(BASE_DIR / 'cache' / 'kpis')),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'almoxarifado_cache',
+    },
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'almoxarifado-default',
+    },
+    'kpis': {
+        **_KPI_CACHES[KPI_CACHE_BACKEND],
+        'TIMEOUT': int(os.environ.get('ALMOX_KPI_CACHE_TIMEOUT', 300)),
+    },
+}
+
+# Sugestões de reposição (estoque/reposicao.py): padrões do relatório e tempo em cache
+REPOSICAO_JANELA_DIAS = int(os.environ.get('ALMOX_REPOSICAO_JANELA', 90))
+REPOSICAO_PRAZO_DIAS = int(os.environ.get('ALMOX_REPOSICAO_PRAZO', 7))
+REPOSICAO_COBERTURA_DIAS = int(os.environ.get('ALMOX_REPOSICAO_COBERTURA', 30))
+REPOSICAO_FATOR_SEGURANCA = float(os.environ.get('ALMOX_REPOSICAO_FATOR', 1.65))
+REPOSICAO_CACHE_TIMEOUT = int(os.environ.get('ALMOX_REPOSICAO_CACHE_TIMEOUT', 900))
+
+# Instrumentação (almoxarifado/metricas.py): latência e consultas por view, expostas em /metrics
+METRICAS_ATIVAS = os.environ.get('ALMOX_METRICAS', '1') != '0'
+METRICAS_ORCAMENTO_CONSULTAS = int(os.environ.get('ALMOX_METRICAS_ORCAMENTO', 50))
+# /metrics fica restrito à equipe (is_staff); o coletor do Prometheus se identifica com este token
+# (Authorization: Bearer <token>). Vazio: só a equipe.
+METRICAS_TOKEN = os.environ.get('ALMOX_METRICAS_TOKEN', '')
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
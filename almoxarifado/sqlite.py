@@ -0,0 +1,52 @@
+"""
+Ajustes do SQLite aplicados em cada nova conexão (sinal connection_created).
+
+Os PRAGMAs vêm de SQLITE_PRAGMAS (ver settings) e são aplicados na ordem do
+dicionário. Com journal_mode=WAL, leitores não esperam pelo escritor e o
+escritor não espera pelos leitores; synchronous=NORMAL só sincroniza o disco
+nos checkpoints, o que em WAL não arrisca corromper o banco (após uma queda de
+energia, no máximo as últimas transações confirmadas se perdem). O WAL exige
+que todos os processos estejam na mesma máquina: não use com o banco em
+compartilhamento de rede.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Sem efeito (ou sem sentido) em bancos em memória, como os de teste
+_SOMENTE_EM_ARQUIVO = {"journal_mode", "mmap_size"}
+_NOME = re.compile(r"^[a-z_]+$")
+_VALOR = re.compile(r"^-?\w+$")
+
+
+def pragmas():
+    """PRAGMAs configurados, validados: os valores vêm de variáveis de ambiente e entram direto no SQL."""
+    configurados = getattr(settings, "SQLITE_PRAGMAS", {})
+    for nome, valor in configurados.items():
+        if not _NOME.match(nome) or not _VALOR.match(str(valor)):
+            raise ImproperlyConfigured(f"PRAGMA inválido em SQLITE_PRAGMAS: {nome}={valor!r}")
+    return configurados
+
+
+def aplicar_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    em_memoria = connection.is_in_memory_db()
+    # Direto na conexão do sqlite3: não passa pelos wrappers de consulta nem conta nas métricas da requisição
+    for nome, valor in pragmas().items():
+        if em_memoria and nome in _SOMENTE_EM_ARQUIVO:
+            continue
+        connection.connection.execute(f"PRAGMA {nome} = {valor}")
+
+
+def estado(connection, nomes=None):
+    """Valores em vigor na conexão para os PRAGMAs informados (padrão: os configurados)."""
+    connection.ensure_connection()
+    valores = {}
+    for nome in nomes or pragmas():
+        if _NOME.match(nome):
+            # Alguns PRAGMAs não devolvem linha em bancos em memória
+            linha = connection.connection.execute(f"PRAGMA {nome}").fetchone()
+            valores[nome] = linha[0] if linha else None
+    return valores
@@ -2,8 +2,11 @@ from django.contrib import admin
 from django.urls import include, path
 from django.contrib.auth import views as auth_views
 
+from . import metricas
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metricas.metricas, name="metricas"),
     path("accounts/login/", auth_views.LoginView.as_view(template_name="registration/login.html"), name="login"),
     path("accounts/logout/", auth_views.LogoutView.as_view(next_page="login"), name="logout"),
     path("", include("estoque.urls")),
@@ -1,7 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Estoque, Fornecedor, Inventario, InventarioItem, Item, ItemEstoque, Movimentacao, Usuario
+from .models import (
+    ClassificacaoItem,
+    Estoque,
+    Fornecedor,
+    Inventario,
+    InventarioItem,
+    Item,
+    ItemEstoque,
+    Movimentacao,
+    MovimentacaoDiaria,
+    SaldoFechamento,
+    Usuario,
+)
 
 
 @admin.register(Usuario)
@@ -22,36 +34,72 @@ class FornecedorAdmin(admin.ModelAdmin):
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
-    list_display = ("codigo", "descricao", "unidade_medida", "valor_unitario", "fornecedor", "estoque_minimo", "estoque_maximo", "ativo")
+    list_display = ("codigo", "descricao", "unidade_medida", "valor_unitario", "qtde_total", "fornecedor", "estoque_minimo", "estoque_maximo", "ativo")
     search_fields = ("codigo", "descricao", "fornecedor__nome")
     list_filter = ("ativo", "fornecedor")
 
 
 @admin.register(Estoque)
 class EstoqueAdmin(admin.ModelAdmin):
-    list_display = ("localizacao", "qtde_atual", "nivel_minimo")
+    list_display = ("localizacao", "total", "nivel_minimo")
     search_fields = ("localizacao",)
+    readonly_fields = ("qtde_atual",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(total_estoque=Estoque._total_expr())
+
+    @admin.display(description="Qtde atual", ordering="total_estoque")
+    def total(self, obj):
+        return obj.total_estoque
 
 
 @admin.register(ItemEstoque)
 class ItemEstoqueAdmin(admin.ModelAdmin):
-    list_display = ("item", "estoque", "qtde")
+    list_display = ("item", "estoque", "qtde", "custo_medio")
     list_filter = ("estoque",)
 
 
 class InventarioItemInline(admin.TabularInline):
     model = InventarioItem
     extra = 0
+    readonly_fields = ("saldo_sistema", "diferenca")
 
 
 @admin.register(Inventario)
 class InventarioAdmin(admin.ModelAdmin):
-    list_display = ("data_inventario", "usuario")
+    list_display = ("data_inventario", "usuario", "encerrado_em", "estoque_encerramento")
+    readonly_fields = ("encerrado_em", "estoque_encerramento")
     inlines = [InventarioItemInline]
 
 
 @admin.register(Movimentacao)
 class MovimentacaoAdmin(admin.ModelAdmin):
-    list_display = ("item", "estoque", "tipo_movimentacao", "quantidade", "usuario", "data_movimentacao")
+    list_display = ("item", "estoque", "tipo_movimentacao", "quantidade", "custo_unitario", "usuario", "data_movimentacao")
     list_filter = ("tipo_movimentacao", "estoque")
     search_fields = ("item__descricao", "observacao")
+
+
+@admin.register(SaldoFechamento)
+class SaldoFechamentoAdmin(admin.ModelAdmin):
+    list_display = ("data", "item", "estoque", "qtde")
+    list_filter = ("data", "estoque")
+    list_select_related = ("item", "estoque")
+
+
+@admin.register(MovimentacaoDiaria)
+class MovimentacaoDiariaAdmin(admin.ModelAdmin):
+    list_display = ("data", "item", "estoque", "tipo_movimentacao", "quantidade", "valor", "movimentacoes")
+    list_filter = ("tipo_movimentacao", "estoque")
+    list_select_related = ("item", "estoque")
+    # Mantido pelas movimentações; correções passam por reconstruir_resumo_diario
+    readonly_fields = ("data", "item", "estoque", "tipo_movimentacao", "quantidade", "valor", "movimentacoes")
+
+
+@admin.register(ClassificacaoItem)
+class ClassificacaoItemAdmin(admin.ModelAdmin):
+    list_display = ("item", "classe_abc", "classe_xyz", "valor_consumo", "coeficiente_variacao", "calculado_em")
+    list_filter = ("classe_abc", "classe_xyz")
+    list_select_related = ("item",)
+    search_fields = ("item__codigo", "item__descricao")
+    # Recalculada em lote por classificar_itens
+    readonly_fields = ("item", "classe_abc", "classe_xyz", "valor_consumo", "coeficiente_variacao", "calculado_em")
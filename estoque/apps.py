@@ -5,6 +5,14 @@ class EstoqueConfig(AppConfig):
     name = 'estoque'
 
     def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from almoxarifado.sqlite import aplicar_pragmas, pragmas
+
+        # Valida já na subida: o erro na primeira conexão seria engolido pelo try abaixo
+        pragmas()
+        connection_created.connect(aplicar_pragmas, dispatch_uid="almoxarifado.sqlite.aplicar_pragmas")
+
         # Try to create groups if possible (safe to fail during migrations)
         try:
             from django.contrib.auth.models import Group
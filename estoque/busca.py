@@ -0,0 +1,146 @@
+"""
+Busca de itens por termos normalizados.
+
+Código, descrição e unidade de cada item são quebrados em termos sem acentos e
+em minúsculas, gravados em ItemTermo. Cada palavra digitada casa como prefixo
+de algum termo pelo índice (termo, campo, item), sem varrer a tabela de itens.
+
+A relevância (ver ``relevancia``) põe primeiro o item cujo código é a própria
+consulta, depois os códigos que começam por ela e, por fim, os que casam pela
+descrição, pela unidade ou por partes do código.
+"""
+import re
+import unicodedata
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
+
+from .models import Item, ItemTermo
+
+_PALAVRAS = re.compile(r"[0-9a-z]+")
+MAX_PALAVRAS = 6
+
+
+def rotulo(item):
+    """Texto exibido para o item nos campos de autocomplete."""
+    return f"{item.codigo} - {item.descricao}" if item.codigo else item.descricao
+
+
+def normalizar(texto):
+    """Remove acentos e converte para minúsculas: 'Lâmpada LED' -> 'lampada led'."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold().strip()
+
+
+def palavras(texto):
+    return _PALAVRAS.findall(normalizar(texto))
+
+
+def termos_do_item(codigo, descricao, unidade_medida):
+    """Conjunto de (termo, campo) indexados para um item."""
+    termos = set()
+    codigo_normalizado = normalizar(codigo)
+    if codigo_normalizado:
+        termos.add((codigo_normalizado[:100], ItemTermo.Campo.CODIGO))
+    termos.update((palavra[:100], ItemTermo.Campo.CODIGO) for palavra in palavras(codigo))
+    termos.update((palavra[:100], ItemTermo.Campo.DESCRICAO) for palavra in palavras(descricao))
+    termos.update((palavra[:100], ItemTermo.Campo.UNIDADE) for palavra in palavras(unidade_medida))
+    return termos
+
+
+def indexar_itens(itens):
+    """Regrava os termos de busca dos itens informados."""
+    itens = list(itens)
+    linhas = [
+        (item.pk, termo, campo)
+        for item in itens
+        for termo, campo in sorted(termos_do_item(item.codigo, item.descricao, item.unidade_medida))
+    ]
+    conexao = connections[router.db_for_write(ItemTermo)]
+    tabela = conexao.ops.quote_name(ItemTermo._meta.db_table)
+    colunas = ", ".join(conexao.ops.quote_name(ItemTermo._meta.get_field(nome).column) for nome in ("item", "termo", "campo"))
+    with transaction.atomic(using=conexao.alias):
+        ItemTermo.objects.filter(item__in=[item.pk for item in itens]).delete()
+        # MELHORIA: executemany direto; instanciar um ItemTermo por termo custava mais que a própria gravação
+        with conexao.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {tabela} ({colunas}) VALUES (%s, %s, %s)", linhas)
+
+
+def _prefixo(palavra):
+    """
+    Termos que começam por ``palavra``.
+
+    No SQLite o LIKE do ``startswith`` não usa o índice, cuja colação é binária;
+    nela a ordem é a dos códigos dos caracteres e o intervalo de ``palavra`` até
+    ela com o último caractere seguinte contém exatamente os termos com esse
+    prefixo. Nos demais bancos vale o ``startswith``, que não depende da colação
+    (no PostgreSQL, atendido pelo índice varchar_pattern_ops da migração 0015).
+    """
+    if connections[router.db_for_read(ItemTermo)].vendor == "sqlite":
+        return Q(termo__gte=palavra, termo__lt=palavra[:-1] + chr(ord(palavra[-1]) + 1))
+    return Q(termo__startswith=palavra)
+
+
+def buscar(consulta):
+    """
+    Termos que casam com ``consulta`` e exigem todas as palavras (E lógico).
+
+    A palavra mais longa — em geral a mais seletiva — conduz a leitura pelo
+    índice; as demais são conferidas com EXISTS pelo índice de item, que tem
+    poucos termos por item. Retorna None se a consulta não tiver palavras.
+    """
+    lista = sorted(dict.fromkeys(palavras(consulta)), key=len, reverse=True)[:MAX_PALAVRAS]
+    if not lista:
+        return None
+    termos = ItemTermo.objects.filter(_prefixo(lista[0]))
+    for palavra in lista[1:]:
+        termos = termos.filter(
+            Exists(ItemTermo.objects.filter(_prefixo(palavra), item_id=OuterRef("item_id")))
+        )
+    return termos.order_by("termo", "campo", "item_id")
+
+
+def relevancia(consulta):
+    """
+    Expressão com a faixa de relevância de cada item para ``consulta``: 0 se o
+    código é a própria consulta, 1 se começa por ela e 2 nos demais casos.
+
+    Serve para ordenar itens já filtrados pela busca; não restringe nada.
+    """
+    consulta = consulta.strip()
+    return Case(
+        When(codigo__iexact=consulta, then=Value(0)),
+        When(codigo__istartswith=consulta, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+
+
+def buscar_itens(consulta, limite=15):
+    """
+    Itens mais relevantes para ``consulta``, do mais para o menos relevante.
+
+    Dentro da mesma faixa de ``relevancia`` vale a ordem do índice de termos:
+    quem tem um termo idêntico à palavra vem antes de quem só começa por ela.
+    """
+    candidatos = []
+    consulta_normalizada = normalizar(consulta)
+    if consulta_normalizada:
+        # O código exato pelo índice único; entre os prefixos ele poderia ficar atrás de partes de outros códigos
+        candidatos.extend(
+            Item.objects.filter(codigo__in={consulta.strip(), consulta.strip().upper()}).values_list("pk", flat=True)
+        )
+        candidatos.extend(
+            ItemTermo.objects.filter(_prefixo(consulta_normalizada), campo=ItemTermo.Campo.CODIGO)
+            .order_by("termo", "campo", "item_id")
+            .values_list("item_id", flat=True)[:limite]
+        )
+    termos = buscar(consulta)
+    if termos is not None:
+        # Um item pode casar por mais de um termo; lê uma folga e remove repetidos
+        candidatos.extend(termos.values_list("item_id", flat=True)[: limite * 3])
+    posicao = {pk: indice for indice, pk in enumerate(dict.fromkeys(candidatos))}
+    if not posicao:
+        return []
+    itens = Item.objects.filter(pk__in=list(posicao)).annotate(relevancia=relevancia(consulta))
+    return sorted(itens, key=lambda item: (item.relevancia, posicao[item.pk]))[:limite]
@@ -0,0 +1,93 @@
+"""
+Classificação ABC/XYZ do catálogo, calculada em lote.
+
+- ABC: itens ordenados pelo valor consumido na janela (saídas x valor
+  unitário atual); A são os que somam os primeiros LIMITE_A do valor total,
+  B os seguintes até LIMITE_B, C o restante e os itens sem saídas.
+- XYZ: coeficiente de variação (desvio / média) da demanda por período de
+  DIAS_POR_PERIODO dias; X até LIMITE_X, Y até LIMITE_Y, Z acima disso ou
+  sem demanda.
+
+As saídas diárias de todos os itens vêm do resumo diário em uma consulta e
+as contas são feitas com NumPy para o catálogo inteiro de uma vez. O
+resultado substitui todo o conteúdo de ClassificacaoItem.
+"""
+import math
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ClassificacaoItem, Item, Movimentacao, MovimentacaoDiaria
+from .vetores import carregar, posicoes
+
+JANELA_DIAS = 364
+DIAS_POR_PERIODO = 7
+LIMITE_A = 0.80
+LIMITE_B = 0.95
+LIMITE_X = 0.5
+LIMITE_Y = 1.0
+
+
+def classificar(*, janela=JANELA_DIAS, hoje=None, tamanho_lote=2000):
+    """Recalcula e grava a classificação de todos os itens; retorna Counter({"AX": n, ...})."""
+    hoje = hoje or timezone.localdate()
+    fim = hoje - timedelta(days=1)
+    inicio = fim - timedelta(days=janela - 1)
+    periodos = math.ceil(janela / DIAS_POR_PERIODO)
+
+    ids, preco = carregar(Item.objects.order_by("pk").values_list("pk", "valor_unitario"), (np.int64, np.float64))
+    # Demanda de cada item em cada período (matriz itens x períodos), uma consulta agrupada por período:
+    # só colunas numéricas saem do banco, sem converter uma data por linha
+    demanda = np.zeros((len(ids), periodos))
+    for periodo in range(periodos):
+        primeiro = inicio + timedelta(days=periodo * DIAS_POR_PERIODO)
+        item_saida, quantidade = carregar(
+            MovimentacaoDiaria.objects.filter(
+                tipo_movimentacao=Movimentacao.Tipo.SAIDA,
+                data__gte=primeiro,
+                data__lte=min(primeiro + timedelta(days=DIAS_POR_PERIODO - 1), fim),
+            )
+            .values("item_id")
+            .annotate(total=Sum("quantidade"))
+            .order_by()
+            .values_list("item_id", "total"),
+            (np.int64, np.float64),
+        )
+        posicao, encontrados = posicoes(ids, item_saida)
+        demanda[posicao[encontrados], periodo] = quantidade[encontrados]
+
+    valor = demanda.sum(axis=1) * preco
+    media = demanda.mean(axis=1)
+    coeficiente = np.divide(demanda.std(axis=1), media, out=np.full(len(ids), np.inf), where=media > 0)
+
+    # Participação acumulada antes de cada item, do maior valor para o menor
+    ordem = np.argsort(-valor, kind="stable")
+    total = valor.sum()
+    anterior = np.empty(len(ids))
+    anterior[ordem] = (np.cumsum(valor[ordem]) - valor[ordem]) / total if total > 0 else 1.0
+    abc = np.where(valor <= 0, "C", np.where(anterior < LIMITE_A, "A", np.where(anterior < LIMITE_B, "B", "C")))
+    xyz = np.where(coeficiente <= LIMITE_X, "X", np.where(coeficiente <= LIMITE_Y, "Y", "Z"))
+
+    agora = timezone.now()
+    linhas = [
+        ClassificacaoItem(
+            item_id=item_id,
+            classe_abc=classe_abc,
+            classe_xyz=classe_xyz,
+            valor_consumo=Decimal(f"{valor_item:.2f}"),
+            coeficiente_variacao=None if math.isinf(cv) else round(cv, 4),
+            calculado_em=agora,
+        )
+        for item_id, classe_abc, classe_xyz, valor_item, cv in zip(
+            ids.tolist(), abc.tolist(), xyz.tolist(), valor.tolist(), coeficiente.tolist()
+        )
+    ]
+    with transaction.atomic():
+        ClassificacaoItem.objects.all().delete()
+        ClassificacaoItem.objects.bulk_create(linhas, batch_size=tamanho_lote)
+    return Counter(a + x for a, x in zip(abc.tolist(), xyz.tolist()))
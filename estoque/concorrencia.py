@@ -0,0 +1,116 @@
+"""
+Repetição de transações que falharam por disputa de bloqueio.
+
+Com operadores simultâneos, o SQLite responde "database is locked" quando não
+obtém o bloqueio de escrita dentro do timeout, e o PostgreSQL aborta uma das
+transações em deadlock ou conflito de serialização. Nos dois casos a transação
+foi desfeita por inteiro e pode ser repetida com segurança.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+
+from django.db import OperationalError, connections, router, transaction
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE do PostgreSQL: falha de serialização, deadlock e bloqueio indisponível (NOWAIT)
+SQLSTATES_TRANSITORIOS = {"40001", "40P01", "55P03"}
+MENSAGENS_TRANSITORIAS = ("database is locked", "database table is locked")
+
+_trava = threading.Lock()
+_contadores = {"repeticoes": 0, "esgotadas": 0}
+
+
+def _contar(resultado):
+    with _trava:
+        _contadores[resultado] += 1
+
+
+def conflito_transitorio(exc) -> bool:
+    """Indica se o erro do banco é disputa de bloqueio, que some ao repetir a transação."""
+    causa = exc.__cause__
+    if getattr(causa, "pgcode", None) in SQLSTATES_TRANSITORIOS or getattr(causa, "sqlstate", None) in SQLSTATES_TRANSITORIOS:
+        return True
+    mensagem = str(exc).lower()
+    return any(trecho in mensagem for trecho in MENSAGENS_TRANSITORIAS)
+
+
+def reservar_escrita(modelo):
+    """
+    No SQLite, pede de imediato o bloqueio de escrita da transação em curso.
+
+    Sem SELECT ... FOR UPDATE, a transação que começa lendo fica com um
+    bloqueio compartilhado e, na primeira escrita, falha na hora com "database
+    is locked" se outra já estiver escrevendo. Um UPDATE que não altera linha
+    alguma pede o bloqueio de escrita logo no início e espera pelo timeout,
+    como qualquer escrita. Nos demais bancos, e fora de um atomic(), não faz nada.
+    """
+    conexao = connections[router.db_for_write(modelo)]
+    if conexao.vendor != "sqlite" or not conexao.in_atomic_block:
+        return
+    tabela = conexao.ops.quote_name(modelo._meta.db_table)
+    pk = conexao.ops.quote_name(modelo._meta.pk.column)
+    with conexao.cursor() as cursor:
+        cursor.execute(f"UPDATE {tabela} SET {pk} = {pk} WHERE 1 = 0")
+
+
+def ler_com_bloqueio_compartilhado(modelo, pk):
+    """
+    Lê a linha com um bloqueio compartilhado até o fim da transação em curso.
+
+    Várias transações seguram o bloqueio juntas; só um SELECT ... FOR UPDATE
+    (ou uma escrita) na mesma linha espera por todas elas. No PostgreSQL e no
+    MySQL usa FOR SHARE; nos bancos sem esse modo cai no select_for_update(),
+    que no SQLite não bloqueia nada (as escritas já são serializadas pelo
+    próprio banco, ver reservar_escrita).
+    """
+    conexao = connections[router.db_for_read(modelo)]
+    if conexao.vendor not in ("postgresql", "mysql"):
+        return modelo.objects.select_for_update().get(pk=pk)
+    tabela = conexao.ops.quote_name(modelo._meta.db_table)
+    coluna = conexao.ops.quote_name(modelo._meta.pk.column)
+    linhas = list(modelo.objects.raw(f"SELECT * FROM {tabela} WHERE {coluna} = %s FOR SHARE", [pk]))
+    if not linhas:
+        raise modelo.DoesNotExist(f"{modelo._meta.object_name} {pk} não encontrado.")
+    return linhas[0]
+
+
+def repetir_em_conflito(funcao=None, *, tentativas=5, espera_inicial=0.02, espera_maxima=0.5):
+    """
+    Decorador que repete a função quando a transação falha por disputa de bloqueio.
+
+    A espera entre tentativas dobra a cada falha, até ``espera_maxima``, e é
+    sorteada entre zero e esse teto para que os concorrentes não voltem todos
+    ao mesmo tempo. Dentro de um atomic() externo o erro é repassado sem
+    repetir: a transação abortada é de quem a abriu.
+    """
+
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    return funcao(*args, **kwargs)
+                except OperationalError as exc:
+                    if not conflito_transitorio(exc) or transaction.get_connection().in_atomic_block:
+                        raise
+                    if tentativa == tentativas:
+                        _contar("esgotadas")
+                        raise
+                    _contar("repeticoes")
+                    espera = random.uniform(0, min(espera_maxima, espera_inicial * 2 ** (tentativa - 1)))
+                    logger.info("%s: conflito de bloqueio (%s); tentativa %d em %.3f s", funcao.__name__, exc, tentativa + 1, espera)
+                    time.sleep(espera)
+
+        return envolvida
+
+    return decorador(funcao) if funcao is not None else decorador
+
+
+def estatisticas():
+    """Repetições feitas e desistências (tentativas esgotadas) neste processo."""
+    with _trava:
+        return dict(_contadores)
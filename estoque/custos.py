@@ -0,0 +1,129 @@
+"""
+Custo médio ponderado por item e estoque.
+
+Cada ItemEstoque guarda o custo médio das unidades em estoque e cada
+Movimentacao, o custo unitário com que foi registrada:
+
+- ENTRADA: entra pelo preço informado (o valor unitário do item no momento)
+  e recalcula a média: (saldo x média + quantidade x preço) / novo saldo;
+- SAIDA: sai pelo custo médio, que não muda;
+- AJUSTE: a sobra entra pelo custo médio; com o par zerado ou sem custo,
+  pelo preço informado.
+
+``aplicar`` é a conta de uma movimentação, em tempo constante, usada pelos
+serviços; ``recalcular`` refaz os custos de todos os pares a partir do
+histórico de movimentações (comando recalcular_custos).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .concorrencia import reservar_escrita
+from .models import Item, ItemEstoque, Movimentacao, MovimentacaoDiaria, SaldoFechamento
+
+CASAS_CUSTO = Decimal("0.0001")
+CENTAVOS = Decimal("0.01")
+
+
+def aplicar(saldo, custo_medio, tipo_movimentacao, quantidade, preco):
+    """Aplica uma movimentação ao par e devolve (novo saldo, novo custo médio, custo unitário da movimentação)."""
+    if tipo_movimentacao == Movimentacao.Tipo.SAIDA:
+        return saldo - quantidade, custo_medio, custo_medio
+    if tipo_movimentacao == Movimentacao.Tipo.AJUSTE:
+        custo = custo_medio if saldo > 0 and custo_medio > 0 else preco
+        return saldo + quantidade, custo, custo
+    if saldo <= 0:
+        return saldo + quantidade, preco, preco
+    novo_saldo = saldo + quantidade
+    media = ((saldo * custo_medio + quantidade * preco) / novo_saldo).quantize(CASAS_CUSTO)
+    return novo_saldo, media, preco
+
+
+def recalcular(*, itens_por_lote=500, tamanho_lote=500):
+    """
+    Refaz, a partir das movimentações, o custo médio de cada par, o custo das
+    saídas e ajustes, o valor do resumo diário, o dos saldos de fechamento e o
+    valor em estoque dos itens.
+
+    As entradas mantêm o custo gravado (o preço de compra). Processa
+    ``itens_por_lote`` itens por transação, com os ItemEstoque deles
+    bloqueados, e a cada lote devolve (itens, movimentações lidas,
+    movimentações com custo alterado).
+    """
+    item_ids = list(Item.objects.order_by("pk").values_list("pk", flat=True))
+    # O fuso de cada linha é o mesmo; buscá-lo a cada conversão dominaria o tempo
+    fuso = timezone.get_current_timezone()
+    for inicio in range(0, len(item_ids), itens_por_lote):
+        lote = item_ids[inicio : inicio + itens_por_lote]
+        with transaction.atomic():
+            # Movimentações novas dos itens do lote esperam o fim do recálculo
+            reservar_escrita(ItemEstoque)
+            vinculos = {
+                (vinculo.item_id, vinculo.estoque_id): vinculo
+                for vinculo in ItemEstoque.objects.select_for_update()
+                .filter(item_id__in=lote)
+                .order_by("estoque_id", "item_id")
+            }
+            movimentos = (
+                Movimentacao.objects.filter(item_id__in=lote)
+                .order_by("item_id", "estoque_id", "data_movimentacao", "pk")
+                .values_list("pk", "item_id", "estoque_id", "tipo_movimentacao", "quantidade", "custo_unitario", "data_movimentacao")
+            )
+            # Fechamentos de cada par em ordem de data: recebem o valor acumulado até o fim do dia
+            fechamentos = {}
+            for fechamento in SaldoFechamento.objects.filter(item_id__in=lote).order_by("-data").only(
+                "pk", "data", "item_id", "estoque_id", "valor"
+            ):
+                fechamentos.setdefault((fechamento.item_id, fechamento.estoque_id), []).append(fechamento)
+            fechamentos_alterados = []
+            estado, valores, alterados, lidos = {}, {}, [], 0
+            for pk, item_id, estoque_id, tipo, quantidade, custo_gravado, data in movimentos.iterator(chunk_size=5000):
+                par = (item_id, estoque_id)
+                dia = data.astimezone(fuso).date()
+                saldo, custo_medio, valor = estado.get(par, (0, Decimal("0"), Decimal("0")))
+                _fechar(fechamentos.get(par, []), valor, fechamentos_alterados, ate=dia)
+                saldo, custo_medio, custo = aplicar(saldo, custo_medio, tipo, quantidade, custo_gravado)
+                valor += -quantidade * custo if tipo == Movimentacao.Tipo.SAIDA else quantidade * custo
+                estado[par] = (saldo, custo_medio, valor)
+                if custo != custo_gravado:
+                    alterados.append(Movimentacao(pk=pk, custo_unitario=custo))
+                chave = (dia, item_id, estoque_id, tipo)
+                valores[chave] = valores.get(chave, Decimal("0")) + quantidade * custo
+                lidos += 1
+            Movimentacao.objects.bulk_update(alterados, ["custo_unitario"], batch_size=tamanho_lote)
+            for par, pendentes in fechamentos.items():
+                _fechar(pendentes, estado.get(par, (0, Decimal("0"), Decimal("0")))[2], fechamentos_alterados)
+            SaldoFechamento.objects.bulk_update(fechamentos_alterados, ["valor"], batch_size=tamanho_lote)
+
+            vinculos_alterados = []
+            for par, (_, custo_medio, _) in estado.items():
+                vinculo = vinculos.get(par)
+                if vinculo is not None and vinculo.custo_medio != custo_medio:
+                    vinculo.custo_medio = custo_medio
+                    vinculos_alterados.append(vinculo)
+            ItemEstoque.objects.bulk_update(vinculos_alterados, ["custo_medio"], batch_size=tamanho_lote)
+
+            linhas = []
+            for pk, *chave, valor_gravado in MovimentacaoDiaria.objects.filter(item_id__in=lote).values_list(
+                "pk", "data", "item_id", "estoque_id", "tipo_movimentacao", "valor"
+            ):
+                valor = valores.get(tuple(chave), Decimal("0")).quantize(CENTAVOS)
+                if valor != valor_gravado:
+                    linhas.append(MovimentacaoDiaria(pk=pk, valor=valor))
+            MovimentacaoDiaria.objects.bulk_update(linhas, ["valor"], batch_size=tamanho_lote)
+
+            Item.objects.filter(pk__in=lote).update(valor_estoque=Item._valor_estoque_expr())
+        yield len(lote), lidos, len(alterados)
+
+
+def _fechar(pendentes, valor, alterados, ate=None):
+    """
+    Grava ``valor`` nos fechamentos pendentes com data anterior a ``ate`` (em todos,
+    sem ``ate``); a lista vem da data mais recente para a mais antiga.
+    """
+    while pendentes and (ate is None or pendentes[-1].data < ate):
+        fechamento = pendentes.pop()
+        if fechamento.valor != valor.quantize(CENTAVOS):
+            fechamento.valor = valor.quantize(CENTAVOS)
+            alterados.append(fechamento)
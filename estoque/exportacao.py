@@ -0,0 +1,74 @@
+"""Exportação em fluxo do livro de movimentações."""
+import csv
+
+from django.utils import timezone
+
+from .models import Movimentacao
+
+CABECALHO_MOVIMENTACOES = [
+    "Data",
+    "Tipo",
+    "Código",
+    "Item",
+    "Estoque",
+    "Quantidade",
+    "Usuário",
+    "Observação",
+]
+TAMANHO_LOTE = 2000
+
+
+def linhas_movimentacoes(movimentacoes):
+    """
+    Percorre as movimentações trazendo só as colunas exportadas, em lotes.
+
+    ``iterator`` usa cursor no servidor quando o banco suporta (PostgreSQL) e
+    busca em lotes nos demais, então a memória não cresce com o volume.
+    """
+    tipos = dict(Movimentacao.Tipo.choices)
+    valores = (
+        movimentacoes.order_by("-data_movimentacao", "-id")
+        .values_list(
+            "data_movimentacao",
+            "tipo_movimentacao",
+            "item__codigo",
+            "item__descricao",
+            "estoque__localizacao",
+            "quantidade",
+            "usuario__username",
+            "observacao",
+        )
+        .iterator(chunk_size=TAMANHO_LOTE)
+    )
+    for data, tipo, codigo, descricao, estoque, quantidade, usuario, observacao in valores:
+        yield (
+            timezone.localtime(data).strftime("%d/%m/%Y %H:%M:%S"),
+            tipos.get(tipo, tipo),
+            codigo,
+            descricao,
+            estoque,
+            quantidade,
+            usuario,
+            observacao,
+        )
+
+
+class _Eco:
+    """Pseudo-arquivo que devolve o que o csv.writer escreve, para repassar à resposta."""
+
+    def write(self, valor):
+        return valor
+
+
+def csv_em_fluxo(cabecalho, linhas, *, linhas_por_bloco=1000):
+    """Gera o CSV (separado por ';' e com BOM para o Excel) em blocos de linhas."""
+    escritor = csv.writer(_Eco(), delimiter=";")
+    yield "\ufeff" + escritor.writerow(cabecalho)
+    bloco = []
+    for valores in linhas:
+        bloco.append(escritor.writerow(valores))
+        if len(bloco) >= linhas_por_bloco:
+            yield "".join(bloco)
+            bloco = []
+    if bloco:
+        yield "".join(bloco)
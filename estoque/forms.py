@@ -1,9 +1,14 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
 from django.core.exceptions import ValidationError
 from django.db.models import Sum
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 
-from .models import Estoque, Fornecedor, Inventario, InventarioItem, Item, Movimentacao
+from .busca import rotulo
+from .models import Estoque, Fornecedor, Inventario, InventarioItem, Item, Movimentacao, Usuario
+from .registro import estoque_padrao
 
 
 class ItemForm(forms.ModelForm):
@@ -35,13 +40,22 @@ class ItemForm(forms.ModelForm):
         if "fornecedor" in self.fields:
             self.fields["fornecedor"].queryset = Fornecedor.objects.order_by("nome")
 
-    def clean(self):
-        cleaned = super().clean()
-        minimo = cleaned.get("estoque_minimo") or 0
-        maximo = cleaned.get("estoque_maximo") or 0
-        if maximo and minimo and maximo < minimo:
-            raise ValidationError("Estoque máximo não pode ser menor que o mínimo.")
-        return cleaned
+    # A regra de estoque mínimo/máximo fica em Item.clean, compartilhada com a importação do catálogo
+
+
+class ItemAutocompleteWidget(forms.Select):
+    """
+    Select de itens cujas opções são buscadas por AJAX (api_item_search).
+    Só o item selecionado é renderizado, em vez do catálogo inteiro.
+    """
+
+    def optgroups(self, name, value, attrs=None):
+        ids = [valor for valor in value if str(valor).isdigit()]
+        itens = self.choices.queryset.filter(pk__in=ids) if ids else []
+        opcoes = [self.create_option(name, "", "", False, 0)]
+        for indice, item in enumerate(itens, start=1):
+            opcoes.append(self.create_option(name, item.pk, rotulo(item), True, indice))
+        return [(None, opcoes, 0)]
 
 
 class MovimentacaoForm(forms.ModelForm):
@@ -50,7 +64,7 @@ class MovimentacaoForm(forms.ModelForm):
         fields = ["estoque", "item", "tipo_movimentacao", "quantidade", "observacao"]
         widgets = {
             "estoque": forms.Select(attrs={"class": "form-select"}),
-            "item": forms.Select(attrs={"class": "form-select"}),
+            "item": ItemAutocompleteWidget(attrs={"class": "form-select", "id": "item-select"}),
             "tipo_movimentacao": forms.Select(attrs={"class": "form-select"}),
             "quantidade": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
             "observacao": forms.TextInput(
@@ -62,15 +76,10 @@ class MovimentacaoForm(forms.ModelForm):
             ),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, estoque=None, **kwargs):
         super().__init__(*args, **kwargs)
         # Trava o estoque em "Depósito Central"
-        from .models import Estoque
-
-        central = (
-            Estoque.objects.filter(localizacao__iexact="Depósito Central").first()
-            or Estoque.objects.first()
-        )
+        central = estoque or estoque_padrao()
         if central:
             self.fields["estoque"].queryset = Estoque.objects.filter(pk=central.pk)
             self.fields["estoque"].initial = central
@@ -108,6 +117,70 @@ class MovimentacaoForm(forms.ModelForm):
         return cleaned_data
 
 
+class MovimentacaoFiltroForm(forms.Form):
+    data_inicio = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}))
+    data_fim = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}))
+    tipo = forms.ChoiceField(
+        required=False,
+        choices=[("", "Tipo (todos)")] + list(Movimentacao.Tipo.choices),
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    # O select de item é preenchido por AJAX no template; aqui só validamos o id recebido
+    item = forms.ModelChoiceField(queryset=Item.objects.all(), required=False, widget=forms.HiddenInput)
+    estoque = forms.ModelChoiceField(
+        queryset=Estoque.objects.order_by("localizacao"),
+        required=False,
+        empty_label="Estoque (todos)",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    usuario = forms.ModelChoiceField(
+        queryset=Usuario.objects.order_by("username"),
+        required=False,
+        empty_label="Usuário (todos)",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    def filtrar(self, movimentacoes):
+        """Aplica os filtros válidos; as datas viram intervalos para aproveitar o índice de data."""
+        dados = self.cleaned_data
+        if dados.get("data_inicio"):
+            movimentacoes = movimentacoes.filter(data_movimentacao__gte=_inicio_do_dia(dados["data_inicio"]))
+        if dados.get("data_fim"):
+            movimentacoes = movimentacoes.filter(
+                data_movimentacao__lt=_inicio_do_dia(dados["data_fim"] + timedelta(days=1))
+            )
+        if dados.get("tipo"):
+            movimentacoes = movimentacoes.filter(tipo_movimentacao=dados["tipo"])
+        for campo in ("item", "estoque", "usuario"):
+            if dados.get(campo):
+                movimentacoes = movimentacoes.filter(**{campo: dados[campo]})
+        return movimentacoes
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+class PeriodoForm(forms.Form):
+    data_inicio = forms.DateField()
+    data_fim = forms.DateField()
+
+    def clean(self):
+        cleaned = super().clean()
+        inicio, fim = cleaned.get("data_inicio"), cleaned.get("data_fim")
+        if inicio and fim and fim < inicio:
+            raise ValidationError("A data final não pode ser anterior à inicial.")
+        return cleaned
+
+
+class ReposicaoForm(forms.Form):
+    """Parâmetros do relatório de reposição; os limites mantêm finito o número de relatórios em cache."""
+
+    janela = forms.IntegerField(min_value=7, max_value=365, label="Histórico (dias)")
+    prazo = forms.IntegerField(min_value=1, max_value=180, label="Prazo de entrega (dias)")
+    cobertura = forms.IntegerField(min_value=0, max_value=365, label="Cobertura (dias)")
+
+
 class FornecedorForm(forms.ModelForm):
     class Meta:
         model = Fornecedor
@@ -134,6 +207,11 @@ class InventarioItemForm(forms.ModelForm):
         model = InventarioItem
         fields = ["item", "qtde_contada"]
         widgets = {
-            "item": forms.Select(attrs={"class": "form-select"}),
+            "item": ItemAutocompleteWidget(attrs={"class": "form-select", "id": "inventario-item-select"}),
             "qtde_contada": forms.NumberInput(attrs={"class": "form-control", "min": 0}),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Na tela a contagem é obrigatória; só as linhas criadas pela classificação nascem sem ela
+        self.fields["qtde_contada"].required = True
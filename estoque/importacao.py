@@ -0,0 +1,300 @@
+"""Importação de arquivos: contagens de inventário e catálogo de itens."""
+import csv
+import io
+import re
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .busca import indexar_itens, normalizar
+from .kpis import invalidar_tudo
+from .models import Fornecedor, Item
+from .planilhas import ler_xlsx
+from .saldo_cache import invalidar as invalidar_saldos
+
+MAX_ERROS = 20
+MAX_ERROS_CATALOGO = 200
+
+# Nome da coluna no cabeçalho (normalizado) -> campo do Item
+COLUNAS_CATALOGO = {
+    "codigo": "codigo",
+    "descricao": "descricao",
+    "unidade_medida": "unidade_medida",
+    "unidade": "unidade_medida",
+    "valor_unitario": "valor_unitario",
+    "valor": "valor_unitario",
+    "preco": "valor_unitario",
+    "fornecedor": "fornecedor",
+    "estoque_minimo": "estoque_minimo",
+    "minimo": "estoque_minimo",
+    "estoque_maximo": "estoque_maximo",
+    "maximo": "estoque_maximo",
+    "ativo": "ativo",
+}
+# Campos do Item que a importação pode preencher, além do código e do fornecedor
+_CAMPOS_ITEM = ("descricao", "unidade_medida", "valor_unitario", "estoque_minimo", "estoque_maximo", "ativo")
+COLUNAS_OBRIGATORIAS = ("codigo", "descricao", "unidade_medida", "valor_unitario")
+_VERDADEIRO = {"1", "s", "sim", "true", "verdadeiro", "x"}
+_FALSO = {"0", "n", "nao", "false", "falso"}
+
+
+def _leitor_csv(arquivo):
+    """
+    Abre o arquivo enviado como CSV, aceitando ';' (padrão do Excel em pt-BR) ou ','.
+
+    O conteúdo é lido em fluxo; só a primeira linha é usada para escolher o separador.
+    """
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    primeira = texto.readline()
+    separador = ";" if primeira.count(";") >= primeira.count(",") else ","
+    return csv.reader(_encadear(primeira, texto), delimiter=separador)
+
+
+def _encadear(primeira, texto):
+    yield primeira
+    yield from texto
+
+
+def ler_planilha(arquivo, nome):
+    """Linhas (listas de textos) de um arquivo CSV ou XLSX, conforme a extensão de ``nome``."""
+    if nome.lower().endswith(".xlsx"):
+        return ler_xlsx(arquivo)
+    return _leitor_csv(arquivo)
+
+
+def ler_contagens_csv(arquivo):
+    """
+    Lê um CSV de contagem com as colunas código e quantidade (cabeçalho opcional).
+
+    Retorna ({codigo: qtde}, erros). Se o mesmo código aparece mais de uma vez,
+    vale a última linha, como acontece ao registrar a contagem pela tela.
+    """
+    contagens, erros = {}, []
+    for numero, linha in enumerate(_leitor_csv(arquivo), start=1):
+        if not any(campo.strip() for campo in linha):
+            continue
+        codigo = linha[0].strip()
+        qtde = linha[1].strip() if len(linha) > 1 else ""
+        if numero == 1 and not qtde.isdigit():
+            continue  # cabeçalho
+        if not codigo or not qtde.isdigit():
+            erros.append(f"Linha {numero}: informe código e quantidade inteira não negativa.")
+            if len(erros) >= MAX_ERROS:
+                break
+            continue
+        contagens[codigo] = int(qtde)
+    return contagens, erros
+
+
+class ResultadoImportacao:
+    """Contadores da importação do catálogo e as primeiras linhas com erro."""
+
+    def __init__(self):
+        self.linhas = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.fornecedores_criados = 0
+        self.total_erros = 0
+        self.erros = []
+        self.segundos = 0.0
+
+    @property
+    def linhas_por_segundo(self):
+        return self.linhas / self.segundos if self.segundos else 0.0
+
+    def registrar_erro(self, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_CATALOGO:
+            self.erros.append(mensagem)
+
+
+def _nome_coluna(texto):
+    return re.sub(r"[^0-9a-z]+", "_", normalizar(texto)).strip("_")
+
+
+def _decimal(texto):
+    texto = texto.replace("R$", "").replace(" ", "")
+    if "," in texto:
+        # Formato brasileiro: 1.234,56
+        texto = texto.replace(".", "").replace(",", ".")
+    return Decimal(texto)
+
+
+def _inteiro(texto):
+    numero = _decimal(texto)
+    if numero != numero.to_integral_value():
+        raise InvalidOperation
+    return int(numero)
+
+
+def _booleano(texto):
+    valor = normalizar(texto)
+    if valor in _VERDADEIRO:
+        return True
+    if valor in _FALSO:
+        return False
+    raise InvalidOperation
+
+
+_CONVERSORES = {
+    "valor_unitario": (_decimal, "informe um valor numérico"),
+    "estoque_minimo": (_inteiro, "informe um número inteiro"),
+    "estoque_maximo": (_inteiro, "informe um número inteiro"),
+    "ativo": (_booleano, "use sim ou não"),
+}
+
+
+def _ler_item(campos, linha):
+    """
+    Converte a linha em (valores dos campos do Item, nome do fornecedor);
+    levanta ValidationError se algum valor não puder ser convertido.
+
+    Células vazias das colunas opcionais ficam fora dos valores: o item novo
+    recebe o padrão do modelo e o existente mantém o valor gravado.
+    """
+    valores, erros, fornecedor = {}, {}, ""
+    for campo, texto in zip(campos, linha):
+        if campo is None:
+            continue
+        texto = (texto or "").strip()
+        if campo == "fornecedor":
+            fornecedor = texto
+        elif campo in _CONVERSORES:
+            if not texto:
+                continue
+            conversor, mensagem = _CONVERSORES[campo]
+            try:
+                valores[campo] = conversor(texto)
+            except (InvalidOperation, ValueError):
+                erros[campo] = [mensagem]
+        else:
+            valores[campo] = texto
+    if not valores.get("codigo"):
+        erros["codigo"] = ["informe o código"]
+    if erros:
+        raise ValidationError(erros)
+    return valores, fornecedor
+
+
+def _mensagens(exc):
+    if not hasattr(exc, "error_dict"):
+        return exc.messages
+    return [
+        " ".join(mensagens) if campo == "__all__" else f"{campo}: {' '.join(mensagens)}"
+        for campo, mensagens in exc.message_dict.items()
+    ]
+
+
+def importar_catalogo(linhas, *, tamanho_lote=1000, ao_gravar_lote=None):
+    """
+    Insere ou atualiza itens pelo código a partir das linhas de uma planilha.
+
+    A primeira linha é o cabeçalho (ver COLUNAS_CATALOGO); colunas ausentes e
+    células vazias das colunas opcionais não alteram os itens existentes.
+    Linhas inválidas são registradas no resultado e ignoradas, sem
+    interromper a importação. As válidas são gravadas em lotes, cada um em
+    sua transação, com um INSERT ... ON CONFLICT por lote; fornecedores são
+    resolvidos pelo nome (sem diferenciar acentos e maiúsculas) e os que
+    faltam são criados de uma vez por lote.
+    ``ao_gravar_lote`` é chamado com o resultado parcial após cada lote.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoImportacao()
+    linhas = iter(linhas)
+    cabecalho = next(linhas, None) or []
+    campos = [COLUNAS_CATALOGO.get(_nome_coluna(coluna)) for coluna in cabecalho]
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in campos]
+    if faltando:
+        raise ValidationError(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(faltando)}.")
+    atualizar = [campo for campo in dict.fromkeys(campos) if campo and campo != "codigo"]
+
+    fornecedores = {normalizar(nome): pk for pk, nome in Fornecedor.objects.values_list("pk", "nome")}
+    lote = {}
+    for numero, linha in enumerate(linhas, start=2):
+        if not any((texto or "").strip() for texto in linha):
+            continue
+        resultado.linhas += 1
+        try:
+            valores, fornecedor = _ler_item(campos, linha)
+        except ValidationError as exc:
+            for mensagem in _mensagens(exc):
+                resultado.registrar_erro(f"Linha {numero}: {mensagem}")
+            continue
+        # Código repetido no arquivo: vale a última linha
+        lote.pop(valores["codigo"], None)
+        lote[valores["codigo"]] = (numero, valores, fornecedor)
+        if len(lote) >= tamanho_lote:
+            _gravar_lote(lote, atualizar, fornecedores, resultado)
+            lote = {}
+            if ao_gravar_lote:
+                ao_gravar_lote(resultado)
+    if lote:
+        _gravar_lote(lote, atualizar, fornecedores, resultado)
+        if ao_gravar_lote:
+            ao_gravar_lote(resultado)
+
+    invalidar_tudo()
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def _gravar_lote(lote, atualizar, fornecedores, resultado):
+    with transaction.atomic():
+        # Cada linha é validada sobre o item completo: os valores do arquivo por
+        # cima dos gravados, para que regras como mínimo <= máximo vejam também
+        # as colunas que o arquivo não traz
+        gravados = {
+            linha.pop("codigo"): linha
+            for linha in Item.objects.filter(codigo__in=lote.keys()).values("codigo", "pk", "fornecedor_id", *_CAMPOS_ITEM)
+        }
+        existentes = {codigo: linha.pop("pk") for codigo, linha in gravados.items()}
+        validos = []
+        for numero, valores, nome in lote.values():
+            gravado = gravados.get(valores["codigo"], {})
+            item = Item(**{**gravado, **valores})
+            try:
+                # Mesmas regras do ItemForm (validadores dos campos e Item.clean); a unicidade do código é o upsert
+                item.full_clean(exclude=["fornecedor"], validate_unique=False)
+            except ValidationError as exc:
+                for mensagem in _mensagens(exc):
+                    resultado.registrar_erro(f"Linha {numero}: {mensagem}")
+                continue
+            validos.append((item, nome))
+        if not validos:
+            return
+
+        novos = {}
+        for _, nome in validos:
+            chave = normalizar(nome)
+            if nome and chave not in fornecedores and chave not in novos:
+                novos[chave] = Fornecedor(nome=nome)
+        if novos:
+            Fornecedor.objects.bulk_create(novos.values())
+            fornecedores.update({chave: fornecedor.pk for chave, fornecedor in novos.items()})
+            resultado.fornecedores_criados += len(novos)
+
+        itens = []
+        for item, nome in validos:
+            if nome:
+                item.fornecedor_id = fornecedores.get(normalizar(nome))
+            itens.append(item)
+
+        Item.objects.bulk_create(itens, update_conflicts=True, unique_fields=["codigo"], update_fields=atualizar)
+        atualizados = [existentes[item.codigo] for item in itens if item.codigo in existentes]
+        ids = dict(existentes)
+        ids.update(
+            Item.objects.filter(codigo__in=[item.codigo for item in itens if item.codigo not in existentes]).values_list(
+                "codigo", "pk"
+            )
+        )
+        for item in itens:
+            item.pk = ids[item.codigo]
+
+        # O que Item.save faria item a item: termos de busca e caches (o valor em estoque é pelo custo médio)
+        indexar_itens(itens)
+        invalidar_saldos(item_ids=atualizados)
+
+    resultado.criados += len(itens) - len(atualizados)
+    resultado.atualizados += len(atualizados)
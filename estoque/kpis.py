@@ -0,0 +1,155 @@
+"""
+Cache dos indicadores do dashboard, por estoque.
+
+Os valores ficam no cache "kpis" (ver CACHES em settings) e são invalidados
+após o commit das operações que os alteram: movimentações, alterações de
+ItemEstoque, de Estoque e de Item.
+
+Com o backend padrão (locmem) o cache é da memória de cada processo e a
+invalidação só alcança o processo que fez a alteração: com vários processos
+(ex.: gunicorn com mais de um worker) os demais mostram os valores antigos até
+o fim do TIMEOUT. Nesse caso use ALMOX_KPI_CACHE=file ou db, compartilhados.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from almoxarifado.roteador import primario
+
+ESCOPO_TODOS = "todos"
+# Janela do indicador de saídas recentes
+DIAS_SAIDAS = 30
+_CHAVE_VERSAO = "kpis:versao"
+
+_trava = threading.Lock()
+_contadores = {"acertos": 0, "falhas": 0}
+
+
+def _cache():
+    return caches["kpis"]
+
+
+def _chave(escopo, versao):
+    return f"kpis:v{versao}:{escopo}"
+
+
+def _versao():
+    # Parte do relógio para que, se a chave for descartada, nunca volte a uma versão já usada
+    return _cache().get_or_set(_CHAVE_VERSAO, time.time_ns() // 1_000_000, timeout=None)
+
+
+def _contar(resultado):
+    with _trava:
+        _contadores[resultado] += 1
+
+
+def indicadores(estoque_id=None):
+    """Indicadores do dashboard para um estoque ou, sem ``estoque_id``, para todos."""
+    cache = _cache()
+    chave = _chave(estoque_id or ESCOPO_TODOS, _versao())
+    valores = cache.get(chave)
+    if valores is not None:
+        _contar("acertos")
+        return valores
+    _contar("falhas")
+    # Fica no cache para as próximas requisições: calcula no principal, nunca com a réplica atrasada
+    with primario():
+        valores = _calcular(estoque_id)
+    cache.set(chave, valores)
+    return valores
+
+
+def _calcular(estoque_id):
+    from . import resumo_diario
+    from .models import Item, ItemEstoque, Movimentacao
+
+    criticos = (
+        ItemEstoque.objects.select_related("item", "estoque")
+        .filter(qtde__lt=F("estoque__nivel_minimo"))
+        .order_by("estoque__localizacao", "item__descricao")
+    )
+    ultimas_movimentacoes = (
+        Movimentacao.objects.select_related("item", "estoque", "usuario")
+        .order_by("-data_movimentacao")
+    )
+    if estoque_id is None:
+        # Totais materializados em Item, sem agregar ItemEstoque
+        totais = Item.objects.aggregate(
+            total_itens=Count("pk"),
+            valor_total=Coalesce(Sum("valor_estoque"), Decimal("0.00")),
+        )
+        itens_abaixo_minimo = Item.objects.filter(ativo=True, qtde_total__lt=F("estoque_minimo")).count()
+    else:
+        criticos = criticos.filter(estoque_id=estoque_id)
+        ultimas_movimentacoes = ultimas_movimentacoes.filter(estoque_id=estoque_id)
+        # Pelo custo médio gravado em cada ItemEstoque, sem juntar Item
+        totais = ItemEstoque.objects.filter(estoque_id=estoque_id, qtde__gt=0).aggregate(
+            total_itens=Count("pk"),
+            valor_total=Coalesce(
+                Sum(
+                    ExpressionWrapper(
+                        F("qtde") * F("custo_medio"),
+                        output_field=DecimalField(max_digits=14, decimal_places=2),
+                    )
+                ),
+                Decimal("0.00"),
+            ),
+        )
+        itens_abaixo_minimo = None
+
+    # Pelo resumo diário: no máximo uma linha por item, estoque e dia
+    hoje = timezone.localdate()
+    saidas = resumo_diario.totais(hoje - timedelta(days=DIAS_SAIDAS - 1), hoje, estoque=estoque_id)[Movimentacao.Tipo.SAIDA]
+
+    return {
+        "total_itens": totais["total_itens"],
+        "saidas_periodo": saidas,
+        "dias_saidas": DIAS_SAIDAS,
+        "valor_total": totais["valor_total"],
+        "criticos": list(criticos),
+        "itens_abaixo_minimo": itens_abaixo_minimo,
+        "ultimas_movimentacoes": list(ultimas_movimentacoes[:8]),
+    }
+
+
+def invalidar(estoque_ids=()):
+    """Descarta, após o commit, os indicadores dos estoques informados e o consolidado."""
+    escopos = {ESCOPO_TODOS, *(estoque_id for estoque_id in estoque_ids if estoque_id)}
+
+    def _descartar():
+        versao = _versao()
+        _cache().delete_many([_chave(escopo, versao) for escopo in escopos])
+
+    transaction.on_commit(_descartar)
+
+
+def invalidar_tudo():
+    """Descarta, após o commit, todos os indicadores (ex.: mudança de preço de um item)."""
+    def _nova_versao():
+        cache = _cache()
+        try:
+            cache.incr(_CHAVE_VERSAO)
+        except ValueError:
+            cache.set(_CHAVE_VERSAO, time.time_ns() // 1_000_000, timeout=None)
+
+    transaction.on_commit(_nova_versao)
+
+
+def estatisticas():
+    """Acertos e falhas do cache de indicadores neste processo."""
+    with _trava:
+        acertos, falhas = _contadores["acertos"], _contadores["falhas"]
+    total = acertos + falhas
+    return {
+        "backend": _cache().__class__.__name__,
+        "acertos": acertos,
+        "falhas": falhas,
+        "taxa_acerto": round(acertos / total, 4) if total else None,
+    }
@@ -0,0 +1,59 @@
+"""
+Processo leitor ou escritor do benchmark_sqlite.
+
+Fica fora do módulo do comando porque, com o método "spawn" do multiprocessing,
+o processo filho importa o módulo da função antes de configurar o Django: aqui
+só há imports da biblioteca padrão no topo.
+"""
+import random
+import time
+
+
+def trabalhar(papel, semente, perfil, ids, prontos, parar, fila):
+    """Processo leitor ou escritor: repete a operação até o sinal de parada e devolve as latências em ms."""
+    import django
+
+    django.setup()
+    from django.core.exceptions import ValidationError
+    from django.db import OperationalError, connections
+    from django.db.models import F
+    from django.test.utils import override_settings
+
+    from estoque.models import Estoque, Item, ItemEstoque, Movimentacao, Usuario
+    from estoque.services import registrar_movimentacao
+
+    override_settings(SQLITE_PRAGMAS=perfil).enable()
+    aleatorio = random.Random(semente)
+    usuario = Usuario.objects.get(pk=ids["usuario"])
+    estoque = Estoque.objects.get(pk=ids["estoque"])
+    itens = list(Item.objects.filter(pk__in=ids["itens"]))
+
+    def ler():
+        consulta = aleatorio.randrange(3)
+        if consulta == 0:
+            ItemEstoque.objects.select_related("item").filter(estoque=estoque, item=aleatorio.choice(itens)).first()
+        elif consulta == 1:
+            list(Movimentacao.objects.select_related("item", "estoque", "usuario").order_by("-data_movimentacao", "-id")[:50])
+        else:
+            Item.objects.filter(ativo=True, qtde_total__lt=F("estoque_minimo")).count()
+
+    def escrever():
+        tipo = aleatorio.choice([Movimentacao.Tipo.ENTRADA, Movimentacao.Tipo.SAIDA])
+        try:
+            registrar_movimentacao(usuario=usuario, item=aleatorio.choice(itens), estoque=estoque, tipo_movimentacao=tipo, quantidade=1)
+        except ValidationError:
+            pass
+
+    operacao = ler if papel == "ler" else escrever
+    tempos, falhas = [], 0
+    prontos.wait()
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            operacao()
+        except OperationalError:
+            falhas += 1
+            continue
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    connections.close_all()
+    fila.put((papel, tempos, falhas))
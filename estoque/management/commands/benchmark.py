@@ -0,0 +1,252 @@
+import json
+import math
+import platform
+import random
+import statistics
+import time
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from estoque.management.commands.benchmark_busca import PRODUTOS
+from estoque.models import Estoque, Inventario, Item, ItemEstoque, Movimentacao, Usuario
+from estoque.registro import estoque_padrao
+
+CENARIOS = (
+    "dashboard",
+    "item_list",
+    "movimentacao_list",
+    "registrar_movimentacao",
+    "inventario_encerrar",
+    "api_item_search",
+    "api_item_saldo",
+)
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo, sobre valores já ordenados."""
+    return valores[max(math.ceil(p / 100 * len(valores)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p95) e número de consultas das principais telas e APIs sobre os dados "
+        "atuais (ver gerar_dados) e grava o resultado em JSON, opcionalmente comparando com uma "
+        "medição anterior. As gravações feitas durante a medição são desfeitas ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cenarios", nargs="*", help=f"Padrão: todos ({', '.join(CENARIOS)}).")
+        parser.add_argument("--repeticoes", type=int, default=30)
+        parser.add_argument("--aquecimento", type=int, default=3, help="Execuções descartadas antes de medir.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--sem-cache", action="store_true", help="Limpa os caches antes de cada requisição.")
+        parser.add_argument("--saida", metavar="ARQUIVO", help="Grava o resultado em JSON.")
+        parser.add_argument("--comparar", metavar="ARQUIVO", help="JSON de uma medição anterior (linha de base).")
+        parser.add_argument(
+            "--tolerancia",
+            type=float,
+            default=0.2,
+            help="Aumento relativo do p95 aceito na comparação antes de acusar regressão (padrão: 0.2).",
+        )
+
+    def handle(self, *args, **options):
+        cenarios = options["cenarios"] or list(CENARIOS)
+        desconhecidos = set(cenarios) - set(CENARIOS)
+        if desconhecidos:
+            raise CommandError(f"Cenário(s) desconhecido(s): {', '.join(sorted(desconhecidos))}.")
+        if options["repeticoes"] < 1:
+            raise CommandError("Informe ao menos uma repetição.")
+        linha_de_base = self._ler_linha_de_base(options["comparar"]) if options["comparar"] else None
+
+        # O Client se apresenta como "testserver"
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]), transaction.atomic():
+            resultado = self._medir_todos(cenarios, options)
+            transaction.set_rollback(True)
+
+        self._imprimir(resultado)
+        if options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8") as arquivo:
+                json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultado gravado em {options['saida']}.")
+        if linha_de_base:
+            regressoes = self._comparar(resultado, linha_de_base, options["tolerancia"])
+            if regressoes:
+                raise CommandError(f"{regressoes} cenário(s) pioraram em relação à linha de base.")
+            self.stdout.write(self.style.SUCCESS("Nenhuma regressão em relação à linha de base."))
+
+    def _ler_linha_de_base(self, caminho):
+        try:
+            with open(caminho, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Não foi possível ler a linha de base {caminho}: {exc}")
+
+    def _medir_todos(self, cenarios, options):
+        aleatorio = random.Random(options["seed"])
+        usuario = Usuario.objects.create(
+            username="benchmark-rotas", email="benchmark-rotas@localhost", nome="Benchmark", is_staff=True
+        )
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        resultado = {
+            "gerado_em": timezone.now().isoformat(timespec="seconds"),
+            "ambiente": {
+                "banco": connection.vendor,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+            },
+            "volumes": {
+                "itens": Item.objects.count(),
+                "estoques": Estoque.objects.count(),
+                "saldos": ItemEstoque.objects.count(),
+                "movimentacoes": Movimentacao.objects.count(),
+            },
+            "repeticoes": options["repeticoes"],
+            "cenarios": {},
+        }
+        for nome in cenarios:
+            requisicao = getattr(self, f"_preparar_{nome}")(aleatorio)
+            if requisicao is None:
+                self.stdout.write(self.style.WARNING(f"{nome}: sem dados para medir, ignorado."))
+                continue
+            resultado["cenarios"][nome] = self._medir(cliente, requisicao, options)
+        return resultado
+
+    def _medir(self, cliente, requisicao, options):
+        tempos, consultas = [], []
+        for repeticao in range(options["aquecimento"] + options["repeticoes"]):
+            if options["sem_cache"]:
+                for cache in caches.all():
+                    cache.clear()
+            metodo, url, dados, status_esperado = requisicao()
+            # Cada execução num savepoint desfeito: as gravações não se acumulam entre repetições
+            # O registro de consultas do Django guarda no máximo 9000; esvaziado, a contagem não trava no limite
+            connection.queries_log.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    resposta = getattr(cliente, metodo)(url, dados)
+                    segundos = time.perf_counter() - inicio
+                transaction.set_rollback(True)
+            if resposta.status_code != status_esperado:
+                raise CommandError(f"{metodo.upper()} {url} respondeu {resposta.status_code}, esperado {status_esperado}.")
+            if repeticao >= options["aquecimento"]:
+                tempos.append(segundos * 1000)
+                consultas.append(len(capturadas))
+        tempos.sort()
+        return {
+            "url": url,
+            "p50_ms": round(percentil(tempos, 50), 3),
+            "p95_ms": round(percentil(tempos, 95), 3),
+            "media_ms": round(statistics.mean(tempos), 3),
+            "max_ms": round(tempos[-1], 3),
+            "consultas": max(consultas),
+        }
+
+    # Cada _preparar_* escolhe os dados do cenário e devolve uma função que monta a próxima
+    # requisição como (método, url, dados, status esperado), ou None se faltarem dados.
+
+    def _preparar_dashboard(self, aleatorio):
+        return lambda: ("get", reverse("dashboard"), {}, 200)
+
+    def _preparar_item_list(self, aleatorio):
+        return lambda: ("get", reverse("item_list"), {}, 200)
+
+    def _preparar_movimentacao_list(self, aleatorio):
+        return lambda: ("get", reverse("movimentacao_list"), {}, 200)
+
+    def _preparar_registrar_movimentacao(self, aleatorio):
+        estoque = estoque_padrao()
+        if estoque is None:
+            return None
+        itens = list(
+            ItemEstoque.objects.filter(estoque=estoque, qtde__gt=0).order_by("pk").values_list("item_id", flat=True)[:1000]
+        )
+        if not itens:
+            return None
+        return lambda: (
+            "post",
+            reverse("movimentacao_create"),
+            {
+                "estoque": estoque.pk,
+                "item": aleatorio.choice(itens),
+                "tipo_movimentacao": aleatorio.choice([Movimentacao.Tipo.ENTRADA, Movimentacao.Tipo.SAIDA]),
+                "quantidade": 1,
+            },
+            302,
+        )
+
+    def _preparar_inventario_encerrar(self, aleatorio):
+        # O maior inventário aberto; o savepoint de cada repetição desfaz o encerramento
+        inventario = (
+            Inventario.objects.filter(encerrado_em__isnull=True)
+            .annotate(linhas=Count("itens"))
+            .order_by("-linhas", "pk")
+            .first()
+        )
+        estoque = estoque_padrao()
+        if inventario is None or estoque is None:
+            return None
+        url = reverse("inventario_encerrar", args=[inventario.pk])
+        return lambda: ("post", url, {"estoque_id": estoque.pk}, 302)
+
+    def _preparar_api_item_search(self, aleatorio):
+        def requisicao():
+            palavra = aleatorio.choice(PRODUTOS)
+            return "get", reverse("api_item_search"), {"q": palavra[: aleatorio.randint(3, len(palavra))]}, 200
+
+        return requisicao
+
+    def _preparar_api_item_saldo(self, aleatorio):
+        pares = list(ItemEstoque.objects.order_by("pk").values_list("item_id", "estoque_id")[:5000])
+        if not pares:
+            return None
+
+        def requisicao():
+            item_id, estoque_id = aleatorio.choice(pares)
+            return "get", reverse("api_item_saldo"), {"item": item_id, "estoque": estoque_id}, 200
+
+        return requisicao
+
+    def _imprimir(self, resultado):
+        volumes = resultado["volumes"]
+        self.stdout.write(
+            f"{volumes['itens']} itens, {volumes['saldos']} saldos, {volumes['movimentacoes']} movimentações; "
+            f"{resultado['repeticoes']} repetições por cenário"
+        )
+        self.stdout.write(f"  {'cenário':<24}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}{'consultas':>11}")
+        for nome, medida in resultado["cenarios"].items():
+            self.stdout.write(
+                f"  {nome:<24}{medida['p50_ms']:>10.2f}{medida['p95_ms']:>10.2f}"
+                f"{medida['max_ms']:>10.2f}{medida['consultas']:>11}"
+            )
+
+    def _comparar(self, resultado, linha_de_base, tolerancia):
+        """Imprime a variação de cada cenário e devolve quantos pioraram além da tolerância."""
+        if linha_de_base.get("volumes") != resultado["volumes"]:
+            self.stdout.write(self.style.WARNING("Atenção: a linha de base foi medida com outros volumes de dados."))
+        regressoes = 0
+        self.stdout.write("Comparação com a linha de base:")
+        for nome, medida in resultado["cenarios"].items():
+            base = linha_de_base.get("cenarios", {}).get(nome)
+            if base is None:
+                continue
+            variacao = medida["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+            piorou = variacao > tolerancia or medida["consultas"] > base["consultas"]
+            regressoes += piorou
+            linha = (
+                f"  {nome:<24}p95 {base['p95_ms']:.2f} -> {medida['p95_ms']:.2f} ms ({variacao:+.0%}), "
+                f"consultas {base['consultas']} -> {medida['consultas']}"
+            )
+            self.stdout.write(self.style.ERROR(linha) if piorou else linha)
+        return regressoes
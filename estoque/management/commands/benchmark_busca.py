@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from estoque.busca import buscar_itens, indexar_itens
+from estoque.models import Item
+
+PRODUTOS = [
+    "parafuso", "porca", "arruela", "prego", "cabo", "fio", "lâmpada", "tomada", "interruptor", "disjuntor",
+    "luva", "máscara", "óculos", "capacete", "bota", "papel", "caneta", "grampeador", "pasta", "envelope",
+    "detergente", "sabão", "álcool", "desinfetante", "vassoura", "balde", "pano", "esponja", "fita", "cola",
+    "tinta", "pincel", "rolo", "lixa", "broca", "serra", "martelo", "alicate", "chave", "trena",
+]
+ATRIBUTOS = [
+    "aço", "inox", "galvanizado", "plástico", "borracha", "algodão", "nitrílica", "látex", "branco", "preto",
+    "azul", "vermelho", "led", "fluorescente", "bivolt", "reforçado", "descartável", "industrial", "a4", "ofício",
+]
+MEDIDAS = ["1/4", "3/8", "1/2", "10mm", "12mm", "2,5mm", "5m", "10m", "500ml", "1l", "5l", "p", "m", "g", "gg"]
+UNIDADES = ["un", "cx", "pct", "kg", "l", "m", "par", "rl"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência da busca de itens (p50/p95/p99) sobre um catálogo sintético. "
+        "Os itens gerados são descartados ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--itens", type=int, default=200_000, help="Tamanho do catálogo sintético.")
+        parser.add_argument("--consultas", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--usar-existentes",
+            action="store_true",
+            help="Mede sobre o catálogo atual, sem gerar itens.",
+        )
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options["seed"])
+        with transaction.atomic():
+            if not options["usar_existentes"]:
+                self._gerar_catalogo(aleatorio, options["itens"])
+            consultas = self._consultas(aleatorio, options["consultas"])
+            buscar_itens("aquecimento")
+            tempos = []
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                buscar_itens(consulta)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            transaction.set_rollback(True)
+
+        tempos.sort()
+        quantis = statistics.quantiles(tempos, n=100)
+        self.stdout.write(f"{len(tempos)} consultas sobre {Item.objects.count() if options['usar_existentes'] else options['itens']} itens")
+        self.stdout.write(
+            f"  média {statistics.mean(tempos):.2f} ms | p50 {quantis[49]:.2f} ms | "
+            f"p95 {quantis[94]:.2f} ms | p99 {quantis[98]:.2f} ms | máx {tempos[-1]:.2f} ms"
+        )
+
+    def _gerar_catalogo(self, aleatorio, quantidade):
+        self.stdout.write(f"Gerando {quantidade} itens...")
+        lote = []
+        for numero in range(quantidade):
+            descricao = " ".join(
+                [aleatorio.choice(PRODUTOS), aleatorio.choice(ATRIBUTOS), aleatorio.choice(MEDIDAS)]
+            ).capitalize()
+            lote.append(
+                Item(
+                    codigo=f"{aleatorio.choice(PRODUTOS)[:3].upper()}-{numero:06d}",
+                    descricao=descricao,
+                    unidade_medida=aleatorio.choice(UNIDADES),
+                    valor_unitario=Decimal(aleatorio.randint(50, 50000)) / 100,
+                )
+            )
+            if len(lote) >= 5000:
+                indexar_itens(Item.objects.bulk_create(lote))
+                lote = []
+        if lote:
+            indexar_itens(Item.objects.bulk_create(lote))
+
+    def _consultas(self, aleatorio, quantidade):
+        consultas = []
+        for _ in range(quantidade):
+            tipo = aleatorio.random()
+            if tipo < 0.4:
+                palavra = aleatorio.choice(PRODUTOS)
+                consultas.append(palavra[: aleatorio.randint(2, len(palavra))])
+            elif tipo < 0.7:
+                consultas.append(f"{aleatorio.choice(PRODUTOS)} {aleatorio.choice(ATRIBUTOS)[:3]}")
+            else:
+                consultas.append(f"{aleatorio.choice(PRODUTOS)[:3]}-{aleatorio.randint(0, 199):03d}")
+        return consultas
@@ -0,0 +1,58 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from estoque.models import Estoque, Item, Usuario
+from estoque.services import registrar_movimentacao, registrar_movimentacoes_em_lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara N chamadas de registrar_movimentacao com uma chamada de "
+        "registrar_movimentacoes_em_lote. Os dados criados são descartados ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linhas", type=int, default=500, help="Quantidade de movimentações por rodada.")
+
+    def handle(self, *args, **options):
+        linhas = options["linhas"]
+        with transaction.atomic():
+            usuario = Usuario.objects.create(username="benchmark-movimentacoes", email="benchmark@localhost", nome="Benchmark")
+            estoque = Estoque.objects.create(localizacao="Benchmark")
+            itens = Item.objects.bulk_create(
+                [
+                    Item(codigo=f"BENCH-{i:06d}", descricao=f"Item benchmark {i}", unidade_medida="un", valor_unitario=Decimal("1.00"))
+                    for i in range(linhas)
+                ]
+            )
+            movimentacoes = [
+                {"item": item, "estoque": estoque, "tipo_movimentacao": "ENTRADA", "quantidade": 10}
+                for item in itens
+            ]
+
+            individual = self._medir(
+                lambda: [registrar_movimentacao(usuario=usuario, **mov) for mov in movimentacoes]
+            )
+            lote = self._medir(
+                lambda: registrar_movimentacoes_em_lote(usuario=usuario, movimentacoes=movimentacoes)
+            )
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{linhas} movimentações")
+        for nome, (segundos, consultas) in (("individual", individual), ("lote", lote)):
+            self.stdout.write(
+                f"  {nome:<10} {segundos * 1000:10.1f} ms  {consultas:6d} consultas  "
+                f"{linhas / segundos:10.0f} mov/s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Ganho do lote: {individual[0] / lote[0]:.1f}x"))
+
+    def _medir(self, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            funcao()
+            decorrido = time.perf_counter() - inicio
+        return decorrido, len(consultas.captured_queries)
@@ -0,0 +1,145 @@
+import multiprocessing
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from almoxarifado import sqlite
+from estoque.management.commands._trabalhador_sqlite import trabalhar
+from estoque.management.commands.benchmark import percentil
+from estoque.models import Estoque, Item, ItemEstoque, Movimentacao, Usuario
+from estoque.services import registrar_movimentacoes_em_lote
+
+# Padrões do SQLite e do Django: diário apagado a cada transação, fsync em todo commit, 5 s de espera
+PERFIL_PADRAO = {"journal_mode": "delete", "synchronous": "full", "busy_timeout": 5000}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a vazão de leituras enquanto outros processos gravam movimentações, com os PRAGMAs "
+        "padrão do SQLite e com os configurados em SQLITE_PRAGMAS. Os dados criados são removidos ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--leitores", type=int, default=4)
+        parser.add_argument("--escritores", type=int, default=2)
+        parser.add_argument("--segundos", type=float, default=10.0, help="Duração de cada rodada.")
+        parser.add_argument("--itens", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite" or connection.is_in_memory_db():
+            raise CommandError("Este benchmark exige o banco SQLite em arquivo.")
+        configurado = sqlite.pragmas()
+        if not configurado:
+            raise CommandError("SQLITE_PRAGMAS está vazio (ALMOX_SQLITE_AJUSTADO=0?); nada a comparar.")
+
+        usuario, estoque, itens = self._preparar(options)
+        resultados = {}
+        try:
+            for nome, perfil in (("padrao", PERFIL_PADRAO), ("configurado", configurado)):
+                with override_settings(SQLITE_PRAGMAS=perfil):
+                    # Conexões novas: os PRAGMAs só são aplicados ao abrir a conexão
+                    connections.close_all()
+                    modo = sqlite.estado(connection, ["journal_mode", "synchronous", "busy_timeout"])
+                    resultados[nome] = self._rodada(options, perfil, usuario, estoque, itens)
+                    resultados[nome]["pragmas"] = modo
+                    connections.close_all()
+        finally:
+            # De volta aos PRAGMAs configurados (o journal_mode fica gravado no arquivo do banco)
+            connections.close_all()
+            self._limpar(usuario, estoque, itens)
+
+        self.stdout.write(
+            f"{options['leitores']} leitores e {options['escritores']} escritores, {options['segundos']:.0f} s por rodada"
+        )
+        for nome, medida in resultados.items():
+            pragmas = medida["pragmas"]
+            self.stdout.write(
+                f"  {nome:<12} journal_mode={pragmas['journal_mode']} synchronous={pragmas['synchronous']} "
+                f"busy_timeout={pragmas['busy_timeout']}"
+            )
+            self.stdout.write(
+                f"  {'':<12} leituras {medida['leituras_s']:8.0f}/s  p95 {medida['leitura_p95_ms']:7.2f} ms | "
+                f"escritas {medida['escritas_s']:6.0f}/s  p95 {medida['escrita_p95_ms']:7.2f} ms | "
+                f"falhas {medida['falhas']}"
+            )
+        padrao, ajustado = resultados["padrao"], resultados["configurado"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Configurado x padrão: leituras {ajustado['leituras_s'] / max(padrao['leituras_s'], 1):.1f}x, "
+                f"escritas {ajustado['escritas_s'] / max(padrao['escritas_s'], 1):.1f}x"
+            )
+        )
+
+    def _preparar(self, options):
+        marca = time.strftime("%Y%m%d%H%M%S")
+        usuario = Usuario.objects.create(
+            username=f"benchmark-sqlite-{marca}", email=f"benchmark-sqlite-{marca}@localhost", nome="Benchmark SQLite"
+        )
+        estoque = Estoque.objects.create(localizacao=f"Benchmark SQLite {marca}")
+        itens = Item.objects.bulk_create(
+            [
+                Item(codigo=f"BSQL-{marca}-{numero:03d}", descricao=f"Item benchmark {numero}", unidade_medida="un", valor_unitario=Decimal("1.00"))
+                for numero in range(options["itens"])
+            ]
+        )
+        registrar_movimentacoes_em_lote(
+            usuario=usuario,
+            movimentacoes=[
+                {"item": item, "estoque": estoque, "tipo_movimentacao": Movimentacao.Tipo.ENTRADA, "quantidade": 1000}
+                for item in itens
+            ],
+        )
+        return usuario, estoque, itens
+
+    def _rodada(self, options, perfil, usuario, estoque, itens):
+        # Processos, como os workers do servidor: threads disputariam o GIL e esconderiam o efeito do banco
+        contexto = multiprocessing.get_context("spawn")
+        papeis = ["ler"] * options["leitores"] + ["escrever"] * options["escritores"]
+        prontos = contexto.Barrier(len(papeis) + 1)
+        parar = contexto.Event()
+        fila = contexto.Queue()
+        ids = {"usuario": usuario.pk, "estoque": estoque.pk, "itens": [item.pk for item in itens]}
+        processos = [
+            contexto.Process(target=trabalhar, args=(papel, options["seed"] + numero, perfil, ids, prontos, parar, fila))
+            for numero, papel in enumerate(papeis)
+        ]
+        for processo in processos:
+            processo.start()
+        # Só começa a contar quando todos os processos terminaram de subir o Django
+        try:
+            prontos.wait(timeout=120)
+        except threading.BrokenBarrierError:
+            for processo in processos:
+                processo.terminate()
+            raise CommandError("Algum processo não conseguiu iniciar; veja o erro acima.")
+        time.sleep(options["segundos"])
+        parar.set()
+        tempos, falhas = {"ler": [], "escrever": []}, 0
+        for _ in processos:
+            papel, locais, falhas_locais = fila.get()
+            tempos[papel] += locais
+            falhas += falhas_locais
+        for processo in processos:
+            processo.join()
+
+        leituras, escritas = sorted(tempos["ler"]), sorted(tempos["escrever"])
+        return {
+            "leituras_s": len(leituras) / options["segundos"],
+            "leitura_p95_ms": percentil(leituras, 95) if leituras else 0.0,
+            "escritas_s": len(escritas) / options["segundos"],
+            "escrita_p95_ms": percentil(escritas, 95) if escritas else 0.0,
+            "falhas": falhas,
+        }
+
+    def _limpar(self, usuario, estoque, itens):
+        Movimentacao.objects.filter(estoque=estoque).delete()
+        ItemEstoque.objects.filter(estoque=estoque).delete()
+        Item.objects.filter(pk__in=[item.pk for item in itens]).delete()
+        estoque.delete()
+        usuario.delete()
+
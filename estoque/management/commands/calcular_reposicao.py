@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque import reposicao
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula consumo, cobertura e ponto de pedido de todos os itens ativos e lista as "
+        "sugestões de compra por fornecedor. O resultado também vai para o cache do relatório."
+    )
+
+    def add_arguments(self, parser):
+        padrao = reposicao.parametros_padrao()
+        parser.add_argument("--janela", type=int, default=padrao["janela"], help="Dias de histórico de saídas.")
+        parser.add_argument("--prazo", type=int, default=padrao["prazo"], help="Prazo de entrega, em dias.")
+        parser.add_argument(
+            "--cobertura", type=int, default=padrao["cobertura"], help="Dias de consumo a comprar além do ponto de pedido."
+        )
+        parser.add_argument(
+            "--fator", type=float, default=padrao["fator"], help="Fator de segurança (desvios padrão; 1,65 ≈ 95%%)."
+        )
+        parser.add_argument("--itens", type=int, default=10, help="Itens listados por fornecedor (0 para nenhum).")
+
+    def handle(self, *args, **options):
+        if options["janela"] < 1 or options["prazo"] < 1 or options["cobertura"] < 0 or options["fator"] < 0:
+            raise CommandError("Janela e prazo devem ser positivos; cobertura e fator, não negativos.")
+
+        inicio = time.perf_counter()
+        resultado = reposicao.relatorio(
+            recalcular=True,
+            janela=options["janela"],
+            prazo=options["prazo"],
+            cobertura=options["cobertura"],
+            fator=options["fator"],
+        )
+        duracao = time.perf_counter() - inicio
+
+        for grupo in resultado["fornecedores"]:
+            self.stdout.write(f"{grupo['fornecedor']}: {len(grupo['itens'])} item(ns), R$ {grupo['valor']:.2f}")
+            for linha in grupo["itens"][: options["itens"]]:
+                cobertura = "-" if linha["dias_cobertura"] is None else f"{linha['dias_cobertura']:.1f} d"
+                self.stdout.write(
+                    f"  {linha['codigo']:<15} saldo {linha['saldo']:>8}  consumo {linha['consumo_diario']:>8.2f}/d  "
+                    f"cobertura {cobertura:>9}  pedir {linha['quantidade']:>8}"
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{resultado['total_sugestoes']} sugestão(ões), R$ {resultado['valor_total']:.2f}, "
+                f"sobre {resultado['itens_analisados']} itens e as saídas de "
+                f"{resultado['inicio']:%d/%m/%Y} a {resultado['fim']:%d/%m/%Y}, em {duracao:.2f} s."
+            )
+        )
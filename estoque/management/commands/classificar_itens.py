@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque import classificacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a classificação ABC (valor consumido) e XYZ (variabilidade da demanda) de todos "
+        "os itens a partir das saídas da janela e regrava a tabela de classificação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--janela", type=int, default=classificacao.JANELA_DIAS, help="Dias de histórico de saídas."
+        )
+
+    def handle(self, *args, **options):
+        if options["janela"] < classificacao.DIAS_POR_PERIODO:
+            raise CommandError(f"A janela deve ter ao menos {classificacao.DIAS_POR_PERIODO} dias.")
+        inicio = time.perf_counter()
+        classes = classificacao.classificar(janela=options["janela"])
+        for abc in "ABC":
+            contagens = "  ".join(f"{abc}{xyz}: {classes[abc + xyz]:>6}" for xyz in "XYZ")
+            self.stdout.write(f"  {contagens}")
+        self.stdout.write(
+            self.style.SUCCESS(f"{sum(classes.values())} itens classificados em {time.perf_counter() - inicio:.2f} s.")
+        )
@@ -0,0 +1,282 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from estoque import custos, kpis, registro, resumo_diario, serie_saldo
+from estoque.busca import indexar_itens
+from estoque.management.commands.benchmark_busca import ATRIBUTOS, MEDIDAS, PRODUTOS, UNIDADES
+from estoque.models import Estoque, Fornecedor, Inventario, InventarioItem, Item, ItemEstoque, Movimentacao, Usuario
+from estoque.saldo_cache import invalidar as invalidar_saldos
+from estoque.services import reconciliar_totais
+
+# Marcas dos registros gerados, usadas para não misturar com dados reais e para --limpar
+PREFIXO_CODIGO = "SIM-"
+PREFIXO_NOME = "SIM "
+USUARIO_GERADOR = "gerador-dados"
+OBSERVACAO_INVENTARIO = "Gerado por gerar_dados"
+CENTAVOS = Decimal("0.01")
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um almoxarifado sintético para medições de desempenho: fornecedores, itens, "
+        "estoques, movimentações e inventários abertos. A mesma semente gera os mesmos dados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--fornecedores", type=int, default=50)
+        parser.add_argument("--itens", type=int, default=5_000)
+        parser.add_argument("--estoques", type=int, default=3)
+        parser.add_argument("--movimentacoes", type=int, default=200_000)
+        parser.add_argument("--inventarios", type=int, default=2)
+        parser.add_argument("--linhas-inventario", type=int, default=2_000, help="Itens contados por inventário.")
+        parser.add_argument("--dias", type=int, default=365, help="Período coberto pelas movimentações.")
+        parser.add_argument(
+            "--ate",
+            metavar="AAAA-MM-DD",
+            help="Último dia das movimentações (padrão: ontem). Fixe para gerar exatamente os mesmos dados em dias diferentes.",
+        )
+        parser.add_argument("--lote", type=int, default=20_000, help="Movimentações gravadas por transação.")
+        parser.add_argument("--limpar", action="store_true", help="Remove os dados gerados anteriormente antes de gerar.")
+
+    def handle(self, *args, **options):
+        if options["itens"] < 1 or options["estoques"] < 1:
+            raise CommandError("Informe ao menos um item e um estoque.")
+        try:
+            ate = date.fromisoformat(options["ate"]) if options["ate"] else timezone.localdate() - timedelta(days=1)
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}")
+        # Cada dia recebe movimentos até as 19h: gerar o dia de hoje criaria movimentações no futuro,
+        # contadas de novo pelos saldos históricos e pelo CMV quando chegassem de fato
+        if ate >= timezone.localdate():
+            raise CommandError("O último dia das movimentações precisa ser anterior a hoje.")
+
+        if options["limpar"]:
+            self._limpar()
+        elif Item.objects.filter(codigo__startswith=PREFIXO_CODIGO).exists():
+            raise CommandError("Já existem dados gerados; use --limpar para gerá-los de novo.")
+
+        inicio = time.perf_counter()
+        aleatorio = random.Random(options["seed"])
+        usuario, _ = Usuario.objects.get_or_create(
+            username=USUARIO_GERADOR,
+            defaults={"email": f"{USUARIO_GERADOR}@localhost", "nome": "Gerador de dados"},
+        )
+        fornecedores = self._gerar_fornecedores(aleatorio, options["fornecedores"])
+        # O estoque padrão das telas (o Depósito Central) é o principal: recebe metade do movimento e os inventários
+        principal = registro.estoque_padrao()
+        estoques = Estoque.objects.bulk_create(
+            [
+                Estoque(localizacao=f"{PREFIXO_NOME}Almoxarifado {numero:02d}")
+                for numero in range(1, options["estoques"] + (0 if principal else 1))
+            ]
+        )
+        if principal:
+            estoques.insert(0, principal)
+        itens = self._gerar_itens(aleatorio, options["itens"], fornecedores)
+        self.stdout.write(f"{len(fornecedores)} fornecedores, {len(estoques)} estoques e {len(itens)} itens gerados.")
+
+        saldos, custos_medios = self._gerar_movimentacoes(aleatorio, options, ate, usuario, itens, estoques)
+        self._gravar_saldos(saldos, custos_medios)
+        # As movimentações entraram por INSERT direto, sem passar pelo resumo diário
+        for _ in resumo_diario.reconstruir(ate - timedelta(days=max(options["dias"], 1) - 1), ate):
+            pass
+        linhas = self._gerar_inventarios(aleatorio, options, ate, usuario, saldos, estoques[0])
+
+        self._atualizar_estatisticas()
+
+        # As gravações em massa não passam pelos save(): caches e totais são acertados aqui
+        registro.invalidar()
+        kpis.invalidar_tudo()
+        serie_saldo.invalidar_tudo()
+        invalidar_saldos(item_ids=[item.pk for item in itens])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{options['movimentacoes']} movimentações, {len(saldos)} saldos e "
+                f"{options['inventarios']} inventário(s) com {linhas} linhas em {time.perf_counter() - inicio:.1f} s."
+            )
+        )
+
+    def _limpar(self):
+        itens = Item.objects.filter(codigo__startswith=PREFIXO_CODIGO)
+        with transaction.atomic():
+            # Exclusões em massa pelo queryset: sem cascatas a coletar, o Django apaga direto no banco
+            Inventario.objects.filter(usuario__username=USUARIO_GERADOR).delete()
+            Movimentacao.objects.filter(item__in=itens).delete()
+            # Os estoques reais (o Depósito Central) continuam: o total deles perde os saldos apagados
+            saldos = ItemEstoque.objects.filter(item__in=itens)
+            removidos = dict(saldos.values("estoque").annotate(total=Sum("qtde")).values_list("estoque", "total"))
+            saldos.delete()
+            Estoque.aplicar_deltas({estoque_id: -total for estoque_id, total in removidos.items()})
+            itens.delete()
+            Estoque.objects.filter(localizacao__startswith=PREFIXO_NOME).delete()
+            Fornecedor.objects.filter(nome__startswith=PREFIXO_NOME).delete()
+            registro.invalidar()
+            kpis.invalidar_tudo()
+        self.stdout.write("Dados gerados anteriormente removidos.")
+
+    def _gerar_fornecedores(self, aleatorio, quantidade):
+        return Fornecedor.objects.bulk_create(
+            [
+                Fornecedor(
+                    nome=f"{PREFIXO_NOME}{aleatorio.choice(PRODUTOS).capitalize()} {aleatorio.choice(ATRIBUTOS)} {numero:03d} Ltda",
+                    cnpj=f"{aleatorio.randint(10**13, 10**14 - 1)}",
+                )
+                for numero in range(1, quantidade + 1)
+            ]
+        )
+
+    def _gerar_itens(self, aleatorio, quantidade, fornecedores):
+        itens, lote = [], []
+        for numero in range(1, quantidade + 1):
+            minimo = aleatorio.choice((0, 5, 10, 20, 50))
+            lote.append(
+                Item(
+                    codigo=f"{PREFIXO_CODIGO}{numero:06d}",
+                    descricao=" ".join(
+                        [aleatorio.choice(PRODUTOS), aleatorio.choice(ATRIBUTOS), aleatorio.choice(MEDIDAS)]
+                    ).capitalize(),
+                    unidade_medida=aleatorio.choice(UNIDADES),
+                    valor_unitario=Decimal(aleatorio.randint(50, 50_000)) / 100,
+                    fornecedor=aleatorio.choice(fornecedores) if fornecedores else None,
+                    estoque_minimo=minimo,
+                    estoque_maximo=minimo * aleatorio.choice((4, 10, 20)),
+                )
+            )
+            if len(lote) >= 5_000:
+                itens += self._gravar_itens(lote)
+                lote = []
+        if lote:
+            itens += self._gravar_itens(lote)
+        return itens
+
+    def _gravar_itens(self, lote):
+        with transaction.atomic():
+            criados = Item.objects.bulk_create(lote)
+            indexar_itens(criados)
+        return criados
+
+    def _gerar_movimentacoes(self, aleatorio, options, ate, usuario, itens, estoques):
+        """
+        Gera as movimentações em ordem cronológica e devolve os saldos e os custos
+        médios finais, ambos por (item_id, estoque_id).
+
+        A procura segue uma cauda longa (poucos itens concentram a maior parte das
+        saídas), o estoque principal recebe metade do movimento e uma saída sem
+        saldo suficiente vira a entrada de reposição, como no almoxarifado real.
+        Cada entrada custa até 15% a mais ou a menos que o valor unitário do item.
+        """
+        total, dias = options["movimentacoes"], max(options["dias"], 1)
+        pesos_itens = list(accumulate(aleatorio.paretovariate(1.2) for _ in itens))
+        pesos_estoques = list(accumulate([max(len(estoques) - 1, 1)] + [1] * (len(estoques) - 1)))
+        conexao = connections[router.db_for_write(Movimentacao)]
+        campos = (
+            "tipo_movimentacao",
+            "observacao",
+            "data_movimentacao",
+            "quantidade",
+            "item",
+            "estoque",
+            "usuario",
+            "custo_unitario",
+        )
+        tabela = conexao.ops.quote_name(Movimentacao._meta.db_table)
+        colunas = ", ".join(conexao.ops.quote_name(Movimentacao._meta.get_field(nome).column) for nome in campos)
+        sql = f"INSERT INTO {tabela} ({colunas}) VALUES ({', '.join(['%s'] * len(campos))})"
+
+        # Sequência própria para os preços: a mesma semente continua gerando as mesmas movimentações
+        precos = random.Random(options["seed"])
+        saldos, custos_medios, linhas, gravadas = {}, {}, [], 0
+        primeiro_dia = ate - timedelta(days=dias - 1)
+        for indice in range(dias):
+            dia = primeiro_dia + timedelta(days=indice)
+            quantidade = total // dias + (1 if indice < total % dias else 0)
+            abertura = timezone.make_aware(datetime.combine(dia, datetime.min.time()) + timedelta(hours=7))
+            segundos = sorted(aleatorio.randrange(12 * 3600) for _ in range(quantidade))
+            escolhidos = aleatorio.choices(itens, cum_weights=pesos_itens, k=quantidade)
+            locais = aleatorio.choices(estoques, cum_weights=pesos_estoques, k=quantidade)
+            for segundo, item, estoque in zip(segundos, escolhidos, locais):
+                par = (item.pk, estoque.pk)
+                saldo = saldos.get(par, 0)
+                sorteio = aleatorio.random()
+                if sorteio < 0.03:
+                    tipo, qtde = Movimentacao.Tipo.AJUSTE, aleatorio.randint(1, 5)
+                elif sorteio < 0.35:
+                    tipo, qtde = Movimentacao.Tipo.ENTRADA, aleatorio.randint(10, 200)
+                else:
+                    tipo, qtde = Movimentacao.Tipo.SAIDA, aleatorio.randint(1, 20)
+                    if qtde > saldo:
+                        tipo, qtde = Movimentacao.Tipo.ENTRADA, max(item.estoque_maximo, qtde * 10)
+                preco = item.valor_unitario
+                if tipo == Movimentacao.Tipo.ENTRADA:
+                    preco = (preco * precos.randint(85, 115) / 100).quantize(CENTAVOS)
+                saldos[par], custos_medios[par], custo = custos.aplicar(
+                    saldo, custos_medios.get(par, Decimal("0")), tipo, qtde, preco
+                )
+                linhas.append(
+                    (
+                        tipo,
+                        "",
+                        conexao.ops.adapt_datetimefield_value(abertura + timedelta(seconds=segundo)),
+                        qtde,
+                        item.pk,
+                        estoque.pk,
+                        usuario.pk,
+                        conexao.ops.adapt_decimalfield_value(custo, 14, 4),
+                    )
+                )
+            if len(linhas) >= options["lote"] or indice == dias - 1:
+                # MELHORIA: executemany direto; com milhões de linhas, instanciar Movimentacao dominaria o tempo
+                with transaction.atomic(using=conexao.alias), conexao.cursor() as cursor:
+                    cursor.executemany(sql, linhas)
+                gravadas += len(linhas)
+                linhas = []
+                self.stdout.write(f"  {gravadas} movimentações gravadas...")
+        return saldos, custos_medios
+
+    def _gravar_saldos(self, saldos, custos_medios):
+        with transaction.atomic():
+            ItemEstoque.objects.bulk_create(
+                [
+                    ItemEstoque(item_id=item_id, estoque_id=estoque_id, qtde=qtde, custo_medio=custos_medios[(item_id, estoque_id)])
+                    for (item_id, estoque_id), qtde in saldos.items()
+                ],
+                batch_size=5_000,
+            )
+            # Totais de Item e Estoque a partir dos saldos recém-gravados
+            reconciliar_totais(corrigir=True)
+
+    def _atualizar_estatisticas(self):
+        # Depois da carga em massa, o otimizador precisa das proporções novas das tabelas para escolher os índices
+        conexao = connections[router.db_for_write(Movimentacao)]
+        if conexao.vendor in ("sqlite", "postgresql"):
+            with conexao.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def _gerar_inventarios(self, aleatorio, options, ate, usuario, saldos, estoque):
+        contados = sorted(item_id for item_id, estoque_id in saldos if estoque_id == estoque.pk)
+        total = 0
+        for numero in range(options["inventarios"]):
+            amostra = sorted(aleatorio.sample(contados, min(options["linhas_inventario"], len(contados))))
+            with transaction.atomic():
+                inventario = Inventario.objects.create(
+                    usuario=usuario, data_inventario=ate - timedelta(days=numero), observacao=OBSERVACAO_INVENTARIO
+                )
+                linhas = []
+                for item_id in amostra:
+                    saldo = saldos[(item_id, estoque.pk)]
+                    # A maior parte confere com o sistema; o resto sobra ou falta um pouco
+                    if aleatorio.random() < 0.2:
+                        saldo = max(saldo + aleatorio.randint(-5, 5), 0)
+                    linhas.append(InventarioItem(inventario=inventario, item_id=item_id, qtde_contada=saldo))
+                InventarioItem.objects.bulk_create(linhas, batch_size=5_000)
+            total += len(linhas)
+        return total
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from estoque.saldos import gravar_fechamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava os saldos de fechamento (SaldoFechamento) usados pelo relatório de CMV. "
+        "Sem argumentos, grava o fechamento de ontem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("datas", nargs="*", help="Datas no formato AAAA-MM-DD.")
+        parser.add_argument(
+            "--mensal-desde",
+            metavar="AAAA-MM-DD",
+            help="Grava o fechamento do último dia de cada mês desde a data informada até ontem.",
+        )
+
+    def handle(self, *args, **options):
+        ontem = timezone.localdate() - timedelta(days=1)
+        try:
+            datas = [date.fromisoformat(valor) for valor in options["datas"]]
+            if options["mensal_desde"]:
+                datas += self._fins_de_mes(date.fromisoformat(options["mensal_desde"]), ontem)
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}")
+        if not datas:
+            datas = [ontem]
+
+        for dia in sorted(set(datas)):
+            pares = gravar_fechamento(dia)
+            self.stdout.write(f"{dia:%d/%m/%Y}: {pares} saldo(s) gravado(s)")
+        self.stdout.write(self.style.SUCCESS("Fechamentos concluídos."))
+
+    def _fins_de_mes(self, inicio, limite):
+        datas = []
+        mes = inicio.replace(day=1)
+        while True:
+            proximo = (mes + timedelta(days=32)).replace(day=1)
+            fim_mes = proximo - timedelta(days=1)
+            if fim_mes > limite:
+                break
+            if fim_mes >= inicio:
+                datas.append(fim_mes)
+            mes = proximo
+        return datas
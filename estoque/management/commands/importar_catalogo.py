@@ -0,0 +1,44 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.importacao import importar_catalogo, ler_planilha
+from estoque.planilhas import PlanilhaInvalida
+
+
+class Command(BaseCommand):
+    help = "Importa (insere ou atualiza pelo código) o catálogo de itens de um arquivo CSV ou XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Caminho do arquivo .csv ou .xlsx com cabeçalho.")
+        parser.add_argument("--lote", type=int, default=1000, help="Linhas gravadas por transação.")
+
+    def handle(self, *args, **options):
+        def progresso(parcial):
+            self.stdout.write(f"  {parcial.linhas} linhas lidas...")
+
+        try:
+            with open(options["arquivo"], "rb") as arquivo:
+                resultado = importar_catalogo(
+                    ler_planilha(arquivo, options["arquivo"]),
+                    tamanho_lote=options["lote"],
+                    ao_gravar_lote=progresso if options["verbosity"] > 1 else None,
+                )
+        except OSError as exc:
+            raise CommandError(f"Não foi possível abrir o arquivo: {exc}")
+        except UnicodeDecodeError:
+            raise CommandError("O arquivo CSV deve estar codificado em UTF-8.")
+        except (ValidationError, PlanilhaInvalida) as exc:
+            raise CommandError(" ".join(getattr(exc, "messages", [str(exc)])))
+
+        for erro in resultado.erros:
+            self.stderr.write(erro)
+        if resultado.total_erros > len(resultado.erros):
+            self.stderr.write(f"... e mais {resultado.total_erros - len(resultado.erros)} linha(s) com erro.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{resultado.linhas} linhas em {resultado.segundos:.1f}s "
+                f"({resultado.linhas_por_segundo:.0f} linhas/s): {resultado.criados} criado(s), "
+                f"{resultado.atualizados} atualizado(s), {resultado.total_erros} com erro, "
+                f"{resultado.fornecedores_criados} fornecedor(es) novo(s)."
+            )
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque import custos, kpis
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula, a partir do histórico de movimentações, o custo médio de cada item em cada estoque, "
+        "o custo das saídas e ajustes, o valor do resumo diário e o valor em estoque dos itens, em lotes de itens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--itens-por-lote", type=int, default=500, help="Itens recalculados por transação.")
+
+    def handle(self, *args, **options):
+        if options["itens_por_lote"] < 1:
+            raise CommandError("Informe ao menos um item por lote.")
+        inicio = time.perf_counter()
+        itens = lidas = alteradas = 0
+        for itens_lote, lidas_lote, alteradas_lote in custos.recalcular(itens_por_lote=options["itens_por_lote"]):
+            itens, lidas, alteradas = itens + itens_lote, lidas + lidas_lote, alteradas + alteradas_lote
+            self.stdout.write(f"  {itens} itens, {lidas} movimentações lidas, {alteradas} com custo alterado")
+        kpis.invalidar_tudo()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Custos de {itens} itens recalculados: {alteradas} de {lidas} movimentações alteradas "
+                f"em {time.perf_counter() - inicio:.1f} s."
+            )
+        )
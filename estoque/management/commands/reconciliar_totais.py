@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from estoque.services import reconciliar_totais
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere os totais materializados de estoques e itens com a soma real "
+        "dos ItemEstoque e corrige as divergências."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--somente-verificar",
+            action="store_true",
+            help="Apenas lista as divergências, sem gravar correções.",
+        )
+
+    def handle(self, *args, **options):
+        corrigir = not options["somente_verificar"]
+        divergencias = reconciliar_totais(corrigir=corrigir)
+        for objeto, gravado, real in divergencias:
+            self.stdout.write(f"{objeto._meta.verbose_name} {objeto}: gravado {gravado}, real {real}")
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS("Nenhuma divergência encontrada."))
+        elif corrigir:
+            self.stdout.write(self.style.SUCCESS(f"{len(divergencias)} registro(s) corrigido(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(divergencias)} registro(s) com divergência."))
@@ -0,0 +1,52 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from estoque import kpis, serie_saldo
+from estoque.models import Movimentacao
+from estoque.resumo_diario import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o resumo diário de movimentações (MovimentacaoDiaria) a partir do histórico, "
+        "em lotes de dias. Sem datas, cobre do primeiro ao último dia com movimentações."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", metavar="AAAA-MM-DD")
+        parser.add_argument("--ate", metavar="AAAA-MM-DD")
+        parser.add_argument("--dias-por-lote", type=int, default=31, help="Dias reconstruídos por transação.")
+
+    def handle(self, *args, **options):
+        if options["dias_por_lote"] < 1:
+            raise CommandError("Informe ao menos um dia por lote.")
+        limites = Movimentacao.objects.aggregate(primeira=Min("data_movimentacao"), ultima=Max("data_movimentacao"))
+        try:
+            desde = date.fromisoformat(options["desde"]) if options["desde"] else None
+            ate = date.fromisoformat(options["ate"]) if options["ate"] else None
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}")
+        if limites["primeira"] is None and (desde is None or ate is None):
+            self.stdout.write("Nenhuma movimentação registrada; nada a reconstruir.")
+            return
+        desde = desde or timezone.localdate(limites["primeira"])
+        ate = ate or max(timezone.localdate(limites["ultima"]), timezone.localdate())
+        if desde > ate:
+            raise CommandError("A data inicial é posterior à final.")
+
+        inicio, total = time.perf_counter(), 0
+        for primeiro, ultimo, linhas in reconstruir(desde, ate, dias_por_lote=options["dias_por_lote"]):
+            total += linhas
+            self.stdout.write(f"  {primeiro:%d/%m/%Y} a {ultimo:%d/%m/%Y}: {linhas} linha(s)")
+        kpis.invalidar_tudo()
+        serie_saldo.invalidar_tudo()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Resumo de {desde:%d/%m/%Y} a {ate:%d/%m/%Y} reconstruído: {total} linha(s) "
+                f"em {time.perf_counter() - inicio:.1f} s."
+            )
+        )
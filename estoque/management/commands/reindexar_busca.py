@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from estoque.busca import indexar_itens
+from estoque.models import Item
+
+
+class Command(BaseCommand):
+    help = "Regrava os termos de busca (ItemTermo) de todos os itens."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=2000, help="Itens processados por transação.")
+
+    def handle(self, *args, **options):
+        lote, total = [], 0
+        for item in Item.objects.only("pk", "codigo", "descricao", "unidade_medida").order_by("pk").iterator(chunk_size=options["lote"]):
+            lote.append(item)
+            if len(lote) >= options["lote"]:
+                indexar_itens(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            indexar_itens(lote)
+            total += len(lote)
+        self.stdout.write(self.style.SUCCESS(f"{total} item(ns) reindexado(s)."))
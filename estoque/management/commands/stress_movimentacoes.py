@@ -0,0 +1,160 @@
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Case, F, IntegerField, Sum, When
+
+from estoque import concorrencia
+from estoque.models import Estoque, Item, ItemEstoque, Movimentacao, Usuario
+from estoque.services import registrar_movimentacao, registrar_movimentacoes_em_lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispara operadores simultâneos (threads) registrando entradas e saídas em um único estoque "
+        "e confere, ao final, que nenhum saldo ficou negativo e que saldos e totais batem com as "
+        "movimentações gravadas. Os dados criados são removidos ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--operacoes", type=int, default=200, help="Movimentações por thread.")
+        parser.add_argument("--itens", type=int, default=5, help="Poucos itens aumentam a disputa.")
+        parser.add_argument("--saldo-inicial", type=int, default=20)
+        parser.add_argument("--lote", type=int, default=0, help="A cada N operações, uma vai pelo registro em lote.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--manter", action="store_true", help="Não remove os dados criados.")
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            raise CommandError("O teste exige um banco em arquivo; em memória cada thread veria um banco diferente.")
+
+        usuario, estoque, itens = self._preparar(options)
+        inicio_concorrencia = concorrencia.estatisticas()
+        resultados = Counter()
+        erros = []
+        self._trava = threading.Lock()
+        barreira = threading.Barrier(options["threads"])
+        threads = [
+            threading.Thread(target=self._operador, args=(numero, options, usuario, estoque, itens, barreira, resultados, erros))
+            for numero in range(options["threads"])
+        ]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        segundos = time.perf_counter() - inicio
+
+        fim_concorrencia = concorrencia.estatisticas()
+        total = sum(resultados.values())
+        self.stdout.write(
+            f"{options['threads']} threads x {options['operacoes']} operações em {len(itens)} itens: "
+            f"{segundos:.2f} s ({total / segundos:.0f} op/s)"
+        )
+        self.stdout.write(
+            f"  gravadas {resultados['gravadas']} | recusadas por saldo {resultados['recusadas']} | "
+            f"falhas {resultados['falhas']} | repetições por conflito "
+            f"{fim_concorrencia['repeticoes'] - inicio_concorrencia['repeticoes']}"
+        )
+        for erro in erros[:5]:
+            self.stdout.write(self.style.WARNING(f"  {erro}"))
+
+        try:
+            problemas = self._conferir(estoque, itens)
+        finally:
+            if not options["manter"]:
+                self._limpar(usuario, estoque, itens)
+        for problema in problemas:
+            self.stdout.write(self.style.ERROR(f"  {problema}"))
+        if problemas:
+            raise CommandError(f"{len(problemas)} inconsistência(s) encontrada(s).")
+        self.stdout.write(self.style.SUCCESS("Nenhum saldo negativo; saldos e totais conferem com as movimentações."))
+
+    def _preparar(self, options):
+        marca = time.strftime("%Y%m%d%H%M%S")
+        usuario = Usuario.objects.create(
+            username=f"stress-{marca}", email=f"stress-{marca}@localhost", nome="Teste de concorrência"
+        )
+        estoque = Estoque.objects.create(localizacao=f"Teste de concorrência {marca}")
+        itens = Item.objects.bulk_create(
+            [
+                Item(codigo=f"STRESS-{marca}-{numero:03d}", descricao=f"Item de teste {numero}", unidade_medida="un", valor_unitario=Decimal("1.00"))
+                for numero in range(options["itens"])
+            ]
+        )
+        if options["saldo_inicial"]:
+            registrar_movimentacoes_em_lote(
+                usuario=usuario,
+                movimentacoes=[
+                    {"item": item, "estoque": estoque, "tipo_movimentacao": Movimentacao.Tipo.ENTRADA, "quantidade": options["saldo_inicial"]}
+                    for item in itens
+                ],
+            )
+        return usuario, estoque, itens
+
+    def _operador(self, numero, options, usuario, estoque, itens, barreira, resultados, erros):
+        aleatorio = random.Random(options["seed"] + numero)
+        contagem = Counter()
+        try:
+            barreira.wait()
+            for operacao in range(1, options["operacoes"] + 1):
+                # Mais saídas que entradas: o saldo fica perto de zero e as recusas são frequentes
+                tipo = Movimentacao.Tipo.SAIDA if aleatorio.random() < 0.6 else Movimentacao.Tipo.ENTRADA
+                mov = {"item": aleatorio.choice(itens), "estoque": estoque, "tipo_movimentacao": tipo, "quantidade": aleatorio.randint(1, 5)}
+                try:
+                    if options["lote"] and operacao % options["lote"] == 0:
+                        registrar_movimentacoes_em_lote(usuario=usuario, movimentacoes=[mov])
+                    else:
+                        registrar_movimentacao(usuario=usuario, **mov)
+                except ValidationError:
+                    contagem["recusadas"] += 1
+                except OperationalError as exc:
+                    contagem["falhas"] += 1
+                    erros.append(f"thread {numero}: {exc}")
+                else:
+                    contagem["gravadas"] += 1
+        finally:
+            connections.close_all()
+            with self._trava:
+                resultados.update(contagem)
+
+    def _conferir(self, estoque, itens):
+        problemas = []
+        sinal = Case(
+            When(tipo_movimentacao=Movimentacao.Tipo.SAIDA, then=-F("quantidade")),
+            default=F("quantidade"),
+            output_field=IntegerField(),
+        )
+        razao = dict(
+            Movimentacao.objects.filter(estoque=estoque)
+            .values("item")
+            .annotate(saldo=Sum(sinal))
+            .values_list("item", "saldo")
+        )
+        saldos = dict(ItemEstoque.objects.filter(estoque=estoque).values_list("item_id", "qtde"))
+        totais = dict(Item.objects.filter(pk__in=[item.pk for item in itens]).values_list("pk", "qtde_total"))
+        for item in itens:
+            saldo = saldos.get(item.pk, 0)
+            if saldo < 0:
+                problemas.append(f"{item.codigo}: saldo negativo ({saldo}).")
+            if saldo != razao.get(item.pk, 0):
+                problemas.append(f"{item.codigo}: saldo {saldo}, movimentações somam {razao.get(item.pk, 0)}.")
+            if totais[item.pk] != saldo:
+                problemas.append(f"{item.codigo}: qtde_total {totais[item.pk]}, saldo {saldo}.")
+        estoque.refresh_from_db()
+        if estoque.total_atual() != sum(saldos.values()):
+            problemas.append(f"Estoque: total {estoque.total_atual()}, soma dos saldos {sum(saldos.values())}.")
+        return problemas
+
+    def _limpar(self, usuario, estoque, itens):
+        Movimentacao.objects.filter(estoque=estoque).delete()
+        ItemEstoque.objects.filter(estoque=estoque).delete()
+        Item.objects.filter(pk__in=[item.pk for item in itens]).delete()
+        estoque.delete()
+        usuario.delete()
@@ -0,0 +1,295 @@
+import json
+import random
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from estoque.management.commands.benchmark import CENARIOS as CENARIOS_BENCHMARK
+from estoque.management.commands.benchmark import Command as Benchmark
+from estoque.models import (
+    ClassificacaoItem,
+    Fornecedor,
+    InventarioItem,
+    Item,
+    ItemEstoque,
+    ItemTermo,
+    Movimentacao,
+    MovimentacaoDiaria,
+    SaldoFechamento,
+    Usuario,
+)
+from estoque.registro import estoque_padrao
+
+# Tabelas que crescem com o uso; varrê-las por inteiro numa tela é o que este comando procura
+MODELOS_GRANDES = (
+    Movimentacao,
+    MovimentacaoDiaria,
+    ItemEstoque,
+    Item,
+    ItemTermo,
+    InventarioItem,
+    SaldoFechamento,
+    ClassificacaoItem,
+)
+
+CENARIOS = (
+    *CENARIOS_BENCHMARK,
+    "item_list_fornecedor",
+    "item_list_classe",
+    "item_detail",
+    "api_item_serie_saldo",
+    "movimentacao_list_item",
+    "inventario_list",
+    "relatorio_cmv",
+    "relatorio_reposicao",
+)
+
+# Varreduras completas inerentes à consulta (totais sobre a tabela inteira), por (cenário, tabela)
+VARREDURAS_ESPERADAS = {
+    ("dashboard", Item._meta.db_table): "O total de itens e o valor em estoque somam todos os itens.",
+    ("relatorio_cmv", Item._meta.db_table): "O detalhamento lista todos os itens com saldo no fim do período.",
+    ("relatorio_cmv", ItemEstoque._meta.db_table): "O estoque final do período é o saldo de todos os pares.",
+    ("relatorio_reposicao", Item._meta.db_table): "A reposição avalia todos os itens ativos.",
+}
+
+# SQLite: "SCAN tabela" (ou "SCAN alias"), com ou sem "USING [COVERING] INDEX", lê a tabela (ou o índice)
+# inteira; só "SEARCH ... (col=? / col>?)" restringe a leitura a um intervalo da chave
+_SCAN_SQLITE = re.compile(r"^SCAN (\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?$")
+# LIMIT da consulta principal: percorrer um índice na ordem pedida para só após N linhas
+_LIMITE_SQL = re.compile(r"\bLIMIT \d+(?: OFFSET \d+)?\s*$", re.IGNORECASE)
+
+
+def varridas_sqlite(sql, plano, indices_parciais=()):
+    """
+    Tabelas que o plano do SQLite (linhas do EXPLAIN QUERY PLAN) lê por inteiro.
+
+    Um SCAN sem índice conta sempre. Um SCAN que percorre um índice conta,
+    a não ser que a consulta termine em LIMIT (o índice entrega as linhas na
+    ordem pedida e a leitura para nas primeiras) ou que o índice seja parcial
+    (``indices_parciais``: só tem as linhas que atendem à sua condição).
+    """
+    # O plano mostra o apelido quando a consulta usa um (subconsultas do Django: U0, U1...)
+    apelidos = dict((apelido, tabela) for tabela, apelido in re.findall(r'"(\w+)" (U\d+)\b', sql))
+    limitada = bool(_LIMITE_SQL.search(sql))
+    varridas = set()
+    for linha in plano:
+        encontrado = _SCAN_SQLITE.match(linha.strip())
+        indice = encontrado and encontrado.group(3)
+        if encontrado is None or (indice and (limitada or indice in indices_parciais)):
+            continue
+        nome = encontrado.group(2) or encontrado.group(1)
+        varridas.add(apelidos.get(nome, encontrado.group(1)))
+    return varridas
+
+
+def varridas_postgresql(raiz, indices_parciais=()):
+    """
+    Plano do PostgreSQL (EXPLAIN em JSON) em linhas de texto e as tabelas lidas por inteiro.
+
+    Seq Scan conta sempre; Index Scan e Index Only Scan sem "Index Cond"
+    percorrem o índice inteiro e contam com as mesmas exceções do SQLite
+    (abaixo de um Limit ou em índice parcial).
+    """
+    plano, varridas = [], set()
+    pendentes = [(raiz, 0, False)]
+    while pendentes:
+        no, nivel, limitado = pendentes.pop()
+        tipo = no["Node Type"]
+        plano.append(f"{'  ' * nivel}{tipo} {no.get('Relation Name', '')} {no.get('Index Cond', '')}".rstrip())
+        if tipo == "Seq Scan":
+            varridas.add(no["Relation Name"])
+        elif tipo in ("Index Scan", "Index Only Scan") and "Index Cond" not in no:
+            if not limitado and no.get("Index Name") not in indices_parciais:
+                varridas.add(no["Relation Name"])
+        limitado = limitado or tipo == "Limit"
+        pendentes.extend((filho, nivel + 1, limitado) for filho in reversed(no.get("Plans", [])))
+    return plano, varridas
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa as principais telas e APIs sobre os dados atuais, roda EXPLAIN em cada consulta "
+        "e falha se alguma varrer por inteiro uma das tabelas grandes. As gravações são desfeitas ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cenarios", nargs="*", help=f"Padrão: todos ({', '.join(CENARIOS)}).")
+        parser.add_argument(
+            "--min-linhas",
+            type=int,
+            default=1_000,
+            help="Tabelas menores que isso são ignoradas: nelas a varredura é o plano certo.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--detalhes", action="store_true", help="Mostra o plano de cada consulta.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"EXPLAIN não suportado para {connection.vendor}.")
+        cenarios = options["cenarios"] or list(CENARIOS)
+        desconhecidos = set(cenarios) - set(CENARIOS)
+        if desconhecidos:
+            raise CommandError(f"Cenário(s) desconhecido(s): {', '.join(sorted(desconhecidos))}.")
+
+        grandes = {
+            modelo._meta.db_table
+            for modelo in MODELOS_GRANDES
+            if modelo.objects.count() >= options["min_linhas"]
+        }
+        if not grandes:
+            raise CommandError(
+                f"Nenhuma tabela com {options['min_linhas']} linhas ou mais; gere dados com gerar_dados antes."
+            )
+
+        if connection.vendor == "sqlite" and not self._tem_estatisticas():
+            self.stdout.write(
+                self.style.WARNING("O banco não tem estatísticas (ANALYZE nunca rodou); o SQLite pode ignorar os índices.")
+            )
+
+        problemas = 0
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]), transaction.atomic():
+            usuario = Usuario.objects.create(
+                username="verificar-indices", email="verificar-indices@localhost", nome="Verificação", is_staff=True
+            )
+            cliente = Client()
+            cliente.force_login(usuario)
+            benchmark = Benchmark(stdout=self.stdout, stderr=self.stderr)
+            aleatorio = random.Random(options["seed"])
+            for nome in cenarios:
+                preparar = getattr(self, f"_preparar_{nome}", None) or getattr(benchmark, f"_preparar_{nome}")
+                requisicao = preparar(aleatorio)
+                if requisicao is None:
+                    self.stdout.write(self.style.WARNING(f"{nome}: sem dados para verificar, ignorado."))
+                    continue
+                problemas += self._verificar(nome, cliente, requisicao(), grandes, options)
+            transaction.set_rollback(True)
+
+        if problemas:
+            raise CommandError(f"{problemas} consulta(s) varrem tabelas grandes por inteiro.")
+        self.stdout.write(self.style.SUCCESS(f"Nenhuma varredura completa inesperada em {', '.join(sorted(grandes))}."))
+
+    def _verificar(self, nome, cliente, requisicao, grandes, options):
+        metodo, url, dados, status_esperado = requisicao
+        consultas = []
+
+        def capturar(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                consultas.append((sql, params))
+            return execute(sql, params, many, context)
+
+        # Sem cache, para que as consultas que ele esconde também sejam verificadas
+        for cache in caches.all():
+            cache.clear()
+        with transaction.atomic(), connection.execute_wrapper(capturar):
+            resposta = getattr(cliente, metodo)(url, dados)
+            if resposta.streaming:
+                b"".join(resposta.streaming_content)
+            transaction.set_rollback(True)
+        if resposta.status_code != status_esperado:
+            raise CommandError(f"{metodo.upper()} {url} respondeu {resposta.status_code}, esperado {status_esperado}.")
+
+        problemas = 0
+        for sql, params in consultas:
+            plano, varridas = self._explicar(sql, params)
+            inesperadas = sorted(
+                tabela for tabela in varridas & grandes if (nome, tabela) not in VARREDURAS_ESPERADAS
+            )
+            if options["detalhes"] or inesperadas:
+                estilo = self.style.ERROR if inesperadas else (lambda texto: texto)
+                self.stdout.write(estilo(f"{nome}: {sql[:200]}"))
+                for linha in plano:
+                    self.stdout.write(f"    {linha}")
+            problemas += bool(inesperadas)
+        self.stdout.write(f"{nome}: {len(consultas)} consulta(s), {problemas} com varredura completa inesperada.")
+        return problemas
+
+    def _indices_parciais(self):
+        if not hasattr(self, "_parciais"):
+            with connection.cursor() as cursor:
+                if connection.vendor == "sqlite":
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+                else:
+                    cursor.execute("SELECT indexname FROM pg_indexes WHERE indexdef LIKE '% WHERE %'")
+                self._parciais = {nome for (nome,) in cursor.fetchall()}
+        return self._parciais
+
+    def _tem_estatisticas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            return cursor.fetchone() is not None
+
+    def _explicar(self, sql, params):
+        """Plano da consulta em linhas de texto e as tabelas lidas por inteiro."""
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plano = [linha[-1] for linha in cursor.fetchall()]
+                return plano, varridas_sqlite(sql, plano, self._indices_parciais())
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            bruto = cursor.fetchone()[0]
+        nos = json.loads(bruto) if isinstance(bruto, str) else bruto
+        return varridas_postgresql(nos[0]["Plan"], self._indices_parciais())
+
+    # Cenários além dos do benchmark, com a mesma convenção de _preparar_*
+
+    def _preparar_item_list_fornecedor(self, aleatorio):
+        fornecedor = Fornecedor.objects.filter(itens__isnull=False).order_by("pk").first()
+        if fornecedor is None:
+            return None
+        return lambda: ("get", reverse("item_list"), {"fornecedor": fornecedor.pk}, 200)
+
+    def _preparar_item_list_classe(self, aleatorio):
+        if not ClassificacaoItem.objects.exists():
+            return None
+        return lambda: ("get", reverse("item_list"), {"classe_abc": "A", "classe_xyz": "X"}, 200)
+
+    def _preparar_item_detail(self, aleatorio):
+        item_id = self._item_mais_movimentado()
+        if item_id is None:
+            return None
+        return lambda: ("get", reverse("item_detail", args=[item_id]), {}, 200)
+
+    def _preparar_api_item_serie_saldo(self, aleatorio):
+        item_id = self._item_mais_movimentado()
+        if item_id is None:
+            return None
+        return lambda: ("get", reverse("api_item_serie_saldo", args=[item_id]), {"dias": 3650}, 200)
+
+    def _item_mais_movimentado(self):
+        return (
+            MovimentacaoDiaria.objects.values("item_id")
+            .annotate(total=Sum("movimentacoes"))
+            .order_by("-total")
+            .values_list("item_id", flat=True)
+            .first()
+        )
+
+    def _preparar_movimentacao_list_item(self, aleatorio):
+        estoque = estoque_padrao()
+        par = ItemEstoque.objects.filter(estoque=estoque).order_by("pk").values_list("item_id", "estoque_id").first()
+        if par is None:
+            return None
+        return lambda: ("get", reverse("movimentacao_list"), {"item": par[0], "estoque": par[1]}, 200)
+
+    def _preparar_inventario_list(self, aleatorio):
+        return lambda: ("get", reverse("inventario_list"), {}, 200)
+
+    def _preparar_relatorio_cmv(self, aleatorio):
+        hoje = timezone.localdate()
+        return lambda: (
+            "get",
+            reverse("relatorio_cmv"),
+            {"data_inicio": hoje.replace(day=1).isoformat(), "data_fim": hoje.isoformat()},
+            200,
+        )
+
+    def _preparar_relatorio_reposicao(self, aleatorio):
+        return lambda: ("get", reverse("relatorio_reposicao"), {}, 200)
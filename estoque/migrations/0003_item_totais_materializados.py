@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 11:34
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def preencher_totais(apps, schema_editor):
+    Item = apps.get_model("estoque", "Item")
+    ItemEstoque = apps.get_model("estoque", "ItemEstoque")
+    soma = (
+        ItemEstoque.objects.filter(item=OuterRef("pk"))
+        .values("item")
+        .annotate(total=Sum("qtde"))
+        .values("total")
+    )
+    Item.objects.update(qtde_total=Coalesce(Subquery(soma), 0))
+    Item.objects.update(
+        valor_estoque=ExpressionWrapper(
+            F("qtde_total") * F("valor_unitario"),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0002_default_estoques'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='qtde_total',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='valor_estoque',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0003_item_totais_materializados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['-data_movimentacao', '-id'], name='mov_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['tipo_movimentacao', '-data_movimentacao', '-id'], name='mov_tipo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['item', '-data_movimentacao', '-id'], name='mov_item_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['estoque', '-data_movimentacao', '-id'], name='mov_estoque_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['usuario', '-data_movimentacao', '-id'], name='mov_usuario_data_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 11:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0004_movimentacao_indices_paginacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoFechamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(db_index=True)),
+                ('qtde', models.PositiveIntegerField(default=0)),
+                ('estoque', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fechamentos', to='estoque.estoque')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fechamentos', to='estoque.item')),
+            ],
+            options={
+                'verbose_name': 'Fechamento de saldo',
+                'verbose_name_plural': 'Fechamentos de saldo',
+                'ordering': ['-data'],
+                'unique_together': {('data', 'estoque', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2 on 2026-10-18 11:40
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Cópia congelada das regras de estoque.busca desta versão: a migração não pode
+# mudar quando o módulo mudar
+_PALAVRAS = re.compile(r"[0-9a-z]+")
+
+
+def _normalizar(texto):
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold().strip()
+
+
+def termos_do_item(codigo, descricao, unidade_medida):
+    termos = set()
+    codigo_normalizado = _normalizar(codigo)
+    if codigo_normalizado:
+        termos.add((codigo_normalizado[:100], "C"))
+    termos.update((palavra[:100], "C") for palavra in _PALAVRAS.findall(codigo_normalizado))
+    termos.update((palavra[:100], "D") for palavra in _PALAVRAS.findall(_normalizar(descricao)))
+    termos.update((palavra[:100], "U") for palavra in _PALAVRAS.findall(_normalizar(unidade_medida)))
+    return termos
+
+
+def indexar_itens_existentes(apps, schema_editor):
+    Item = apps.get_model("estoque", "Item")
+    ItemTermo = apps.get_model("estoque", "ItemTermo")
+    lote = []
+    for item in Item.objects.only("pk", "codigo", "descricao", "unidade_medida").iterator(chunk_size=2000):
+        lote.extend(
+            ItemTermo(item_id=item.pk, termo=termo, campo=campo)
+            for termo, campo in termos_do_item(item.codigo, item.descricao, item.unidade_medida)
+        )
+        if len(lote) >= 5000:
+            ItemTermo.objects.bulk_create(lote)
+            lote = []
+    ItemTermo.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0005_saldo_fechamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemTermo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=100)),
+                ('campo', models.CharField(choices=[('C', 'Código'), ('D', 'Descrição'), ('U', 'Unidade de medida')], max_length=1)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos', to='estoque.item')),
+            ],
+            options={
+                'verbose_name': 'Termo de busca',
+                'verbose_name_plural': 'Termos de busca',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itemtermo',
+            index=models.Index(fields=['termo', 'campo', 'item'], name='item_termo_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemtermo',
+            index=models.Index(fields=['item', 'termo'], name='item_termo_item_idx'),
+        ),
+        migrations.RunPython(indexar_itens_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0006_item_termo_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventario',
+            name='encerrado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventario',
+            name='estoque_encerramento',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='inventarios_encerrados', to='estoque.estoque'),
+        ),
+        migrations.AddField(
+            model_name='inventarioitem',
+            name='diferenca',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventarioitem',
+            name='saldo_sistema',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 12:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0007_inventario_encerramento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstoqueTotalParcial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fatia', models.PositiveSmallIntegerField()),
+                ('qtde', models.IntegerField(default=0)),
+                ('estoque', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parciais', to='estoque.estoque')),
+            ],
+            options={
+                'verbose_name': 'Parcela do total do estoque',
+                'verbose_name_plural': 'Parcelas do total do estoque',
+                'unique_together': {('estoque', 'fatia')},
+            },
+        ),
+    ]
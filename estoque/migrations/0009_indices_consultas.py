@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+def atualizar_estatisticas(apps, schema_editor):
+    # Sem estatísticas o SQLite não sabe que Estoque é pequena e ItemEstoque grande, e ignora os índices novos
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("ANALYZE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0008_estoque_total_parcial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(fields=['-data_inventario', '-id'], name='inventario_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['descricao'], name='item_descricao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['fornecedor', 'descricao'], name='item_fornecedor_descricao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('ativo', True), ('qtde_total__lt', models.F('estoque_minimo'))), fields=['descricao'], name='item_abaixo_minimo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemestoque',
+            index=models.Index(fields=['estoque', 'qtde', 'item'], name='item_estoque_qtde_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['item', 'estoque', '-data_movimentacao', '-id'], name='mov_item_estoque_data_idx'),
+        ),
+        migrations.RunPython(atualizar_estatisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2 on 2026-10-18 12:35
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def preencher_resumo(apps, schema_editor):
+    # Agrega o histórico existente com os modelos desta migração; depois, reconstruir_resumo_diario refaz qualquer período
+    Movimentacao = apps.get_model("estoque", "Movimentacao")
+    MovimentacaoDiaria = apps.get_model("estoque", "MovimentacaoDiaria")
+    valor = ExpressionWrapper(
+        F("quantidade") * F("item__valor_unitario"), output_field=DecimalField(max_digits=16, decimal_places=2)
+    )
+    somas = (
+        Movimentacao.objects.annotate(dia=TruncDate("data_movimentacao"))
+        .values("dia", "item_id", "estoque_id", "tipo_movimentacao")
+        .annotate(soma_quantidade=Sum("quantidade"), soma_valor=Sum(valor), total=Count("pk"))
+        .order_by()
+    )
+    lote = []
+    for soma in somas.iterator(chunk_size=5000):
+        lote.append(
+            MovimentacaoDiaria(
+                data=soma["dia"],
+                item_id=soma["item_id"],
+                estoque_id=soma["estoque_id"],
+                tipo_movimentacao=soma["tipo_movimentacao"],
+                quantidade=soma["soma_quantidade"],
+                valor=Decimal(soma["soma_valor"]).quantize(Decimal("0.01")),
+                movimentacoes=soma["total"],
+            )
+        )
+        if len(lote) >= 5000:
+            MovimentacaoDiaria.objects.bulk_create(lote)
+            lote = []
+    MovimentacaoDiaria.objects.bulk_create(lote)
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("ANALYZE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0009_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentacaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('tipo_movimentacao', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SAIDA', 'Saída'), ('AJUSTE', 'Ajuste')], max_length=20)),
+                ('quantidade', models.PositiveBigIntegerField(default=0)),
+                ('valor', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('movimentacoes', models.PositiveIntegerField(default=0)),
+                ('estoque', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movimentacoes_diarias', to='estoque.estoque')),
+                ('item', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movimentacoes_diarias', to='estoque.item')),
+            ],
+            options={
+                'verbose_name': 'Movimentação diária',
+                'verbose_name_plural': 'Movimentações diárias',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaodiaria',
+            index=models.Index(fields=['data', 'tipo_movimentacao', 'quantidade', 'valor', 'movimentacoes'], name='mov_diaria_data_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaodiaria',
+            index=models.Index(fields=['estoque', 'data', 'tipo_movimentacao', 'quantidade', 'valor', 'movimentacoes'], name='mov_diaria_estoque_data_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='movimentacaodiaria',
+            unique_together={('item', 'estoque', 'data', 'tipo_movimentacao')},
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0010_movimentacao_diaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacaodiaria',
+            index=models.Index(fields=['tipo_movimentacao', 'data', 'item', 'quantidade'], name='mov_diaria_tipo_data_item_idx'),
+        ),
+    ]
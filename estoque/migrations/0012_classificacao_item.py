@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 12:48
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0011_indice_reposicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassificacaoItem',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='classificacao', serialize=False, to='estoque.item')),
+                ('classe_abc', models.CharField(choices=[('A', 'A - maior valor consumido'), ('B', 'B - valor intermediário'), ('C', 'C - menor valor consumido')], max_length=1)),
+                ('classe_xyz', models.CharField(choices=[('X', 'X - demanda estável'), ('Y', 'Y - demanda variável'), ('Z', 'Z - demanda irregular')], max_length=1)),
+                ('valor_consumo', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('coeficiente_variacao', models.FloatField(null=True)),
+                ('calculado_em', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Classificação de item',
+                'verbose_name_plural': 'Classificações de itens',
+            },
+        ),
+        migrations.AlterField(
+            model_name='inventarioitem',
+            name='qtde_contada',
+            field=models.PositiveIntegerField(help_text='Quantidade contada no inventário', null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddIndex(
+            model_name='classificacaoitem',
+            index=models.Index(fields=['classe_abc', 'classe_xyz'], name='classificacao_classes_idx'),
+        ),
+    ]
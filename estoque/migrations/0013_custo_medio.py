@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 12:54
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_custos(apps, schema_editor):
+    # Sem o histórico de preços, tudo parte do valor unitário atual (o mesmo que os valores usavam até aqui);
+    # o comando recalcular_custos refaz as médias quando as entradas passarem a ter o próprio custo
+    Item = apps.get_model("estoque", "Item")
+    ItemEstoque = apps.get_model("estoque", "ItemEstoque")
+    Movimentacao = apps.get_model("estoque", "Movimentacao")
+    preco = Subquery(Item.objects.filter(pk=OuterRef("item_id")).values("valor_unitario")[:1])
+    Movimentacao.objects.update(custo_unitario=preco)
+    ItemEstoque.objects.update(custo_medio=preco)
+    # No SQLite as colunas novas recriam as tabelas, e as estatísticas do otimizador vão junto
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("ANALYZE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0012_classificacao_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemestoque',
+            name='custo_medio',
+            field=models.DecimalField(decimal_places=4, default=Decimal('0'), editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='movimentacao',
+            name='custo_unitario',
+            field=models.DecimalField(decimal_places=4, default=Decimal('0'), editable=False, max_digits=14),
+        ),
+        migrations.RunPython(preencher_custos, migrations.RunPython.noop),
+    ]
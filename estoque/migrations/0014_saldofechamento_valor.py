@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 16:20
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, Sum, When
+
+
+def valorizar_fechamentos(apps, schema_editor):
+    # O valor ao fim de cada dia fechado é o valor atual do par (qtde x custo médio) menos o das
+    # movimentações dos dias seguintes, que o resumo diário já traz pelo custo gravado
+    ItemEstoque = apps.get_model("estoque", "ItemEstoque")
+    MovimentacaoDiaria = apps.get_model("estoque", "MovimentacaoDiaria")
+    SaldoFechamento = apps.get_model("estoque", "SaldoFechamento")
+    atuais = {
+        (item_id, estoque_id): qtde * custo_medio
+        for item_id, estoque_id, qtde, custo_medio in ItemEstoque.objects.values_list(
+            "item_id", "estoque_id", "qtde", "custo_medio"
+        )
+    }
+    valor_com_sinal = Case(
+        When(tipo_movimentacao="SAIDA", then=-F("valor")),
+        default=F("valor"),
+        output_field=DecimalField(max_digits=16, decimal_places=2),
+    )
+    for data in SaldoFechamento.objects.values_list("data", flat=True).distinct().order_by("data"):
+        posteriores = {
+            (linha["item_id"], linha["estoque_id"]): linha["valor"]
+            for linha in MovimentacaoDiaria.objects.filter(data__gt=data)
+            .values("item_id", "estoque_id")
+            .annotate(valor=Sum(valor_com_sinal))
+            .order_by()
+        }
+        fechamentos = list(SaldoFechamento.objects.filter(data=data))
+        for fechamento in fechamentos:
+            par = (fechamento.item_id, fechamento.estoque_id)
+            valor = atuais.get(par, Decimal("0")) - posteriores.get(par, Decimal("0"))
+            fechamento.valor = valor.quantize(Decimal("0.01"))
+        SaldoFechamento.objects.bulk_update(fechamentos, ["valor"], batch_size=1000)
+    # No SQLite a coluna nova recria a tabela, e as estatísticas do otimizador vão junto
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("ANALYZE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0013_custo_medio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saldofechamento',
+            name='valor',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.RunPython(valorizar_fechamentos, migrations.RunPython.noop),
+    ]
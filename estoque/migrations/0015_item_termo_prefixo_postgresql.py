@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+def criar_indice(apps, schema_editor):
+    # No PostgreSQL o LIKE 'prefixo%' da busca só usa um índice de colação C ou varchar_pattern_ops;
+    # nos demais bancos o índice (termo, campo, item) já atende a busca
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS item_termo_prefixo_idx "
+        "ON estoque_itemtermo (termo varchar_pattern_ops, campo, item_id)"
+    )
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS item_termo_prefixo_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0014_saldofechamento_valor'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -1,13 +1,34 @@
+import random
+from collections import Counter
 from decimal import Decimal
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
 from django.utils import timezone
 
 
+def agrupar_por_delta(deltas, tamanho_lote=500):
+    """
+    Agrupa {pk: delta} em lotes (delta, [pks]) com a mesma variação.
+
+    Cada lote vira um UPDATE simples (``campo = campo + delta WHERE pk IN ...``);
+    na prática há poucas variações distintas, e o custo fica bem abaixo de um
+    CASE com um ramo por linha.
+    """
+    grupos = {}
+    for pk, delta in sorted(deltas.items()):
+        if delta:
+            grupos.setdefault(delta, []).append(pk)
+    for delta, pks in sorted(grupos.items()):
+        for inicio in range(0, len(pks), tamanho_lote):
+            yield delta, pks[inicio:inicio + tamanho_lote]
+
+
 class Usuario(AbstractUser):
     """Usuários da aplicação alinhados ao DER."""
 
@@ -58,20 +79,147 @@ class Item(models.Model):
     estoque_maximo = models.PositiveIntegerField(default=0)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
+    # MELHORIA: totais materializados para as listagens não agregarem ItemEstoque a cada acesso
+    qtde_total = models.PositiveIntegerField(default=0, editable=False, db_index=True)
+    # Soma de qtde x custo médio dos ItemEstoque do item: mudar o valor_unitario não o altera
+    valor_estoque = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), editable=False, db_index=True
+    )
+
+    # Campos mantidos por aplicar_deltas; nunca são regravados a partir da instância em memória
+    CAMPOS_MATERIALIZADOS = ("qtde_total", "valor_estoque")
 
     class Meta:
         ordering = ["descricao"]
+        # MELHORIA: índices no formato das consultas das listagens e do dashboard
+        indexes = [
+            models.Index(fields=["descricao"], name="item_descricao_idx"),
+            models.Index(fields=["fornecedor", "descricao"], name="item_fornecedor_descricao_idx"),
+            # Parcial: só os itens ativos abaixo do mínimo, em ordem de descrição (onde o banco suporta)
+            models.Index(
+                fields=["descricao"],
+                condition=Q(ativo=True, qtde_total__lt=F("estoque_minimo")),
+                name="item_abaixo_minimo_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.descricao
 
+    def clean(self):
+        # Regra usada pelo ItemForm e pela importação do catálogo
+        if self.estoque_maximo and self.estoque_minimo and self.estoque_maximo < self.estoque_minimo:
+            raise ValidationError("Estoque máximo não pode ser menor que o mínimo.")
+
     @property
     def estoque_total(self) -> int:
         """Total disponível considerando todos os estoques."""
-        return (
-            self.estoques.aggregate(total=Coalesce(Sum("qtde"), 0)).get("total")
-            or 0
+        return self.qtde_total
+
+    def save(self, *args, **kwargs):
+        from .kpis import invalidar, invalidar_tudo
+        from .saldo_cache import invalidar as invalidar_saldos
+
+        # As invalidações são registradas depois da gravação, na mesma transação: se ela
+        # falhar, nada é descartado; se der certo, os caches são descartados no commit
+        if self._state.adding:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self._indexar_busca()
+                invalidar()
+            return
+        if kwargs.get("update_fields") is not None:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if {"codigo", "descricao", "unidade_medida"} & set(kwargs["update_fields"]):
+                    self._indexar_busca()
+                invalidar_tudo()
+                invalidar_saldos(item_ids=[self.pk])
+            return
+        # Evita sobrescrever os totais com valores lidos antes de uma movimentação concorrente
+        kwargs["update_fields"] = [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.CAMPOS_MATERIALIZADOS
+        ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._indexar_busca()
+            invalidar_tudo()
+            invalidar_saldos(item_ids=[self.pk])
+
+    def _indexar_busca(self):
+        from .busca import indexar_itens
+
+        indexar_itens([self])
+
+    @staticmethod
+    def _valor_estoque_expr():
+        valor = (
+            ItemEstoque.objects.filter(item=OuterRef("pk"))
+            .values("item")
+            .annotate(
+                total=Sum(
+                    ExpressionWrapper(F("qtde") * F("custo_medio"), output_field=DecimalField(max_digits=14, decimal_places=2))
+                )
+            )
+            .values("total")
         )
+        # Arredondado no banco: com custos de quatro casas, o SQLite guardaria o produto sem arredondar
+        return Round(Coalesce(Subquery(valor), Decimal("0.00")), 2, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    @classmethod
+    def aplicar_deltas(cls, deltas, tamanho_lote=500) -> None:
+        """
+        Soma a variação ({item_id: delta}) ao qtde_total de cada item e recalcula
+        valor_estoque pelos ItemEstoque. Itens com variação zero só têm o valor
+        recalculado (o custo médio mudou sem mudar a quantidade).
+        """
+        grupos = list(agrupar_por_delta(deltas, tamanho_lote))
+        sem_variacao = sorted(item_id for item_id, delta in deltas.items() if not delta)
+        if len(grupos) + bool(sem_variacao) > 1:
+            # Os UPDATEs abaixo seguem a ordem dos grupos (por variação, não por pk); bloquear antes,
+            # por pk, mantém a ordem determinística e evita deadlock entre lotes concorrentes
+            pendentes = sorted(deltas)
+            for inicio in range(0, len(pendentes), tamanho_lote):
+                list(
+                    cls.objects.select_for_update()
+                    .filter(pk__in=pendentes[inicio:inicio + tamanho_lote])
+                    .order_by("pk")
+                    .values_list("pk", flat=True)
+                )
+        for delta, item_ids in grupos:
+            nova_qtde = F("qtde_total") + delta
+            cls.objects.filter(pk__in=item_ids).update(qtde_total=nova_qtde, valor_estoque=cls._valor_estoque_expr())
+        for inicio in range(0, len(sem_variacao), tamanho_lote):
+            cls.objects.filter(pk__in=sem_variacao[inicio:inicio + tamanho_lote]).update(
+                valor_estoque=cls._valor_estoque_expr()
+            )
+
+
+class ItemTermo(models.Model):
+    """Termo normalizado (sem acentos, minúsculo) de um item, indexado para a busca rápida."""
+
+    class Campo(models.TextChoices):
+        CODIGO = "C", "Código"
+        DESCRICAO = "D", "Descrição"
+        UNIDADE = "U", "Unidade de medida"
+
+    item = models.ForeignKey(Item, related_name="termos", on_delete=models.CASCADE)
+    termo = models.CharField(max_length=100)
+    campo = models.CharField(max_length=1, choices=Campo.choices)
+
+    class Meta:
+        verbose_name = "Termo de busca"
+        verbose_name_plural = "Termos de busca"
+        indexes = [
+            models.Index(fields=["termo", "campo", "item"], name="item_termo_busca_idx"),
+            # Confere as demais palavras de um item sem ler a tabela
+            models.Index(fields=["item", "termo"], name="item_termo_item_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.termo} ({self.get_campo_display()})"
 
 
 class Estoque(models.Model):
@@ -82,17 +230,111 @@ class Estoque(models.Model):
     nivel_minimo = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)])
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    # Mantido por consolidar_parciais e reconciliar_totais; nunca é regravado a partir da instância em memória
+    CAMPOS_MATERIALIZADOS = ("qtde_atual",)
+
     class Meta:
         ordering = ["localizacao"]
 
     def __str__(self) -> str:
         return self.localizacao
 
-    def atualizar_totais(self) -> None:
-        """Recalcula quantidade total com base em ItemEstoque."""
-        total = self.itens.aggregate(total=Coalesce(Sum("qtde"), 0)).get("total") or 0
-        self.qtde_atual = total
-        self.save(update_fields=["qtde_atual"])
+    def save(self, *args, **kwargs):
+        from . import registro
+        from .kpis import invalidar
+
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # Evita desfazer uma consolidação das parcelas feita depois que a instância foi lida
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CAMPOS_MATERIALIZADOS
+            ]
+        super().save(*args, **kwargs)
+        invalidar([self.pk])
+        registro.invalidar()
+
+    def delete(self, *args, **kwargs):
+        from . import registro
+        from .kpis import invalidar_tudo
+
+        resultado = super().delete(*args, **kwargs)
+        invalidar_tudo()
+        registro.invalidar()
+        return resultado
+
+    def total_atual(self) -> int:
+        """Quantidade total no estoque: qtde_atual mais as parcelas ainda não consolidadas."""
+        return self.qtde_atual + (self.parciais.aggregate(total=Sum("qtde"))["total"] or 0)
+
+    @staticmethod
+    def _total_expr():
+        parcelas = (
+            EstoqueTotalParcial.objects.filter(estoque=OuterRef("pk"))
+            .values("estoque")
+            .annotate(total=Sum("qtde"))
+            .values("total")
+        )
+        return ExpressionWrapper(F("qtde_atual") + Coalesce(Subquery(parcelas), 0), output_field=IntegerField())
+
+    @classmethod
+    def aplicar_deltas(cls, deltas) -> None:
+        """
+        Soma a variação informada ({estoque_id: delta}) ao total de cada estoque.
+
+        A variação vai para uma das parcelas do estoque (EstoqueTotalParcial),
+        sorteada, e não para a linha do Estoque: movimentações simultâneas no
+        mesmo estoque deixam de disputar uma única linha.
+        """
+        fatias = getattr(settings, "ESTOQUE_FATIAS_TOTAL", 16)
+        for estoque_id, delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            fatia = random.randrange(fatias)
+            parcela = EstoqueTotalParcial.objects.filter(estoque_id=estoque_id, fatia=fatia)
+            if not parcela.update(qtde=F("qtde") + delta):
+                # Primeira variação nesta fatia: cria a parcela (outra transação pode ter criado antes)
+                EstoqueTotalParcial.objects.bulk_create(
+                    [EstoqueTotalParcial(estoque_id=estoque_id, fatia=fatia)], ignore_conflicts=True
+                )
+                parcela.update(qtde=F("qtde") + delta)
+
+    @classmethod
+    def consolidar_parciais(cls, estoque_ids=None) -> None:
+        """Incorpora as parcelas ao qtde_atual e as zera; o total de cada estoque não muda."""
+        with transaction.atomic():
+            parcelas = EstoqueTotalParcial.objects.select_for_update().exclude(qtde=0).order_by("estoque_id", "fatia")
+            if estoque_ids is not None:
+                parcelas = parcelas.filter(estoque_id__in=estoque_ids)
+            somas, parcela_ids = Counter(), []
+            for pk, estoque_id, qtde in parcelas.values_list("pk", "estoque_id", "qtde"):
+                somas[estoque_id] += qtde
+                parcela_ids.append(pk)
+            for estoque_id, soma in sorted(somas.items()):
+                cls.objects.filter(pk=estoque_id).update(qtde_atual=F("qtde_atual") + soma)
+            EstoqueTotalParcial.objects.filter(pk__in=parcela_ids).update(qtde=0)
+
+
+class EstoqueTotalParcial(models.Model):
+    """
+    Parcela do total de um estoque.
+
+    Cada movimentação soma sua variação em uma fatia sorteada; o total é o
+    qtde_atual do Estoque mais a soma das parcelas (ver Estoque._total_expr).
+    A parcela pode ficar negativa, o total não.
+    """
+
+    estoque = models.ForeignKey(Estoque, related_name="parciais", on_delete=models.CASCADE)
+    fatia = models.PositiveSmallIntegerField()
+    qtde = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("estoque", "fatia")
+        verbose_name = "Parcela do total do estoque"
+        verbose_name_plural = "Parcelas do total do estoque"
+
+    def __str__(self) -> str:
+        return f"{self.estoque} #{self.fatia}: {self.qtde:+d}"
 
 
 class ItemEstoque(models.Model):
@@ -103,24 +345,81 @@ class ItemEstoque(models.Model):
         Item, related_name="estoques", on_delete=models.CASCADE
     )
     qtde = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)])
+    # Custo médio ponderado das unidades em estoque, mantido pelas movimentações (ver custos.py)
+    custo_medio = models.DecimalField(max_digits=14, decimal_places=4, default=Decimal("0"), editable=False)
 
     class Meta:
         unique_together = ("estoque", "item")
+        # Saldos críticos por estoque (qtde < nivel_minimo) sem ler a tabela; com item, o índice cobre a consulta
+        indexes = [models.Index(fields=["estoque", "qtde", "item"], name="item_estoque_qtde_idx")]
         verbose_name = "Item no Estoque"
         verbose_name_plural = "Itens no Estoque"
 
+    # (estoque_id, item_id, qtde) gravados no banco; None enquanto o vínculo não foi salvo
+    _vinculo_salvo = None
+
     def __str__(self) -> str:
         return f"{self.item} em {self.estoque} ({self.qtde})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {"estoque_id", "item_id", "qtde"} <= set(field_names):
+            instance._vinculo_salvo = (instance.estoque_id, instance.item_id, instance.qtde)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._vinculo_salvo = (self.estoque_id, self.item_id, self.qtde)
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # MELHORIA: sincroniza qtde_atual do Estoque sempre que o vínculo é alterado
-        self.estoque.atualizar_totais()
+        from .kpis import invalidar
+        from .saldo_cache import invalidar as invalidar_saldos
+        from .serie_saldo import invalidar as invalidar_series
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"qtde", "estoque", "estoque_id", "item", "item_id"} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        if self._vinculo_salvo is None and not self.custo_medio:
+            # Vínculo criado à mão, sem entrada registrada: as unidades valem o preço de cadastro
+            self.custo_medio = self.item.valor_unitario
+        deltas_estoque, deltas_item = Counter(), Counter()
+        if self._vinculo_salvo is not None:
+            estoque_anterior, item_anterior, qtde_anterior = self._vinculo_salvo
+            deltas_estoque[estoque_anterior] -= qtde_anterior
+            deltas_item[item_anterior] -= qtde_anterior
+        deltas_estoque[self.estoque_id] += self.qtde
+        deltas_item[self.item_id] += self.qtde
+        pares = {(self.item_id, self.estoque_id)}
+        if self._vinculo_salvo is not None:
+            pares.add((item_anterior, estoque_anterior))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # MELHORIA: aplica só a diferença nos totais de Estoque e Item, sem somar todos os vínculos
+            Estoque.aplicar_deltas(deltas_estoque)
+            Item.aplicar_deltas(deltas_item)
+            invalidar(deltas_estoque.keys())
+            invalidar_saldos(pares=pares)
+            invalidar_series(deltas_item.keys())
+        self._vinculo_salvo = (self.estoque_id, self.item_id, self.qtde)
 
     def delete(self, *args, **kwargs):
-        estoque = self.estoque
-        super().delete(*args, **kwargs)
-        estoque.atualizar_totais()
+        from .kpis import invalidar
+        from .saldo_cache import invalidar as invalidar_saldos
+        from .serie_saldo import invalidar as invalidar_series
+
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            if self._vinculo_salvo is not None:
+                estoque_id, item_id, qtde = self._vinculo_salvo
+                Estoque.aplicar_deltas({estoque_id: -qtde})
+                Item.aplicar_deltas({item_id: -qtde})
+                invalidar([estoque_id])
+                invalidar_saldos(pares=[(item_id, estoque_id)])
+                invalidar_series([item_id])
+        self._vinculo_salvo = None
+        return resultado
 
 
 class Inventario(models.Model):
@@ -129,9 +428,19 @@ class Inventario(models.Model):
         Usuario, on_delete=models.PROTECT, related_name="inventarios"
     )
     observacao = models.TextField(blank=True)
+    encerrado_em = models.DateTimeField(null=True, blank=True, editable=False)
+    estoque_encerramento = models.ForeignKey(
+        Estoque,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.PROTECT,
+        related_name="inventarios_encerrados",
+    )
 
     class Meta:
         ordering = ["-data_inventario"]
+        indexes = [models.Index(fields=["-data_inventario", "-id"], name="inventario_data_idx")]
 
     def __str__(self) -> str:
         return f"Inventário {self.data_inventario:%d/%m/%Y}"
@@ -144,9 +453,13 @@ class InventarioItem(models.Model):
     item = models.ForeignKey(
         Item, related_name="inventarios", on_delete=models.PROTECT
     )
+    # Nula nas linhas incluídas antes da contagem (ex.: itens classe A); o encerramento não as ajusta
     qtde_contada = models.PositiveIntegerField(
-        validators=[MinValueValidator(0)], help_text="Quantidade contada no inventário"
+        null=True, validators=[MinValueValidator(0)], help_text="Quantidade contada no inventário"
     )
+    # Preenchidos no encerramento: saldo do estoque antes do ajuste e contada - saldo
+    saldo_sistema = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    diferenca = models.IntegerField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ("inventario", "item")
@@ -154,6 +467,8 @@ class InventarioItem(models.Model):
         verbose_name_plural = "Itens de Inventário"
 
     def __str__(self) -> str:
+        if self.qtde_contada is None:
+            return f"{self.item} - não contado"
         return f"{self.item} - {self.qtde_contada} un"
 
 
@@ -179,15 +494,197 @@ class Movimentacao(models.Model):
     usuario = models.ForeignKey(
         Usuario, related_name="movimentacoes", on_delete=models.PROTECT
     )
+    # Custo de cada unidade: o preço nas entradas, o custo médio do par nas saídas e ajustes (ver custos.py)
+    custo_unitario = models.DecimalField(max_digits=14, decimal_places=4, default=Decimal("0"), editable=False)
 
     class Meta:
         ordering = ["-data_movimentacao"]
+        # MELHORIA: índices compostos para a paginação por chave (data, id) com e sem filtros
+        indexes = [
+            models.Index(fields=["-data_movimentacao", "-id"], name="mov_data_id_idx"),
+            models.Index(fields=["tipo_movimentacao", "-data_movimentacao", "-id"], name="mov_tipo_data_idx"),
+            models.Index(fields=["item", "-data_movimentacao", "-id"], name="mov_item_data_idx"),
+            models.Index(fields=["estoque", "-data_movimentacao", "-id"], name="mov_estoque_data_idx"),
+            # Histórico de um par (item, estoque): extrato do item em um estoque e filtro combinado da listagem
+            models.Index(fields=["item", "estoque", "-data_movimentacao", "-id"], name="mov_item_estoque_data_idx"),
+            models.Index(fields=["usuario", "-data_movimentacao", "-id"], name="mov_usuario_data_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.get_tipo_movimentacao_display()} - {self.item} ({self.quantidade})"
 
     @property
     def valor_movimentado(self) -> Decimal:
-        """Valor total movimentado considerando o valor unitário."""
+        """Valor total movimentado pelo custo unitário gravado na movimentação."""
         sinal = Decimal("1") if self.tipo_movimentacao != self.Tipo.SAIDA else Decimal("-1")
-        return (self.item.valor_unitario * self.quantidade) * sinal
+        return (self.custo_unitario * self.quantidade) * sinal
+
+
+class MovimentacaoDiaria(models.Model):
+    """
+    Movimentações somadas por item, estoque, dia (fuso local) e tipo.
+
+    Mantida na mesma transação que grava as movimentações (ver acumular) e
+    reconstruída pelo comando reconstruir_resumo_diario; as consultas de
+    período ficam em resumo_diario.py.
+    """
+
+    data = models.DateField()
+    # Sem os índices próprios das FKs: o unique_together começa por item e o índice por estoque começa por estoque
+    item = models.ForeignKey(Item, related_name="movimentacoes_diarias", on_delete=models.CASCADE, db_index=False)
+    estoque = models.ForeignKey(
+        Estoque, related_name="movimentacoes_diarias", on_delete=models.CASCADE, db_index=False
+    )
+    tipo_movimentacao = models.CharField(max_length=20, choices=Movimentacao.Tipo.choices)
+    quantidade = models.PositiveBigIntegerField(default=0)
+    # Quantidade x custo unitário gravado em cada movimentação
+    valor = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal("0.00"))
+    movimentacoes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-data"]
+        unique_together = ("item", "estoque", "data", "tipo_movimentacao")
+        # Com as somas no índice, os totais de um período são lidos só do índice, sem visitar a tabela
+        indexes = [
+            models.Index(
+                fields=["data", "tipo_movimentacao", "quantidade", "valor", "movimentacoes"],
+                name="mov_diaria_data_tipo_idx",
+            ),
+            models.Index(
+                fields=["estoque", "data", "tipo_movimentacao", "quantidade", "valor", "movimentacoes"],
+                name="mov_diaria_estoque_data_idx",
+            ),
+            # Saídas de todos os itens numa janela de dias (reposicao.py), lidas só do índice
+            models.Index(fields=["tipo_movimentacao", "data", "item", "quantidade"], name="mov_diaria_tipo_data_item_idx"),
+        ]
+        verbose_name = "Movimentação diária"
+        verbose_name_plural = "Movimentações diárias"
+
+    def __str__(self) -> str:
+        return f"{self.item} em {self.estoque} ({self.data:%d/%m/%Y}, {self.tipo_movimentacao}): {self.quantidade}"
+
+    @classmethod
+    def acumular(cls, movimentos, tamanho_lote=500) -> None:
+        """
+        Soma as movimentações recém-gravadas às linhas do dia correspondentes.
+
+        Deve ser chamado na transação que gravou as movimentações, com os
+        ItemEstoque dos pares já bloqueados: quem altera a linha de um par
+        segura o bloqueio do par, então as linhas não são disputadas.
+        """
+        somas = {}
+        for mov in movimentos:
+            chave = (timezone.localdate(mov.data_movimentacao), mov.item_id, mov.estoque_id, mov.tipo_movimentacao)
+            quantidade, valor, total = somas.get(chave, (0, Decimal("0.00"), 0))
+            somas[chave] = (quantidade + mov.quantidade, valor + mov.quantidade * mov.custo_unitario, total + 1)
+        if not somas:
+            return
+
+        if len(somas) == 1:
+            # Movimentação avulsa: um UPDATE e, no primeiro movimento do dia, um INSERT
+            (chave, (quantidade, valor, total)), = somas.items()
+            dia, item_id, estoque_id, tipo = chave
+            linha = cls.objects.filter(data=dia, item_id=item_id, estoque_id=estoque_id, tipo_movimentacao=tipo)
+            atualizadas = linha.update(
+                quantidade=F("quantidade") + quantidade, valor=F("valor") + valor, movimentacoes=F("movimentacoes") + total
+            )
+            if not atualizadas:
+                cls.objects.create(
+                    data=dia,
+                    item_id=item_id,
+                    estoque_id=estoque_id,
+                    tipo_movimentacao=tipo,
+                    quantidade=quantidade,
+                    valor=valor,
+                    movimentacoes=total,
+                )
+            return
+
+        dias = sorted({chave[0] for chave in somas})
+        item_ids = sorted({chave[1] for chave in somas})
+        estoque_ids = sorted({chave[2] for chave in somas})
+        existentes = {}
+        for inicio in range(0, len(item_ids), tamanho_lote):
+            consulta = cls.objects.select_for_update().filter(
+                data__in=dias, estoque_id__in=estoque_ids, item_id__in=item_ids[inicio : inicio + tamanho_lote]
+            )
+            for linha in consulta.order_by("pk"):
+                chave = (linha.data, linha.item_id, linha.estoque_id, linha.tipo_movimentacao)
+                if chave in somas:
+                    existentes[chave] = linha
+        for chave, linha in existentes.items():
+            quantidade, valor, total = somas[chave]
+            linha.quantidade += quantidade
+            linha.valor += valor
+            linha.movimentacoes += total
+        cls.objects.bulk_update(existentes.values(), ["quantidade", "valor", "movimentacoes"], batch_size=tamanho_lote)
+        cls.objects.bulk_create(
+            [
+                cls(
+                    data=dia,
+                    item_id=item_id,
+                    estoque_id=estoque_id,
+                    tipo_movimentacao=tipo,
+                    quantidade=quantidade,
+                    valor=valor,
+                    movimentacoes=total,
+                )
+                for (dia, item_id, estoque_id, tipo), (quantidade, valor, total) in sorted(somas.items())
+                if (dia, item_id, estoque_id, tipo) not in existentes
+            ],
+            batch_size=tamanho_lote,
+        )
+
+
+class ClassificacaoItem(models.Model):
+    """
+    Classes ABC (participação no valor consumido) e XYZ (variabilidade da
+    demanda) de um item, recalculadas em lote pelo comando classificar_itens
+    (ver classificacao.py).
+    """
+
+    class ABC(models.TextChoices):
+        A = "A", "A - maior valor consumido"
+        B = "B", "B - valor intermediário"
+        C = "C", "C - menor valor consumido"
+
+    class XYZ(models.TextChoices):
+        X = "X", "X - demanda estável"
+        Y = "Y", "Y - demanda variável"
+        Z = "Z", "Z - demanda irregular"
+
+    item = models.OneToOneField(Item, primary_key=True, related_name="classificacao", on_delete=models.CASCADE)
+    classe_abc = models.CharField(max_length=1, choices=ABC.choices)
+    classe_xyz = models.CharField(max_length=1, choices=XYZ.choices)
+    # Saídas da janela ao valor unitário atual e coeficiente de variação da demanda semanal (nulo sem demanda)
+    valor_consumo = models.DecimalField(max_digits=16, decimal_places=2)
+    coeficiente_variacao = models.FloatField(null=True)
+    calculado_em = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["classe_abc", "classe_xyz"], name="classificacao_classes_idx")]
+        verbose_name = "Classificação de item"
+        verbose_name_plural = "Classificações de itens"
+
+    def __str__(self) -> str:
+        return f"{self.item}: {self.classe_abc}{self.classe_xyz}"
+
+
+class SaldoFechamento(models.Model):
+    """Saldo de um item em um estoque ao fim de um dia, usado como ponto de partida do histórico."""
+
+    data = models.DateField(db_index=True)
+    item = models.ForeignKey(Item, related_name="fechamentos", on_delete=models.CASCADE)
+    estoque = models.ForeignKey(Estoque, related_name="fechamentos", on_delete=models.CASCADE)
+    qtde = models.PositiveIntegerField(default=0)
+    # Valor do saldo pelo custo gravado nas movimentações até a data (o custo médio de então)
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        ordering = ["-data"]
+        unique_together = ("data", "estoque", "item")
+        verbose_name = "Fechamento de saldo"
+        verbose_name_plural = "Fechamentos de saldo"
+
+    def __str__(self) -> str:
+        return f"{self.item} em {self.estoque} ({self.data:%d/%m/%Y}): {self.qtde}"
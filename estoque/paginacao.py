@@ -0,0 +1,123 @@
+"""Paginação por chave (keyset) para listagens em ordem fixa, sem OFFSET nem contagem do total."""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+TAMANHO_PAGINA = 50
+
+
+class PaginaPorChave:
+    """Página de resultados com os cursores para a página anterior e a próxima."""
+
+    def __init__(self, objetos, anterior=None, proxima=None):
+        self.objetos = objetos
+        self.anterior = anterior
+        self.proxima = proxima
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def tem_outras_paginas(self):
+        return bool(self.anterior or self.proxima)
+
+
+def codificar_cursor(valores):
+    # isoformat completo: o DjangoJSONEncoder cortaria os microssegundos e o cursor pularia registros
+    bruto = json.dumps(
+        [valor.isoformat() if hasattr(valor, "isoformat") else valor for valor in valores],
+        default=str,
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, campos):
+    """
+    Retorna os valores do cursor convertidos pelos ``campos`` (um por valor,
+    o último é o id), ou None se o cursor for inválido.
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        return [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError, ValidationError):
+        return None
+
+
+def paginar_por_chave(queryset, *, campos, apos=None, antes=None, tamanho=TAMANHO_PAGINA, crescente=False):
+    """
+    Pagina ``queryset`` em ordem de (``campos``..., id), decrescente ou, com
+    ``crescente``, crescente. Os campos podem ser anotações do queryset.
+
+    ``apos`` traz os registros seguintes ao cursor na ordem da listagem
+    (próxima página) e ``antes`` os que o precedem (página anterior). Em vez
+    de OFFSET, cada página filtra a partir da chave do último registro visto,
+    então o custo não cresce com a profundidade da navegação quando há índice
+    em (``campos``..., id).
+    """
+    chave = [*campos, "pk"]
+    tipos = [_campo_do_queryset(queryset, nome) for nome in chave]
+    valores_apos = decodificar_cursor(apos, tipos) if apos else None
+    valores_antes = decodificar_cursor(antes, tipos) if antes and not valores_apos else None
+    adiante, atras = ("gt", "lt") if crescente else ("lt", "gt")
+
+    if valores_antes:
+        objetos = list(
+            queryset.filter(_alem_da_chave(chave, valores_antes, atras))
+            .order_by(*_ordem(chave, not crescente))[: tamanho + 1]
+        )
+        tem_anteriores = len(objetos) > tamanho
+        objetos = objetos[:tamanho][::-1]
+        return PaginaPorChave(
+            objetos,
+            anterior=_cursor_de(objetos[0], chave) if tem_anteriores and objetos else None,
+            proxima=_cursor_de(objetos[-1], chave) if objetos else None,
+        )
+
+    if valores_apos:
+        queryset = queryset.filter(_alem_da_chave(chave, valores_apos, adiante))
+    objetos = list(queryset.order_by(*_ordem(chave, crescente))[: tamanho + 1])
+    tem_seguintes = len(objetos) > tamanho
+    objetos = objetos[:tamanho]
+    return PaginaPorChave(
+        objetos,
+        anterior=_cursor_de(objetos[0], chave) if valores_apos and objetos else None,
+        proxima=_cursor_de(objetos[-1], chave) if tem_seguintes else None,
+    )
+
+
+def _campo_do_queryset(queryset, nome):
+    if nome in queryset.query.annotations:
+        return queryset.query.annotations[nome].output_field
+    return queryset.model._meta.pk if nome == "pk" else queryset.model._meta.get_field(nome)
+
+
+def _ordem(chave, crescente):
+    return [nome if crescente else f"-{nome}" for nome in chave]
+
+
+def _alem_da_chave(chave, valores, operador):
+    """
+    Registros depois de ``valores`` na comparação lexicográfica de ``chave``.
+
+    O limite simples no primeiro campo (>= ou <=) é redundante, mas deixa o
+    banco usar o índice como intervalo em vez de avaliar o OR linha a linha.
+    """
+    condicao = Q(**{f"{chave[-1]}__{operador}": valores[-1]})
+    for nome, valor in zip(reversed(chave[:-1]), reversed(valores[:-1])):
+        condicao = Q(**{f"{nome}__{operador}": valor}) | (Q(**{nome: valor}) & condicao)
+    if len(chave) > 1:
+        condicao &= Q(**{f"{chave[0]}__{operador}e": valores[0]})
+    return condicao
+
+
+def _cursor_de(objeto, chave):
+    return codificar_cursor(getattr(objeto, nome) for nome in chave)
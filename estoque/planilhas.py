@@ -0,0 +1,221 @@
+"""Geração e leitura de planilhas XLSX em fluxo, sem dependências externas e sem montar o arquivo em memória."""
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+# Limite de linhas de uma planilha do Excel; o excedente continua em uma nova aba
+LINHAS_POR_ABA = 1_048_576
+_CARACTERES_INVALIDOS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    "{abas}</Types>"
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{abas}</sheets></workbook>"
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{abas}</Relationships>"
+)
+_INICIO_ABA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_ABA = "</sheetData></worksheet>"
+
+
+class _Saida:
+    """Destino do ZipFile que acumula os bytes até o gerador repassá-los à resposta."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+
+def _celula(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f"<c><v>{valor}</v></c>"
+    texto = escape(_CARACTERES_INVALIDOS.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha(valores):
+    return "<row>" + "".join(_celula(valor) for valor in valores) + "</row>"
+
+
+def xlsx_em_fluxo(cabecalho, linhas, *, nome_aba="Planilha", linhas_por_bloco=1000):
+    """
+    Gera os bytes de um arquivo XLSX à medida que ``linhas`` é consumido.
+
+    Cada aba recebe o cabeçalho e no máximo LINHAS_POR_ABA linhas; o índice do
+    arquivo (workbook) é gravado por último, quando o número de abas é conhecido.
+    """
+    saida = _Saida()
+    abas = 0
+    with zipfile.ZipFile(saida, mode="w", compression=zipfile.ZIP_DEFLATED) as arquivo:
+        linhas = iter(linhas)
+        terminou = False
+        while not terminou:
+            abas += 1
+            with arquivo.open(f"xl/worksheets/sheet{abas}.xml", mode="w", force_zip64=True) as aba:
+                aba.write((_INICIO_ABA + _linha(cabecalho)).encode())
+                escritas, bloco = 1, []
+                for valores in linhas:
+                    bloco.append(_linha(valores))
+                    escritas += 1
+                    if len(bloco) >= linhas_por_bloco:
+                        aba.write("".join(bloco).encode())
+                        bloco = []
+                        yield saida.esvaziar()
+                    if escritas >= LINHAS_POR_ABA:
+                        break
+                else:
+                    terminou = True
+                aba.write(("".join(bloco) + _FIM_ABA).encode())
+            yield saida.esvaziar()
+
+        numeros = range(1, abas + 1)
+        arquivo.writestr(
+            "[Content_Types].xml",
+            _CONTENT_TYPES.format(
+                abas="".join(
+                    f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                    for n in numeros
+                )
+            ),
+        )
+        arquivo.writestr("_rels/.rels", _RELS)
+        arquivo.writestr(
+            "xl/workbook.xml",
+            _WORKBOOK.format(
+                abas="".join(
+                    f'<sheet name="{escape(nome_aba)}{" " + str(n) if n > 1 else ""}" sheetId="{n}" r:id="rId{n}"/>'
+                    for n in numeros
+                )
+            ),
+        )
+        arquivo.writestr(
+            "xl/_rels/workbook.xml.rels",
+            _WORKBOOK_RELS.format(
+                abas="".join(
+                    f'<Relationship Id="rId{n}" '
+                    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                    f'Target="worksheets/sheet{n}.xml"/>'
+                    for n in numeros
+                )
+            ),
+        )
+    yield saida.esvaziar()
+
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PACOTE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_COLUNA = re.compile(r"[A-Z]+")
+
+
+class PlanilhaInvalida(Exception):
+    """O arquivo enviado não é um XLSX legível."""
+
+
+def _indice_coluna(referencia):
+    """'A1' -> 0, 'AB7' -> 27."""
+    indice = 0
+    for letra in _COLUNA.match(referencia).group():
+        indice = indice * 26 + ord(letra) - ord("A") + 1
+    return indice - 1
+
+
+def _caminho_primeira_aba(arquivo):
+    with arquivo.open("xl/workbook.xml") as workbook:
+        rid = next((elem.get(f"{_NS_REL}id") for _, elem in iterparse(workbook) if elem.tag == f"{_NS}sheet"), None)
+    with arquivo.open("xl/_rels/workbook.xml.rels") as rels:
+        for _, elem in iterparse(rels):
+            if elem.tag == f"{_NS_PACOTE}Relationship" and elem.get("Id") == rid:
+                alvo = elem.get("Target")
+                return alvo.lstrip("/") if alvo.startswith("/") else posixpath.normpath(posixpath.join("xl", alvo))
+    raise PlanilhaInvalida("A planilha não tem abas.")
+
+
+def _textos_compartilhados(arquivo):
+    if "xl/sharedStrings.xml" not in arquivo.namelist():
+        return []
+    textos = []
+    with arquivo.open("xl/sharedStrings.xml") as compartilhados:
+        for _, elem in iterparse(compartilhados):
+            if elem.tag == f"{_NS}si":
+                textos.append("".join(t.text or "" for t in elem.iter(f"{_NS}t")))
+                elem.clear()
+    return textos
+
+
+def ler_xlsx(arquivo):
+    """
+    Percorre as linhas da primeira aba de um XLSX, como listas de textos.
+
+    A aba é lida com iterparse e cada linha é descartada depois de entregue, então
+    a memória não cresce com o número de linhas; só os textos compartilhados
+    (sharedStrings) ficam carregados. Células vazias viram "".
+    """
+    try:
+        pacote = zipfile.ZipFile(arquivo)
+    except zipfile.BadZipFile as exc:
+        raise PlanilhaInvalida("O arquivo não é uma planilha XLSX válida.") from exc
+    with pacote:
+        try:
+            textos = _textos_compartilhados(pacote)
+            caminho = _caminho_primeira_aba(pacote)
+            aba = pacote.open(caminho)
+        except KeyError as exc:
+            raise PlanilhaInvalida("O arquivo não é uma planilha XLSX válida.") from exc
+        with aba:
+            for _, elem in iterparse(aba):
+                if elem.tag != f"{_NS}row":
+                    continue
+                valores = []
+                for celula in elem.iter(f"{_NS}c"):
+                    referencia = celula.get("r")
+                    if referencia:
+                        valores.extend([""] * (_indice_coluna(referencia) - len(valores)))
+                    tipo = celula.get("t")
+                    if tipo == "inlineStr":
+                        valor = "".join(t.text or "" for t in celula.iter(f"{_NS}t"))
+                    else:
+                        bruto = celula.findtext(f"{_NS}v") or ""
+                        valor = textos[int(bruto)] if tipo == "s" and bruto else bruto
+                    valores.append(valor)
+                elem.clear()
+                yield valores
@@ -0,0 +1,39 @@
+"""
+Registro dos estoques usados como padrão nas telas de movimentação.
+
+O estoque "Depósito Central" (ou, na falta dele, o primeiro cadastrado) é
+resolvido uma vez e guardado no cache "default". A entrada é descartada após o
+commit de qualquer alteração ou exclusão de Estoque; o tempo de expiração só
+limita a defasagem entre processos que não compartilham o cache.
+"""
+from django.core.cache import caches
+from django.db import transaction
+
+LOCALIZACAO_PADRAO = "Depósito Central"
+TEMPO_CACHE = 300
+_CHAVE_PADRAO = "estoques:padrao"
+
+
+def _cache():
+    return caches["default"]
+
+
+def estoque_padrao():
+    """Retorna o Estoque padrão, ou None se não houver estoque cadastrado."""
+    from .models import Estoque
+
+    estoque = _cache().get(_CHAVE_PADRAO)
+    if estoque is None:
+        estoque = (
+            Estoque.objects.filter(localizacao__iexact=LOCALIZACAO_PADRAO).first()
+            or Estoque.objects.first()
+            # False diferencia "sem estoque" de "não está no cache"
+            or False
+        )
+        _cache().set(_CHAVE_PADRAO, estoque, timeout=TEMPO_CACHE)
+    return estoque or None
+
+
+def invalidar():
+    """Descarta o estoque padrão resolvido, após o commit da transação atual."""
+    transaction.on_commit(lambda: _cache().delete(_CHAVE_PADRAO))
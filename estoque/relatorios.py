@@ -0,0 +1,89 @@
+"""Cálculos dos relatórios gerenciais."""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from . import resumo_diario
+from .models import Item, ItemEstoque, Movimentacao
+from .saldos import saldos_em
+
+CENTAVOS = Decimal("0.01")
+
+
+def relatorio_cmv(data_inicio, data_fim):
+    """
+    Custo de uso (CMV) do período pelo inventário periódico:
+    estoque inicial + compras - estoque final.
+
+    O estoque inicial é o saldo ao fim do dia anterior a ``data_inicio`` e o
+    final, o saldo ao fim de ``data_fim``; ambos vêm do motor de saldos,
+    valorizados pelo custo médio de cada data. Compras somam o custo gravado
+    nas entradas e nas sobras de inventário (AJUSTE), pelo resumo diário; com
+    tudo no mesmo custo, o custo de uso coincide com o valor das saídas.
+    """
+    inicial = _por_item(saldos_em(data_inicio - timedelta(days=1), valorizar=True))
+    final = _por_item(saldos_em(data_fim, valorizar=True))
+    valor_inicial = sum((valor for _, valor in inicial.values()), Decimal("0")).quantize(CENTAVOS)
+    valor_final = sum((valor for _, valor in final.values()), Decimal("0")).quantize(CENTAVOS)
+    totais = resumo_diario.totais(data_inicio, data_fim)
+    ajustes = totais[Movimentacao.Tipo.AJUSTE]["valor"]
+    compras = totais[Movimentacao.Tipo.ENTRADA]["valor"] + ajustes
+    saidas = totais[Movimentacao.Tipo.SAIDA]
+
+    itens = list(Item.objects.filter(pk__in=final.keys()).only("codigo", "descricao"))
+    for item in itens:
+        item.quantidade_atual, valor = final[item.pk]
+        item.valor_total_estoque = valor.quantize(CENTAVOS)
+        item.custo_medio = (valor / item.quantidade_atual).quantize(CENTAVOS)
+
+    return {
+        "valor_estoque_inicial": valor_inicial,
+        "valor_compras_liquidas": compras,
+        "valor_ajustes": ajustes,
+        "valor_estoque_final_contado": valor_final,
+        "custo_uso": valor_inicial + compras - valor_final,
+        "quantidade_saidas": saidas["quantidade"],
+        "valor_saidas": saidas["valor"],
+        "itens": itens,
+    }
+
+
+def _por_item(saldos):
+    """{item_id: (qtde, valor)} a partir dos saldos valorizados de ``saldos_em``."""
+    totais = {}
+    for (item_id, _), (qtde, valor) in saldos.items():
+        total, soma = totais.get(item_id, (0, Decimal("0")))
+        totais[item_id] = (total + qtde, soma + valor)
+    return {item_id: (qtde, valor) for item_id, (qtde, valor) in totais.items() if qtde}
+
+
+def linhas_inventario(inventario, estoque):
+    """
+    Linhas do inventário anotadas com ``saldo_referencia`` e ``divergencia``.
+
+    Depois do encerramento valem o saldo e a diferença gravados; antes dele,
+    a comparação é feita com o saldo atual do ``estoque`` informado.
+    """
+    linhas = inventario.itens.select_related("item")
+    if inventario.encerrado_em:
+        return linhas.annotate(saldo_referencia=F("saldo_sistema"), divergencia=F("diferenca"))
+    saldo = Coalesce(
+        Subquery(ItemEstoque.objects.filter(estoque=estoque, item=OuterRef("item_id")).values("qtde")[:1]),
+        0,
+    )
+    return linhas.annotate(saldo_referencia=saldo, divergencia=F("qtde_contada") - saldo)
+
+
+def resumo_inventario(inventario, estoque):
+    """Totais das linhas contadas e das divergências, em uma única consulta agregada."""
+    return linhas_inventario(inventario, estoque).aggregate(
+        linhas=Count("pk"),
+        pendentes=Count("pk", filter=Q(qtde_contada__isnull=True)),
+        total_contado=Coalesce(Sum("qtde_contada"), 0),
+        # Linhas ainda sem contagem não têm divergência (NULL) e não entram aqui
+        divergentes=Count("pk", filter=Q(divergencia__lt=0) | Q(divergencia__gt=0)),
+        sobras=Coalesce(Sum("divergencia", filter=Q(divergencia__gt=0)), 0),
+        faltas=Coalesce(Sum("divergencia", filter=Q(divergencia__lt=0)), 0),
+    )
@@ -0,0 +1,186 @@
+"""
+Sugestão de reposição a partir do consumo (saídas) recente.
+
+As saídas diárias de todos os itens são carregadas de uma vez em arrays do
+NumPy e as contas são feitas para todos os itens juntos, sem laço por item:
+
+- consumo médio por dia e desvio padrão diário na janela (dias sem saída
+  contam como zero);
+- dias de cobertura: saldo atual / consumo médio;
+- ponto de pedido: consumo médio x prazo + fator x desvio x raiz(prazo),
+  nunca abaixo do estoque mínimo do item;
+- quantidade sugerida, para itens no ponto de pedido ou abaixo dele: até o
+  estoque máximo, se definido, ou até o ponto de pedido mais o consumo de
+  ``cobertura`` dias.
+
+A janela termina ontem (só dias completos). As sugestões saem agrupadas por
+fornecedor e o relatório fica no cache "kpis" por REPOSICAO_CACHE_TIMEOUT
+segundos: é um planejamento de compras, não precisa acompanhar cada
+movimentação. O aquecimento pelo comando calcular_reposicao só chega às
+requisições com um backend compartilhado entre processos (file ou db).
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from almoxarifado.roteador import primario
+
+from .models import Fornecedor, Item, Movimentacao, MovimentacaoDiaria
+from .vetores import carregar, posicoes
+
+
+def parametros_padrao():
+    return {
+        "janela": getattr(settings, "REPOSICAO_JANELA_DIAS", 90),
+        "prazo": getattr(settings, "REPOSICAO_PRAZO_DIAS", 7),
+        "cobertura": getattr(settings, "REPOSICAO_COBERTURA_DIAS", 30),
+        "fator": getattr(settings, "REPOSICAO_FATOR_SEGURANCA", 1.65),
+    }
+
+
+def relatorio(*, recalcular=False, **parametros):
+    """
+    Relatório de ``calcular`` com os parâmetros padrão sobrepostos por
+    ``parametros``, em cache; ``recalcular`` ignora o que estiver guardado e
+    regrava o cache (o comando calcular_reposicao usa isso para aquecê-lo).
+    """
+    parametros = {**parametros_padrao(), **parametros}
+    hoje = timezone.localdate()
+    chave = "reposicao:{}:{janela}:{prazo}:{cobertura}:{fator}".format(hoje.isoformat(), **parametros)
+    cache = caches["kpis"]
+    resultado = None if recalcular else cache.get(chave)
+    if resultado is None:
+        # Fica no cache para as próximas requisições: calcula no principal, nunca com a réplica atrasada
+        with primario():
+            resultado = calcular(hoje=hoje, **parametros)
+        cache.set(chave, resultado, timeout=getattr(settings, "REPOSICAO_CACHE_TIMEOUT", 900))
+    return resultado
+
+
+def calcular(*, janela, prazo, cobertura, fator, hoje=None):
+    """
+    Calcula as sugestões de reposição para todos os itens ativos.
+
+    Retorna um dicionário com os parâmetros, o período, os totais e
+    "fornecedores": uma lista de {"fornecedor_id", "fornecedor", "valor",
+    "itens"}, com os itens mais urgentes (menos dias de cobertura) primeiro.
+    """
+    hoje = hoje or timezone.localdate()
+    fim = hoje - timedelta(days=1)
+    inicio = fim - timedelta(days=janela - 1)
+
+    ids, saldo, minimo, maximo, preco, fornecedor = carregar(
+        Item.objects.filter(ativo=True)
+        .annotate(fornecedor_ou_zero=Coalesce("fornecedor_id", 0))
+        .order_by("pk")
+        .values_list("pk", "qtde_total", "estoque_minimo", "estoque_maximo", "valor_unitario", "fornecedor_ou_zero"),
+        (np.int64, np.float64, np.float64, np.float64, np.float64, np.int64),
+    )
+
+    # Saída total de cada item em cada dia (somando os estoques): uma linha por item e dia com saída
+    item_saida, quantidade_dia = carregar(
+        MovimentacaoDiaria.objects.filter(
+            tipo_movimentacao=Movimentacao.Tipo.SAIDA, data__gte=inicio, data__lte=fim
+        )
+        .values("item_id", "data")
+        .annotate(total=Sum("quantidade"))
+        .order_by()
+        .values_list("item_id", "total"),
+        (np.int64, np.float64),
+    )
+    # Itens inativos (fora de ``ids``) não entram na conta
+    posicao, ativos = posicoes(ids, item_saida)
+    posicao, quantidade_dia = posicao[ativos], quantidade_dia[ativos]
+
+    soma = np.bincount(posicao, weights=quantidade_dia, minlength=len(ids))
+    soma_quadrados = np.bincount(posicao, weights=quantidade_dia**2, minlength=len(ids))
+    dias_com_saida = np.bincount(posicao, minlength=len(ids))
+    consumo = soma / janela
+    desvio = np.sqrt(np.maximum(soma_quadrados / janela - consumo**2, 0))
+    dias_cobertura = np.divide(saldo, consumo, out=np.full(len(ids), np.inf), where=consumo > 0)
+
+    ponto_pedido = np.maximum(np.ceil(consumo * prazo + fator * desvio * math.sqrt(prazo)), minimo)
+    alvo = np.where(maximo > 0, np.maximum(maximo, ponto_pedido), np.ceil(ponto_pedido + consumo * cobertura))
+    sugerir = (saldo <= ponto_pedido) & (alvo > saldo) & ((consumo > 0) | (minimo > 0))
+    quantidade = alvo - saldo
+
+    # Por fornecedor e, dentro dele, do item com menos dias de cobertura para o com mais
+    selecionados = np.flatnonzero(sugerir)
+    selecionados = selecionados[np.lexsort((dias_cobertura[selecionados], fornecedor[selecionados]))]
+    return {
+        "calculado_em": timezone.now(),
+        "inicio": inicio,
+        "fim": fim,
+        "janela": janela,
+        "prazo": prazo,
+        "cobertura": cobertura,
+        "fator": fator,
+        "itens_analisados": len(ids),
+        "itens_com_consumo": int(np.count_nonzero(consumo)),
+        "total_sugestoes": len(selecionados),
+        "valor_total": round(float(np.sum(quantidade[selecionados] * preco[selecionados])), 2),
+        "fornecedores": _agrupar(
+            selecionados,
+            ids=ids,
+            fornecedor=fornecedor,
+            saldo=saldo,
+            consumo=consumo,
+            desvio=desvio,
+            dias_com_saida=dias_com_saida,
+            dias_cobertura=dias_cobertura,
+            ponto_pedido=ponto_pedido,
+            quantidade=quantidade,
+            preco=preco,
+        ),
+    }
+
+
+def _agrupar(selecionados, *, ids, fornecedor, preco, **metricas):
+    """Monta as linhas dos itens selecionados (já ordenados), agrupadas por fornecedor."""
+    item_ids = ids[selecionados].tolist()
+    cadastro = {}
+    for inicio in range(0, len(item_ids), 1000):
+        cadastro.update(
+            (linha["pk"], linha)
+            for linha in Item.objects.filter(pk__in=item_ids[inicio : inicio + 1000]).values(
+                "pk", "codigo", "descricao", "unidade_medida"
+            )
+        )
+    nomes = dict(Fornecedor.objects.filter(pk__in=set(fornecedor[selecionados].tolist())).values_list("pk", "nome"))
+
+    grupos = []
+    for indice in selecionados:
+        fornecedor_id = int(fornecedor[indice]) or None
+        if not grupos or grupos[-1]["fornecedor_id"] != fornecedor_id:
+            grupos.append(
+                {
+                    "fornecedor_id": fornecedor_id,
+                    "fornecedor": nomes.get(fornecedor_id, "Sem fornecedor"),
+                    "valor": 0.0,
+                    "itens": [],
+                }
+            )
+        quantidade = int(metricas["quantidade"][indice])
+        valor = round(quantidade * float(preco[indice]), 2)
+        cobertura = metricas["dias_cobertura"][indice]
+        grupos[-1]["valor"] = round(grupos[-1]["valor"] + valor, 2)
+        grupos[-1]["itens"].append(
+            {
+                **cadastro[int(ids[indice])],
+                "saldo": int(metricas["saldo"][indice]),
+                "consumo_diario": round(float(metricas["consumo"][indice]), 2),
+                "desvio": round(float(metricas["desvio"][indice]), 2),
+                "dias_com_saida": int(metricas["dias_com_saida"][indice]),
+                "dias_cobertura": None if math.isinf(cobertura) else round(float(cobertura), 1),
+                "ponto_pedido": int(metricas["ponto_pedido"][indice]),
+                "quantidade": quantidade,
+                "valor": valor,
+            }
+        )
+    return grupos
@@ -0,0 +1,180 @@
+"""
+Consultas de período sobre o resumo diário de movimentações (MovimentacaoDiaria).
+
+Cada linha do resumo soma as movimentações de um item, em um estoque, em um
+dia, de um tipo. Perguntas sobre períodos ("quanto do item X saiu do depósito
+no último trimestre") leem no máximo uma linha por dia e tipo, em vez de uma
+por movimentação. Os dias são os do fuso local (TIME_ZONE). Todos os períodos
+são de datas, com ``inicio`` e ``fim`` incluídos.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .concorrencia import reservar_escrita
+from .models import Movimentacao, MovimentacaoDiaria
+
+CENTAVOS = Decimal("0.01")
+TIPOS = [tipo for tipo, _ in Movimentacao.Tipo.choices]
+
+
+def inicio_do_dia(dia):
+    """Instante em que o dia começa, no fuso local."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def periodo(inicio, fim, *, item=None, estoque=None, tipos=None):
+    """Linhas do resumo entre as datas ``inicio`` e ``fim``, com filtros opcionais."""
+    linhas = MovimentacaoDiaria.objects.filter(data__gte=inicio, data__lte=fim)
+    if item is not None:
+        linhas = linhas.filter(item=item)
+    if estoque is not None:
+        linhas = linhas.filter(estoque=estoque)
+    if tipos is not None:
+        linhas = linhas.filter(tipo_movimentacao__in=tipos)
+    return linhas
+
+
+def totais(inicio, fim, *, item=None, estoque=None):
+    """{tipo: {"quantidade", "valor", "movimentacoes"}} do período, com todos os tipos."""
+    resultado = {tipo: {"quantidade": 0, "valor": Decimal("0.00"), "movimentacoes": 0} for tipo in TIPOS}
+    somas = (
+        periodo(inicio, fim, item=item, estoque=estoque)
+        .values("tipo_movimentacao")
+        .annotate(quantidade=Sum("quantidade"), valor=Sum("valor"), movimentacoes=Sum("movimentacoes"))
+        .order_by()
+    )
+    for linha in somas:
+        resultado[linha["tipo_movimentacao"]] = {
+            "quantidade": linha["quantidade"],
+            "valor": Decimal(linha["valor"]).quantize(CENTAVOS),
+            "movimentacoes": linha["movimentacoes"],
+        }
+    return resultado
+
+
+def _sinal():
+    return Case(
+        When(tipo_movimentacao=Movimentacao.Tipo.SAIDA, then=-F("quantidade")),
+        default=F("quantidade"),
+        output_field=IntegerField(),
+    )
+
+
+def _valor_com_sinal():
+    return Case(
+        When(tipo_movimentacao=Movimentacao.Tipo.SAIDA, then=-F("valor")),
+        default=F("valor"),
+        output_field=DecimalField(max_digits=16, decimal_places=2),
+    )
+
+
+def variacoes(inicio, fim, *, estoque=None):
+    """
+    Soma com sinal das movimentações dos dias do período, por (item_id, estoque_id):
+    {par: (quantidade, valor)}, o valor pelo custo gravado nas movimentações.
+    """
+    somas = (
+        periodo(inicio, fim, estoque=estoque)
+        .values("item_id", "estoque_id")
+        .annotate(delta=Sum(_sinal()), valor=Sum(_valor_com_sinal()))
+        .order_by()
+    )
+    return {(linha["item_id"], linha["estoque_id"]): (linha["delta"], linha["valor"]) for linha in somas}
+
+
+def variacoes_por_dia(inicio, fim, *, item=None, estoque=None):
+    """Soma com sinal das movimentações de cada dia do período: {data: delta}, só dias com movimento."""
+    somas = periodo(inicio, fim, item=item, estoque=estoque).values("data").annotate(delta=Sum(_sinal())).order_by()
+    return {linha["data"]: linha["delta"] for linha in somas}
+
+
+def serie(inicio, fim, *, item=None, estoque=None):
+    """
+    Quantidade e valor por dia e tipo, para gráficos: uma entrada por dia do
+    período, inclusive os dias sem movimento (zerados).
+    """
+    vazio = {tipo: {"quantidade": 0, "valor": Decimal("0.00")} for tipo in TIPOS}
+    dias = {}
+    somas = (
+        periodo(inicio, fim, item=item, estoque=estoque)
+        .values("data", "tipo_movimentacao")
+        .annotate(quantidade=Sum("quantidade"), valor=Sum("valor"))
+        .order_by()
+    )
+    for linha in somas:
+        dia = dias.setdefault(linha["data"], {tipo: dict(valores) for tipo, valores in vazio.items()})
+        dia[linha["tipo_movimentacao"]] = {
+            "quantidade": linha["quantidade"],
+            "valor": Decimal(linha["valor"]).quantize(CENTAVOS),
+        }
+    resultado = []
+    dia = inicio
+    while dia <= fim:
+        resultado.append({"data": dia, **dias.get(dia, vazio)})
+        dia += timedelta(days=1)
+    return resultado
+
+
+def reconstruir(inicio, fim, *, dias_por_lote=31):
+    """
+    Regrava o resumo dos dias entre ``inicio`` e ``fim`` a partir de Movimentacao.
+
+    Processa ``dias_por_lote`` dias por transação e, a cada lote, devolve
+    (primeiro dia, último dia, linhas gravadas). O valor das linhas usa o custo
+    unitário gravado em cada movimentação. Durante cada lote novas
+    movimentações esperam, para que nenhuma fique de fora.
+    """
+    valor = ExpressionWrapper(
+        F("quantidade") * F("custo_unitario"), output_field=DecimalField(max_digits=16, decimal_places=2)
+    )
+    primeiro = inicio
+    while primeiro <= fim:
+        ultimo = min(primeiro + timedelta(days=dias_por_lote - 1), fim)
+        with transaction.atomic():
+            _bloquear_movimentacoes()
+            MovimentacaoDiaria.objects.filter(data__gte=primeiro, data__lte=ultimo).delete()
+            somas = (
+                Movimentacao.objects.filter(
+                    data_movimentacao__gte=inicio_do_dia(primeiro),
+                    data_movimentacao__lt=inicio_do_dia(ultimo + timedelta(days=1)),
+                )
+                .annotate(dia=TruncDate("data_movimentacao"))
+                .values("dia", "item_id", "estoque_id", "tipo_movimentacao")
+                .annotate(soma_quantidade=Sum("quantidade"), soma_valor=Sum(valor), total=Count("pk"))
+                .order_by()
+            )
+            linhas, gravadas = [], 0
+            for soma in somas.iterator(chunk_size=5000):
+                linhas.append(
+                    MovimentacaoDiaria(
+                        data=soma["dia"],
+                        item_id=soma["item_id"],
+                        estoque_id=soma["estoque_id"],
+                        tipo_movimentacao=soma["tipo_movimentacao"],
+                        quantidade=soma["soma_quantidade"],
+                        valor=Decimal(soma["soma_valor"]).quantize(CENTAVOS),
+                        movimentacoes=soma["total"],
+                    )
+                )
+                if len(linhas) >= 5000:
+                    MovimentacaoDiaria.objects.bulk_create(linhas)
+                    gravadas, linhas = gravadas + len(linhas), []
+            MovimentacaoDiaria.objects.bulk_create(linhas)
+            gravadas += len(linhas)
+        yield primeiro, ultimo, gravadas
+        primeiro = ultimo + timedelta(days=1)
+
+
+def _bloquear_movimentacoes():
+    """Impede novas movimentações até o fim da transação (leituras continuam livres)."""
+    conexao = connections[router.db_for_write(Movimentacao)]
+    if conexao.vendor == "postgresql":
+        with conexao.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {conexao.ops.quote_name(Movimentacao._meta.db_table)} IN SHARE MODE")
+    else:
+        reservar_escrita(Movimentacao)
@@ -0,0 +1,110 @@
+"""
+Cache LRU, em memória do processo, dos saldos consultados pelo formulário de movimentação.
+
+Cada entrada guarda saldo, mínimo/máximo e unidade de um par (item, estoque).
+As entradas são descartadas após o commit das transações que alteram o saldo
+ou o cadastro do item, e expiram após SALDO_CACHE_TTL segundos para limitar a
+defasagem entre processos diferentes.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+
+class CacheLRU:
+    """Dicionário limitado a ``maximo`` entradas que descarta a usada há mais tempo."""
+
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._dados = OrderedDict()
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                return None
+            expira_em, valor = entrada
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        with self._trava:
+            self._dados[chave] = (time.monotonic() + self.ttl, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maximo:
+                self._dados.popitem(last=False)
+
+    def descartar(self, condicao):
+        with self._trava:
+            for chave in [chave for chave in self._dados if condicao(chave)]:
+                del self._dados[chave]
+
+    def limpar(self):
+        with self._trava:
+            self._dados.clear()
+
+
+_cache = CacheLRU(
+    maximo=getattr(settings, "SALDO_CACHE_MAX_ITENS", 10_000),
+    ttl=getattr(settings, "SALDO_CACHE_TTL", 30),
+)
+
+
+def saldos(pares):
+    """
+    Retorna {(item_id, estoque_id): dados} para os pares informados.
+
+    ``dados`` é None quando o item não existe. Os pares ausentes do cache são
+    resolvidos juntos, com uma consulta para os itens e outra para os saldos.
+    """
+    from .models import Item, ItemEstoque
+
+    resultado, faltantes = {}, []
+    for par in dict.fromkeys(pares):
+        dados = _cache.get(par)
+        if dados is None:
+            faltantes.append(par)
+        else:
+            resultado[par] = dados
+    if not faltantes:
+        return resultado
+
+    item_ids = {item_id for item_id, _ in faltantes}
+    estoque_ids = {estoque_id for _, estoque_id in faltantes}
+    itens = Item.objects.only("estoque_minimo", "estoque_maximo", "unidade_medida").in_bulk(item_ids)
+    qtdes = {
+        (item_id, estoque_id): qtde
+        for item_id, estoque_id, qtde in ItemEstoque.objects.filter(
+            item_id__in=item_ids, estoque_id__in=estoque_ids
+        ).values_list("item_id", "estoque_id", "qtde")
+    }
+    for item_id, estoque_id in faltantes:
+        item = itens.get(item_id)
+        if item is None:
+            resultado[(item_id, estoque_id)] = None
+            continue
+        dados = {
+            "saldo": qtdes.get((item_id, estoque_id), 0),
+            "estoque_minimo": item.estoque_minimo,
+            "estoque_maximo": item.estoque_maximo,
+            "unidade_medida": item.unidade_medida,
+        }
+        _cache.set((item_id, estoque_id), dados)
+        resultado[(item_id, estoque_id)] = dados
+    return resultado
+
+
+def invalidar(pares=(), item_ids=()):
+    """Descarta, após o commit, os pares informados e todos os pares dos itens informados."""
+    pares, item_ids = set(pares), set(item_ids)
+    if not pares and not item_ids:
+        return
+    transaction.on_commit(lambda: _cache.descartar(lambda chave: chave in pares or chave[0] in item_ids))
@@ -0,0 +1,183 @@
+"""
+Saldos de estoque em qualquer data.
+
+O saldo ao fim de um dia parte do ponto conhecido mais próximo — um
+SaldoFechamento gravado antes ou depois da data, ou o saldo atual dos
+ItemEstoque — e aplica apenas as movimentações entre esse ponto e a data,
+somadas por dia no resumo diário (MovimentacaoDiaria), sem reprocessar o
+histórico de Movimentacao. O valor do saldo segue o mesmo caminho, pelo
+custo gravado em cada movimentação: entradas pelo preço de compra e saídas
+pelo custo médio do momento.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, When
+from django.utils import timezone
+
+from . import resumo_diario
+from .models import ItemEstoque, Movimentacao, SaldoFechamento
+
+CENTAVOS = Decimal("0.01")
+
+
+def fim_do_dia(dia):
+    """Instante em que o dia termina (início do dia seguinte, no fuso local)."""
+    return timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+
+
+def variacoes(inicio, fim, *, estoque=None):
+    """
+    Soma com sinal das movimentações em [inicio, fim), por (item_id, estoque_id):
+    {par: (quantidade, valor)}.
+
+    Os dias inteiros do intervalo vêm do resumo diário; só as pontas que não
+    caem na virada de um dia (ex.: de hoje até agora) somam as movimentações
+    uma a uma.
+    """
+    primeiro = timezone.localdate(inicio)
+    if resumo_diario.inicio_do_dia(primeiro) < inicio:
+        primeiro += timedelta(days=1)
+    ultimo = timezone.localdate(fim)
+    if primeiro >= ultimo:
+        return _variacoes_movimentacoes(inicio, fim, estoque)
+
+    total = {}
+    _aplicar(total, _variacoes_movimentacoes(inicio, resumo_diario.inicio_do_dia(primeiro), estoque))
+    _aplicar(total, resumo_diario.variacoes(primeiro, ultimo - timedelta(days=1), estoque=estoque))
+    _aplicar(total, _variacoes_movimentacoes(resumo_diario.inicio_do_dia(ultimo), fim, estoque))
+    return total
+
+
+def _aplicar(saldos, variacoes, sinal=1):
+    """Soma (ou, com ``sinal`` -1, desfaz) as variações em {par: (qtde, valor)}."""
+    for par, (delta, valor) in variacoes.items():
+        qtde, total = saldos.get(par, (0, Decimal("0")))
+        saldos[par] = (qtde + sinal * delta, total + sinal * valor)
+
+
+def _variacoes_movimentacoes(inicio, fim, estoque):
+    if inicio >= fim:
+        return {}
+    movimentacoes = Movimentacao.objects.filter(data_movimentacao__gte=inicio, data_movimentacao__lt=fim)
+    if estoque is not None:
+        movimentacoes = movimentacoes.filter(estoque=estoque)
+    sinal = Case(
+        When(tipo_movimentacao=Movimentacao.Tipo.SAIDA, then=-F("quantidade")),
+        default=F("quantidade"),
+        output_field=IntegerField(),
+    )
+    valor = Case(
+        When(tipo_movimentacao=Movimentacao.Tipo.SAIDA, then=-F("quantidade") * F("custo_unitario")),
+        default=F("quantidade") * F("custo_unitario"),
+        output_field=DecimalField(max_digits=18, decimal_places=4),
+    )
+    somas = movimentacoes.values("item_id", "estoque_id").annotate(delta=Sum(sinal), valor=Sum(valor)).order_by()
+    return {(linha["item_id"], linha["estoque_id"]): (linha["delta"], linha["valor"]) for linha in somas}
+
+
+def saldos_em(dia, *, estoque=None, valorizar=False):
+    """
+    Retorna {(item_id, estoque_id): qtde} ao fim de ``dia``.
+
+    Com ``valorizar``, retorna {(item_id, estoque_id): (qtde, valor)}: o valor
+    parte do gravado no fechamento (ou de qtde x custo médio atual) e acompanha
+    o custo gravado nas movimentações até a data.
+    """
+    fim = fim_do_dia(dia)
+    fechamentos = SaldoFechamento.objects.all()
+    if estoque is not None:
+        fechamentos = fechamentos.filter(estoque=estoque)
+    anterior = fechamentos.filter(data__lte=dia).order_by("-data").values_list("data", flat=True).first()
+    posterior = fechamentos.filter(data__gt=dia).order_by("data").values_list("data", flat=True).first()
+    agora = timezone.now()
+
+    # Escolhe o ponto de partida mais próximo da data pedida
+    candidatos = []
+    if anterior is not None:
+        candidatos.append((fim - fim_do_dia(anterior), "anterior"))
+    if posterior is not None:
+        candidatos.append((fim_do_dia(posterior) - fim, "posterior"))
+    candidatos.append((abs(agora - fim), "atual"))
+    _, origem = min(candidatos)
+
+    if origem == "atual":
+        vinculos = ItemEstoque.objects.filter(qtde__gt=0)
+        if estoque is not None:
+            vinculos = vinculos.filter(estoque=estoque)
+        saldos = {
+            (i, e): (q, q * c) for i, e, q, c in vinculos.values_list("item_id", "estoque_id", "qtde", "custo_medio")
+        }
+        if fim < agora:
+            _aplicar(saldos, variacoes(fim, agora, estoque=estoque), -1)
+        else:
+            _aplicar(saldos, variacoes(agora, fim, estoque=estoque))
+    else:
+        data_base = anterior if origem == "anterior" else posterior
+        saldos = {
+            (i, e): (q, v)
+            for i, e, q, v in fechamentos.filter(data=data_base).values_list("item_id", "estoque_id", "qtde", "valor")
+        }
+        if origem == "anterior":
+            _aplicar(saldos, variacoes(fim_do_dia(data_base), fim, estoque=estoque))
+        else:
+            _aplicar(saldos, variacoes(fim, fim_do_dia(data_base), estoque=estoque), -1)
+    if valorizar:
+        return {par: (qtde, valor) for par, (qtde, valor) in saldos.items() if qtde}
+    return {par: qtde for par, (qtde, _) in saldos.items() if qtde}
+
+
+def saldos_diarios(item, inicio, fim, *, estoque=None):
+    """
+    Saldo de ``item`` ao fim de cada dia entre ``inicio`` e ``fim``: [(dia, qtde)].
+
+    Parte do saldo atual e desfaz, de hoje para trás, a variação de cada dia
+    lida do resumo diário (que já inclui as movimentações de hoje): uma
+    consulta ao ItemEstoque e uma ao resumo, com no máximo uma linha por dia,
+    tipo e estoque, qualquer que seja o tamanho do histórico do item.
+    """
+    hoje = timezone.localdate()
+    vinculos = ItemEstoque.objects.filter(item=item)
+    if estoque is not None:
+        vinculos = vinculos.filter(estoque=estoque)
+    saldo = vinculos.aggregate(total=Sum("qtde"))["total"] or 0
+    deltas = resumo_diario.variacoes_por_dia(inicio, max(hoje, fim), item=item, estoque=estoque)
+
+    serie = []
+    dia = max(hoje, fim)
+    while dia >= inicio:
+        if dia <= fim:
+            serie.append((dia, saldo))
+        saldo -= deltas.get(dia, 0)
+        dia -= timedelta(days=1)
+    serie.reverse()
+    return serie
+
+
+def saldos_por_item(saldos):
+    """Agrupa o resultado de ``saldos_em`` por item: {item_id: qtde}."""
+    totais = Counter()
+    for (item_id, _), qtde in saldos.items():
+        totais[item_id] += qtde
+    return {item_id: qtde for item_id, qtde in totais.items() if qtde}
+
+
+def gravar_fechamento(dia):
+    """Grava (ou regrava) os SaldoFechamento de ``dia`` para todos os pares com saldo."""
+    with transaction.atomic():
+        # Remove o fechamento anterior do dia para que ele não sirva de base para si mesmo
+        SaldoFechamento.objects.filter(data=dia).delete()
+        saldos = saldos_em(dia, valorizar=True)
+        SaldoFechamento.objects.bulk_create(
+            [
+                SaldoFechamento(
+                    data=dia, item_id=item_id, estoque_id=estoque_id, qtde=qtde, valor=valor.quantize(CENTAVOS)
+                )
+                for (item_id, estoque_id), (qtde, valor) in sorted(saldos.items())
+                if qtde > 0
+            ],
+            batch_size=1000,
+        )
+    return len(saldos)
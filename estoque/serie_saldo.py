@@ -0,0 +1,100 @@
+"""
+Série do saldo diário de um item, reduzida a poucos pontos, para gráficos.
+
+As séries ficam no cache "kpis" (ver CACHES em settings e, sobre vários
+processos, estoque/kpis.py) com uma versão por item: a movimentação do item troca a
+versão após o commit e as séries antigas deixam de ser lidas. A chave também
+leva a data de hoje, então nenhuma série atravessa a virada do dia.
+"""
+import math
+import time
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from almoxarifado.roteador import primario
+
+from .saldos import saldos_diarios
+
+DIAS_PADRAO = 365
+MAXIMO_DIAS = 3650
+PONTOS_PADRAO = 90
+MAXIMO_PONTOS = 500
+_CHAVE_VERSAO_GERAL = "serie:versao"
+
+
+def _cache():
+    return caches["kpis"]
+
+
+def _chave_versao(item_id):
+    return f"serie:item:{item_id}:versao"
+
+
+def _versao(chave):
+    # Parte do relógio para que, se a chave for descartada, nunca volte a uma versão já usada
+    return _cache().get_or_set(chave, time.time_ns() // 1_000_000, timeout=None)
+
+
+def serie(item_id, *, dias=DIAS_PADRAO, pontos=PONTOS_PADRAO, estoque_id=None):
+    """
+    Saldo do item nos últimos ``dias`` dias, em no máximo ``pontos`` pontos.
+
+    Cada ponto cobre ``dias_por_ponto`` dias consecutivos e traz o saldo ao
+    fim do último deles, além do menor e do maior saldo do intervalo (picos e
+    rupturas não somem na redução). Os intervalos são contados a partir de
+    hoje, então o ponto mais recente termina sempre no dia atual.
+    """
+    hoje = timezone.localdate()
+    chave = (
+        f"serie:v{_versao(_CHAVE_VERSAO_GERAL)}:{item_id}:v{_versao(_chave_versao(item_id))}:"
+        f"{hoje.isoformat()}:{dias}:{pontos}:{estoque_id or 'todos'}"
+    )
+    cache = _cache()
+    valores = cache.get(chave)
+    if valores is None:
+        # Fica no cache para as próximas requisições: calcula no principal, nunca com a réplica atrasada
+        with primario():
+            diarios = saldos_diarios(item_id, hoje - timedelta(days=dias - 1), hoje, estoque=estoque_id)
+        valores = reduzir(diarios, pontos)
+        cache.set(chave, valores)
+    return valores
+
+
+def reduzir(diarios, pontos):
+    """Agrupa [(dia, saldo)] em no máximo ``pontos`` intervalos de dias, do mais recente para trás."""
+    passo = max(1, math.ceil(len(diarios) / pontos))
+    resultado = []
+    for fim in range(len(diarios), 0, -passo):
+        intervalo = [saldo for _, saldo in diarios[max(0, fim - passo) : fim]]
+        resultado.append(
+            {
+                "data": diarios[fim - 1][0].isoformat(),
+                "saldo": intervalo[-1],
+                "minimo": min(intervalo),
+                "maximo": max(intervalo),
+            }
+        )
+    resultado.reverse()
+    return {"dias_por_ponto": passo, "pontos": resultado}
+
+
+def invalidar(item_ids):
+    """Descarta, após o commit, as séries dos itens informados."""
+    chaves = [_chave_versao(item_id) for item_id in set(item_ids)]
+    if chaves:
+        transaction.on_commit(lambda: _cache().delete_many(chaves))
+
+
+def invalidar_tudo():
+    """Descarta, após o commit, as séries de todos os itens (ex.: resumo diário reconstruído)."""
+    def _nova_versao():
+        cache = _cache()
+        try:
+            cache.incr(_CHAVE_VERSAO_GERAL)
+        except ValueError:
+            cache.set(_CHAVE_VERSAO_GERAL, time.time_ns() // 1_000_000, timeout=None)
+
+    transaction.on_commit(_nova_versao)
@@ -1,33 +1,66 @@
+from collections import Counter
+from decimal import Decimal
+
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.db.models import Sum
+from django.db import connections, router, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 
-from .models import ItemEstoque, Movimentacao
+from . import custos
+from .concorrencia import ler_com_bloqueio_compartilhado, repetir_em_conflito, reservar_escrita
+from .kpis import invalidar as invalidar_kpis
+from .models import (
+    ClassificacaoItem,
+    Estoque,
+    Inventario,
+    InventarioItem,
+    Item,
+    ItemEstoque,
+    Movimentacao,
+    MovimentacaoDiaria,
+    agrupar_por_delta,
+)
+from .saldo_cache import invalidar as invalidar_saldos
+from .serie_saldo import invalidar as invalidar_series
 
 
+@repetir_em_conflito
 def registrar_movimentacao(*, usuario, item, estoque, tipo_movimentacao, quantidade, observacao=""):
     """
     Registra movimentação e atualiza o saldo do ItemEstoque de forma atômica.
     Levanta ValidationError se a operação levar a saldo negativo.
-    """
-    with transaction.atomic():
-        item_estoque, _ = (
-            ItemEstoque.objects.select_for_update()
-            .get_or_create(estoque=estoque, item=item, defaults={"qtde": 0})
-        )
 
-        saldo_atual = item_estoque.qtde
-        if tipo_movimentacao == Movimentacao.Tipo.SAIDA and quantidade > saldo_atual:
-            raise ValidationError("A saída deixaria o estoque negativo.")
+    O saldo muda com um UPDATE condicional (``qtde = qtde - n WHERE qtde >= n``
+    na saída), sem ler o saldo antes: o próprio UPDATE bloqueia a linha, e no
+    SQLite ser a primeira instrução da transação faz o bloqueio de escrita ser
+    pedido de imediato, com espera pelo timeout, em vez de falhar ao tentar
+    promover um bloqueio de leitura. A ordem dos bloqueios é sempre
+    ItemEstoque, Movimentacao, resumo diário, parcela do Estoque e Item, a
+    mesma do lote.
 
-        if tipo_movimentacao in (Movimentacao.Tipo.ENTRADA, Movimentacao.Tipo.AJUSTE):
-            novo_saldo = saldo_atual + quantidade
-        else:
-            novo_saldo = saldo_atual - quantidade
+    O custo médio do par é atualizado em tempo constante: com a linha já
+    bloqueada, lê saldo e custo e, numa entrada, grava a nova média.
+    """
+    saida = tipo_movimentacao == Movimentacao.Tipo.SAIDA
+    delta = -quantidade if saida else quantidade
+    with transaction.atomic():
+        vinculo = ItemEstoque.objects.filter(estoque=estoque, item=item)
+        if saida:
+            atualizados = vinculo.filter(qtde__gte=quantidade).update(qtde=F("qtde") - quantidade)
+            if not atualizados:
+                raise ValidationError("A saída deixaria o estoque negativo.")
+        elif not vinculo.update(qtde=F("qtde") + quantidade):
+            # Primeira movimentação do item neste estoque (outra transação pode ter criado o vínculo antes)
+            ItemEstoque.objects.bulk_create([ItemEstoque(estoque=estoque, item=item, qtde=0)], ignore_conflicts=True)
+            vinculo.update(qtde=F("qtde") + quantidade)
 
-        item_estoque.qtde = novo_saldo
-        item_estoque.save()
+        saldo, custo_medio = vinculo.values_list("qtde", "custo_medio").get()
+        _, novo_custo, custo_unitario = custos.aplicar(
+            saldo - delta, custo_medio, tipo_movimentacao, quantidade, item.valor_unitario
+        )
+        if novo_custo != custo_medio:
+            vinculo.update(custo_medio=novo_custo)
 
         movimento = Movimentacao.objects.create(
             item=item,
@@ -36,16 +69,328 @@ def registrar_movimentacao(*, usuario, item, estoque, tipo_movimentacao, quantid
             quantidade=quantidade,
             observacao=observacao,
             usuario=usuario,
+            custo_unitario=custo_unitario,
         )
+        MovimentacaoDiaria.acumular([movimento])
 
-        # MELHORIA: sincroniza o campo qtde_atual do estoque usando o vínculo ItemEstoque
-        total_estoque = (
-            ItemEstoque.objects.filter(estoque=estoque)
-            .aggregate(total=Coalesce(Sum("qtde"), 0))
-            .get("total")
-            or 0
-        )
-        estoque.qtde_atual = total_estoque
-        estoque.save(update_fields=["qtde_atual"])
+        # O que ItemEstoque.save faria: totais de Estoque e Item pela diferença, e caches
+        Estoque.aplicar_deltas({estoque.pk: delta})
+        Item.aplicar_deltas({item.pk: delta})
+        invalidar_kpis([estoque.pk])
+        invalidar_saldos(pares=[(item.pk, estoque.pk)])
+        invalidar_series([item.pk])
 
         return movimento
+
+
+@repetir_em_conflito
+def registrar_movimentacoes_em_lote(*, usuario, movimentacoes):
+    """
+    Registra várias movimentações em uma única transação.
+
+    Cada elemento de ``movimentacoes`` é um dicionário com as mesmas chaves
+    aceitas por ``registrar_movimentacao`` (item, estoque, tipo_movimentacao,
+    quantidade e, opcionalmente, observacao). As linhas são aplicadas na ordem
+    recebida e todas as saídas são validadas antes de qualquer escrita: se
+    alguma deixar saldo negativo, nada é gravado e o ValidationError lista as
+    linhas com problema.
+    """
+    movimentacoes = list(movimentacoes)
+    if not movimentacoes:
+        return []
+
+    pares = {(mov["estoque"].pk, mov["item"].pk) for mov in movimentacoes}
+
+    with transaction.atomic():
+        vinculos = _travar_itens_estoque(pares)
+        faltantes = pares - vinculos.keys()
+        if faltantes:
+            ItemEstoque.objects.bulk_create(
+                [ItemEstoque(estoque_id=estoque_id, item_id=item_id, qtde=0) for estoque_id, item_id in sorted(faltantes)],
+                ignore_conflicts=True,
+            )
+            vinculos = _travar_itens_estoque(pares)
+
+        saldos = {par: vinculo.qtde for par, vinculo in vinculos.items()}
+        custos_medios = {par: vinculo.custo_medio for par, vinculo in vinculos.items()}
+        custos_unitarios, erros = [], []
+        for linha, mov in enumerate(movimentacoes, start=1):
+            par = (mov["estoque"].pk, mov["item"].pk)
+            quantidade = mov["quantidade"]
+            if mov["tipo_movimentacao"] == Movimentacao.Tipo.SAIDA and quantidade > saldos[par]:
+                erros.append(
+                    f"Linha {linha}: a saída de {quantidade} de {mov['item']} deixaria o estoque "
+                    f"{mov['estoque']} negativo (saldo {saldos[par]})."
+                )
+                continue
+            saldos[par], custos_medios[par], custo_unitario = custos.aplicar(
+                saldos[par], custos_medios[par], mov["tipo_movimentacao"], quantidade, mov["item"].valor_unitario
+            )
+            custos_unitarios.append(custo_unitario)
+        if erros:
+            raise ValidationError(erros)
+
+        deltas_vinculo, deltas_estoque, deltas_item = Counter(), Counter(), Counter()
+        custos_alterados = []
+        for par, vinculo in vinculos.items():
+            if vinculo.custo_medio != custos_medios[par]:
+                vinculo.custo_medio = custos_medios[par]
+                custos_alterados.append(vinculo)
+                # Mesmo sem variação de quantidade, o valor em estoque do item muda
+                deltas_item[vinculo.item_id] += 0
+            if vinculo.qtde != saldos[par]:
+                deltas_vinculo[vinculo.pk] += saldos[par] - vinculo.qtde
+                deltas_estoque[vinculo.estoque_id] += saldos[par] - vinculo.qtde
+                deltas_item[vinculo.item_id] += saldos[par] - vinculo.qtde
+                vinculo.qtde = saldos[par]
+        # As linhas já estão bloqueadas; somar a variação equivale a gravar o saldo calculado
+        for delta, vinculo_ids in agrupar_por_delta(deltas_vinculo):
+            ItemEstoque.objects.filter(pk__in=vinculo_ids).update(qtde=F("qtde") + delta)
+        ItemEstoque.objects.bulk_update(custos_alterados, ["custo_medio"], batch_size=500)
+
+        movimentos = Movimentacao.objects.bulk_create(
+            [
+                Movimentacao(
+                    item=mov["item"],
+                    estoque=mov["estoque"],
+                    tipo_movimentacao=mov["tipo_movimentacao"],
+                    quantidade=mov["quantidade"],
+                    observacao=mov.get("observacao", ""),
+                    usuario=usuario,
+                    custo_unitario=custo_unitario,
+                )
+                for mov, custo_unitario in zip(movimentacoes, custos_unitarios)
+            ],
+            batch_size=500,
+        )
+        MovimentacaoDiaria.acumular(movimentos)
+
+        # Atualizações incrementais por estoque e por lote de itens, em vez de uma por linha
+        Estoque.aplicar_deltas(deltas_estoque)
+        Item.aplicar_deltas(deltas_item)
+        invalidar_kpis({estoque_id for estoque_id, _ in pares})
+        invalidar_saldos(pares=[(item_id, estoque_id) for estoque_id, item_id in pares])
+        invalidar_series({item_id for _, item_id in pares})
+
+        return movimentos
+
+
+def _travar_itens_estoque(pares, tamanho_lote=500):
+    """
+    Bloqueia, em consultas ordenadas, os ItemEstoque dos pares (estoque_id, item_id).
+
+    Os itens são divididos em lotes para não exceder o limite de parâmetros do
+    banco; a ordem dos lotes é sempre a mesma, então o bloqueio continua
+    determinístico entre transações concorrentes.
+    """
+    reservar_escrita(ItemEstoque)
+    estoque_ids = sorted({estoque_id for estoque_id, _ in pares})
+    item_ids = sorted({item_id for _, item_id in pares})
+    vinculos = {}
+    for inicio in range(0, len(item_ids), tamanho_lote):
+        consulta = (
+            ItemEstoque.objects.select_for_update()
+            .filter(estoque_id__in=estoque_ids, item_id__in=item_ids[inicio : inicio + tamanho_lote])
+            .order_by("estoque_id", "item_id")
+        )
+        for vinculo in consulta:
+            if (vinculo.estoque_id, vinculo.item_id) in pares:
+                vinculos[(vinculo.estoque_id, vinculo.item_id)] = vinculo
+    return vinculos
+
+
+class ResultadoEncerramento:
+    """Relatório do encerramento: linhas do inventário com saldo do sistema e diferença."""
+
+    def __init__(self, inventario, linhas, ajustes, ja_encerrado):
+        self.inventario = inventario
+        self.linhas = linhas
+        self.ajustes = ajustes
+        self.ja_encerrado = ja_encerrado
+
+    @property
+    def divergentes(self):
+        return [linha for linha in self.linhas if linha.diferenca]
+
+
+@repetir_em_conflito
+def encerrar_inventario(*, inventario, estoque, usuario):
+    """
+    Encerra o inventário, ajustando o estoque às quantidades contadas.
+
+    A diferença de cada linha (contada - saldo) sai de uma única consulta com
+    o saldo do ItemEstoque; sobras viram AJUSTE e faltas viram SAIDA, gravadas
+    de uma vez por ``registrar_movimentacoes_em_lote``. Tudo ocorre em uma
+    transação, com o inventário bloqueado: encerrar de novo o mesmo inventário
+    apenas devolve o relatório já gravado, sem criar ajustes.
+    """
+    with transaction.atomic():
+        reservar_escrita(Inventario)
+        inventario = Inventario.objects.select_for_update().get(pk=inventario.pk)
+        linhas = inventario.itens.select_related("item").order_by("pk")
+        if inventario.encerrado_em:
+            return ResultadoEncerramento(inventario, list(linhas), ajustes=0, ja_encerrado=True)
+
+        # Bloqueia os saldos antes de lê-los, para que a diferença não mude até o ajuste
+        list(
+            ItemEstoque.objects.select_for_update()
+            .filter(estoque=estoque, item__in=inventario.itens.values("item"))
+            .order_by("estoque_id", "item_id")
+            .values_list("pk", flat=True)
+        )
+        # Saldo e diferença de todas as linhas em um único UPDATE com subconsulta ao ItemEstoque
+        saldo = Coalesce(
+            Subquery(ItemEstoque.objects.filter(estoque=estoque, item=OuterRef("item")).values("qtde")[:1]),
+            0,
+        )
+        inventario.itens.update(saldo_sistema=saldo, diferenca=F("qtde_contada") - saldo)
+        linhas = list(linhas)
+
+        movimentacoes = []
+        observacao = f"Ajuste inventário {inventario.id}"
+        for linha in linhas:
+            if linha.diferenca:
+                movimentacoes.append(
+                    {
+                        "item": linha.item,
+                        "estoque": estoque,
+                        "tipo_movimentacao": Movimentacao.Tipo.AJUSTE if linha.diferenca > 0 else Movimentacao.Tipo.SAIDA,
+                        "quantidade": abs(linha.diferenca),
+                        "observacao": observacao,
+                    }
+                )
+        registrar_movimentacoes_em_lote(usuario=usuario, movimentacoes=movimentacoes)
+
+        inventario.encerrado_em = timezone.now()
+        inventario.estoque_encerramento = estoque
+        inventario.save(update_fields=["encerrado_em", "estoque_encerramento"])
+
+    return ResultadoEncerramento(inventario, linhas, ajustes=len(movimentacoes), ja_encerrado=False)
+
+
+def criar_inventario_por_classe(*, usuario, classe_abc=ClassificacaoItem.ABC.A, observacao=""):
+    """
+    Cria um inventário já com uma linha, ainda sem contagem, para cada item
+    ativo da classe ABC informada.
+
+    As linhas entram com um único INSERT ... SELECT sobre a tabela de
+    classificação, sem trazer os itens para a aplicação. Retorna
+    (inventario, quantidade de linhas). Levanta ValidationError se a
+    classificação ainda não foi calculada.
+    """
+    if not ClassificacaoItem.objects.exists():
+        raise ValidationError("Classificação ABC/XYZ não calculada: execute o comando classificar_itens.")
+    itens = (
+        ClassificacaoItem.objects.filter(classe_abc=classe_abc, item__ativo=True)
+        .order_by("item_id")
+        .values_list("item_id", flat=True)
+    )
+    with transaction.atomic():
+        inventario = Inventario.objects.create(usuario=usuario, observacao=observacao)
+        conexao = connections[router.db_for_write(InventarioItem)]
+        nome = conexao.ops.quote_name
+        sql, params = itens.query.sql_with_params()
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {nome(InventarioItem._meta.db_table)} ({nome('inventario_id')}, {nome('item_id')}) "
+                f"SELECT %s, classificados.{nome('item_id')} FROM ({sql}) classificados",
+                [inventario.pk, *params],
+            )
+            linhas = cursor.rowcount
+    return inventario, linhas
+
+
+def registrar_contagens(*, inventario, contagens, tamanho_lote=500):
+    """
+    Grava as quantidades contadas ({codigo: qtde}) nas linhas do inventário.
+
+    Os itens são resolvidos por código em lotes e as linhas são inseridas ou
+    atualizadas com um único INSERT ... ON CONFLICT por lote, sem ler as
+    linhas existentes. Retorna (quantidade gravada, códigos não encontrados).
+
+    O inventário é lido com bloqueio compartilhado: coletores simultâneos
+    gravam em paralelo, e só o encerramento (que usa FOR UPDATE) espera por
+    eles. Assim nenhuma contagem entra depois do relatório gravado.
+    """
+    codigos = list(contagens)
+    with transaction.atomic():
+        reservar_escrita(Inventario)
+        inventario = ler_com_bloqueio_compartilhado(Inventario, inventario.pk)
+        if inventario.encerrado_em:
+            raise ValidationError("Inventário encerrado: não é possível registrar novas contagens.")
+
+        item_ids = {}
+        for inicio in range(0, len(codigos), tamanho_lote):
+            item_ids.update(
+                Item.objects.filter(codigo__in=codigos[inicio : inicio + tamanho_lote]).values_list("codigo", "pk")
+            )
+        linhas = [
+            InventarioItem(inventario=inventario, item_id=item_ids[codigo], qtde_contada=qtde)
+            for codigo, qtde in contagens.items()
+            if codigo in item_ids
+        ]
+        InventarioItem.objects.bulk_create(
+            linhas,
+            batch_size=tamanho_lote,
+            update_conflicts=True,
+            unique_fields=["inventario", "item"],
+            update_fields=["qtde_contada"],
+        )
+    return len(linhas), [codigo for codigo in codigos if codigo not in item_ids]
+
+
+def reconciliar_totais(*, corrigir=True):
+    """
+    Compara os totais materializados com a soma real dos ItemEstoque.
+
+    Confere o total de cada Estoque (qtde_atual mais as parcelas) e o
+    qtde_total/valor_estoque de cada Item. Retorna a lista de divergências
+    como (objeto, valor_gravado, valor_real) e, se ``corrigir`` for
+    verdadeiro, consolida as parcelas dos estoques e soma a cada total a
+    diferença encontrada.
+
+    O valor gravado e o real de cada linha vêm da mesma consulta, e a correção
+    é aplicada como incremento (F() + diferença): movimentações gravadas
+    durante a conferência alteram os dois lados por igual e não são desfeitas.
+    """
+    if corrigir:
+        Estoque.consolidar_parciais()
+    soma_estoque = (
+        ItemEstoque.objects.filter(estoque=OuterRef("pk"))
+        .values("estoque")
+        .annotate(total=Sum("qtde"))
+        .values("total")
+    )
+    estoques = Estoque.objects.annotate(
+        total_gravado=Estoque._total_expr(), total_real=Coalesce(Subquery(soma_estoque), 0)
+    ).order_by("pk")
+    estoques_divergentes = [estoque for estoque in estoques if estoque.total_gravado != estoque.total_real]
+    divergencias = [(estoque, estoque.total_gravado, estoque.total_real) for estoque in estoques_divergentes]
+
+    soma_item = (
+        ItemEstoque.objects.filter(item=OuterRef("pk"))
+        .values("item")
+        .annotate(total=Sum("qtde"))
+        .values("total")
+    )
+    itens = (
+        Item.objects.annotate(total_real=Coalesce(Subquery(soma_item), 0), valor_real=Item._valor_estoque_expr())
+        .only("pk", "codigo", "descricao", "qtde_total", "valor_estoque")
+        .order_by("pk")
+    )
+    itens_divergentes = []
+    for item in itens.iterator(chunk_size=2000):
+        valor_real = Decimal(item.valor_real).quantize(Decimal("0.01"))
+        if item.qtde_total != item.total_real or item.valor_estoque != valor_real:
+            divergencias.append((item, item.qtde_total, item.total_real))
+            item.qtde_total = F("qtde_total") + (item.total_real - item.qtde_total)
+            item.valor_estoque = F("valor_estoque") + (valor_real - item.valor_estoque)
+            itens_divergentes.append(item)
+
+    if corrigir and divergencias:
+        with transaction.atomic():
+            for estoque in estoques_divergentes:
+                estoque.qtde_atual = F("qtde_atual") + (estoque.total_real - estoque.total_gravado)
+            Estoque.objects.bulk_update(estoques_divergentes, ["qtde_atual"], batch_size=500)
+            Item.objects.bulk_update(itens_divergentes, ["qtde_total", "valor_estoque"], batch_size=500)
+    return divergencias
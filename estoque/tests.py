@@ -0,0 +1,1378 @@
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.db.models import Max, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from almoxarifado import metricas, roteador, sqlite
+
+from . import classificacao, concorrencia, custos, kpis, registro, reposicao, resumo_diario, saldo_cache, serie_saldo
+from .busca import _prefixo, buscar_itens, indexar_itens
+from .paginacao import TAMANHO_PAGINA, paginar_por_chave
+from .planilhas import ler_xlsx
+from .relatorios import relatorio_cmv
+from .saldos import gravar_fechamento, saldos_em
+from .views import LIMITE_PARES_SALDO
+from .management.commands.benchmark import CENARIOS
+from .management.commands.gerar_dados import Command as GerarDados
+from .management.commands.verificar_indices import varridas_postgresql, varridas_sqlite
+from .forms import MovimentacaoForm
+from .importacao import importar_catalogo
+from .models import (
+    ClassificacaoItem,
+    Estoque,
+    EstoqueTotalParcial,
+    Fornecedor,
+    Inventario,
+    InventarioItem,
+    Item,
+    ItemEstoque,
+    Movimentacao,
+    MovimentacaoDiaria,
+    SaldoFechamento,
+    Usuario,
+)
+from .services import (
+    criar_inventario_por_classe,
+    encerrar_inventario,
+    reconciliar_totais,
+    registrar_contagens,
+    registrar_movimentacao,
+    registrar_movimentacoes_em_lote,
+)
+
+ENTRADA = Movimentacao.Tipo.ENTRADA
+SAIDA = Movimentacao.Tipo.SAIDA
+AJUSTE = Movimentacao.Tipo.AJUSTE
+
+
+def limpar_caches():
+    # Dentro de um TestCase os on_commit de invalidação não rodam: cada teste começa com os caches vazios
+    for cache in caches.all():
+        cache.clear()
+    saldo_cache._cache.limpar()
+
+
+class CustoMedioTests(SimpleTestCase):
+    def test_entrada_em_par_zerado_assume_o_preco(self):
+        resultado = custos.aplicar(0, Decimal("0"), ENTRADA, 10, Decimal("10"))
+        self.assertEqual(resultado, (10, Decimal("10"), Decimal("10")))
+
+    def test_entrada_recalcula_a_media_ponderada(self):
+        saldo, media, custo = custos.aplicar(10, Decimal("10"), ENTRADA, 5, Decimal("13"))
+        self.assertEqual((saldo, media, custo), (15, Decimal("11.0000"), Decimal("13")))
+
+    def test_saida_sai_pelo_custo_medio_sem_alterar_a_media(self):
+        self.assertEqual(custos.aplicar(15, Decimal("11"), SAIDA, 4, Decimal("20")), (11, Decimal("11"), Decimal("11")))
+
+    def test_ajuste_entra_pelo_custo_medio_ou_pelo_preco_com_par_zerado(self):
+        self.assertEqual(custos.aplicar(5, Decimal("11"), AJUSTE, 2, Decimal("20")), (7, Decimal("11"), Decimal("11")))
+        self.assertEqual(custos.aplicar(0, Decimal("11"), AJUSTE, 2, Decimal("20")), (2, Decimal("20"), Decimal("20")))
+
+
+class MovimentacaoBaseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="operador", email="operador@example.com", password="x")
+        cls.estoque = Estoque.objects.create(localizacao="Depósito")
+        cls.parafuso = Item.objects.create(
+            codigo="P-1", descricao="Parafuso", unidade_medida="un", valor_unitario=Decimal("2.00")
+        )
+        cls.porca = Item.objects.create(
+            codigo="P-2", descricao="Porca", unidade_medida="un", valor_unitario=Decimal("1.00")
+        )
+
+    def movimentar(self, item, tipo, quantidade):
+        return registrar_movimentacao(
+            usuario=self.usuario, item=item, estoque=self.estoque, tipo_movimentacao=tipo, quantidade=quantidade
+        )
+
+    def saldo(self, item):
+        return ItemEstoque.objects.filter(item=item, estoque=self.estoque).values_list("qtde", flat=True).first() or 0
+
+    def ultima_mensagem(self, resposta):
+        return [str(mensagem) for mensagem in get_messages(resposta.wsgi_request)][-1]
+
+
+class SaldoNegativoTests(MovimentacaoBaseTests):
+    def test_saida_maior_que_o_saldo_e_recusada(self):
+        self.movimentar(self.parafuso, ENTRADA, 3)
+        with self.assertRaises(ValidationError):
+            self.movimentar(self.parafuso, SAIDA, 5)
+        self.assertEqual(self.saldo(self.parafuso), 3)
+        self.assertEqual(Movimentacao.objects.count(), 1)
+
+    def test_lote_com_saida_sem_saldo_nao_grava_nada(self):
+        self.movimentar(self.parafuso, ENTRADA, 3)
+        with self.assertRaises(ValidationError):
+            registrar_movimentacoes_em_lote(
+                usuario=self.usuario,
+                movimentacoes=[
+                    {"item": self.parafuso, "estoque": self.estoque, "tipo_movimentacao": SAIDA, "quantidade": 2},
+                    {"item": self.porca, "estoque": self.estoque, "tipo_movimentacao": SAIDA, "quantidade": 9},
+                ],
+            )
+        self.assertEqual(self.saldo(self.parafuso), 3)
+        self.assertEqual(self.saldo(self.porca), 0)
+        self.assertEqual(Movimentacao.objects.count(), 1)
+
+
+class EncerramentoInventarioTests(MovimentacaoBaseTests):
+    def test_encerrar_de_novo_nao_cria_ajustes(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        inventario = Inventario.objects.create(usuario=self.usuario)
+        InventarioItem.objects.create(inventario=inventario, item=self.parafuso, qtde_contada=7)
+        InventarioItem.objects.create(inventario=inventario, item=self.porca, qtde_contada=3)
+
+        resultado = encerrar_inventario(inventario=inventario, estoque=self.estoque, usuario=self.usuario)
+        self.assertFalse(resultado.ja_encerrado)
+        self.assertEqual(resultado.ajustes, 2)
+        self.assertEqual((self.saldo(self.parafuso), self.saldo(self.porca)), (7, 3))
+        movimentacoes = Movimentacao.objects.count()
+
+        resultado = encerrar_inventario(inventario=inventario, estoque=self.estoque, usuario=self.usuario)
+        self.assertTrue(resultado.ja_encerrado)
+        self.assertEqual(resultado.ajustes, 0)
+        self.assertEqual(Movimentacao.objects.count(), movimentacoes)
+        self.assertEqual((self.saldo(self.parafuso), self.saldo(self.porca)), (7, 3))
+
+    @mock.patch("estoque.models.random.randrange", return_value=0)
+    def test_consultas_do_encerramento_nao_crescem_com_as_linhas(self, _):
+        itens = Item.objects.bulk_create(
+            Item(codigo=f"C-{numero}", descricao=f"Cabo {numero}", unidade_medida="m", valor_unitario=1)
+            for numero in range(30)
+        )
+        self.movimentar(self.parafuso, ENTRADA, 1)
+
+        def consultas(contados):
+            inventario = Inventario.objects.create(usuario=self.usuario)
+            InventarioItem.objects.bulk_create(
+                InventarioItem(inventario=inventario, item=item, qtde_contada=5) for item in contados
+            )
+            with CaptureQueriesContext(connection) as capturadas:
+                resultado = encerrar_inventario(inventario=inventario, estoque=self.estoque, usuario=self.usuario)
+            self.assertEqual(resultado.ajustes, len(contados))
+            return len(capturadas)
+
+        # Mesma variação em todas as linhas: os UPDATEs em lote são agrupados por variação
+        self.assertEqual(consultas(itens[:3]), consultas(itens[3:]))
+
+    def test_encerramento_pela_tela(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        inventario = Inventario.objects.create(usuario=self.usuario)
+        InventarioItem.objects.create(inventario=inventario, item=self.parafuso, qtde_contada=8)
+        self.client.force_login(self.usuario)
+        url = reverse("inventario_encerrar", args=[inventario.pk])
+
+        resposta = self.client.post(url, {"estoque_id": self.estoque.pk})
+        detalhe = reverse("inventario_detail", args=[inventario.pk])
+        self.assertRedirects(resposta, detalhe, fetch_redirect_response=False)
+        self.assertEqual(self.ultima_mensagem(resposta), "Inventário encerrado com 1 ajustes.")
+        self.assertEqual(self.saldo(self.parafuso), 8)
+
+        resposta = self.client.post(url, {"estoque_id": self.estoque.pk})
+        self.assertEqual(
+            self.ultima_mensagem(resposta), "Inventário já havia sido encerrado; nenhum ajuste foi criado."
+        )
+        self.assertEqual(self.saldo(self.parafuso), 8)
+
+    def test_contagens_atualizam_a_linha_e_param_depois_do_encerramento(self):
+        inventario = Inventario.objects.create(usuario=self.usuario)
+        self.assertEqual(registrar_contagens(inventario=inventario, contagens={"P-1": 4, "X-9": 1}), (1, ["X-9"]))
+        self.assertEqual(registrar_contagens(inventario=inventario, contagens={"P-1": 6}), (1, []))
+        self.assertEqual(list(inventario.itens.values_list("item__codigo", "qtde_contada")), [("P-1", 6)])
+
+        encerrar_inventario(inventario=inventario, estoque=self.estoque, usuario=self.usuario)
+        with self.assertRaises(ValidationError):
+            registrar_contagens(inventario=inventario, contagens={"P-1": 9})
+        self.assertEqual(list(inventario.itens.values_list("qtde_contada", flat=True)), [6])
+
+
+class VerificarIndicesTests(SimpleTestCase):
+    SQL_LISTA = 'SELECT "estoque_item"."id" FROM "estoque_item" ORDER BY "estoque_item"."descricao" ASC'
+
+    def test_sqlite_scan_por_indice_sem_limite_e_varredura_completa(self):
+        plano = ["SCAN estoque_item USING INDEX item_descricao_idx"]
+        self.assertEqual(varridas_sqlite(self.SQL_LISTA, plano), {"estoque_item"})
+        plano = ["SCAN estoque_item USING COVERING INDEX estoque_item_valor_estoque_40cb3537"]
+        self.assertEqual(varridas_sqlite('SELECT SUM("valor_estoque") FROM "estoque_item"', plano), {"estoque_item"})
+
+    def test_sqlite_busca_por_chave_limite_ou_indice_parcial_nao_contam(self):
+        busca = ["SEARCH estoque_item USING INDEX item_descricao_idx (descricao>?)"]
+        self.assertEqual(varridas_sqlite(self.SQL_LISTA, busca), set())
+        ordenada = ["SCAN estoque_item USING INDEX item_descricao_idx"]
+        self.assertEqual(varridas_sqlite(self.SQL_LISTA + " LIMIT 26", ordenada), set())
+        parcial = ["SCAN estoque_item USING INDEX item_abaixo_minimo_idx"]
+        self.assertEqual(varridas_sqlite(self.SQL_LISTA, parcial, {"item_abaixo_minimo_idx"}), set())
+
+    def test_sqlite_scan_sem_indice_conta_mesmo_com_limite_e_resolve_apelidos(self):
+        sql = 'SELECT 1 FROM "estoque_movimentacao" U0 WHERE U0."quantidade" > 1 LIMIT 1'
+        self.assertEqual(varridas_sqlite(sql, ["SCAN U0"]), {"estoque_movimentacao"})
+
+    def test_postgresql_index_scan_sem_condicao_conta_fora_de_um_limit(self):
+        varredura = {"Node Type": "Index Scan", "Relation Name": "estoque_item", "Index Name": "item_descricao_idx"}
+        self.assertEqual(varridas_postgresql(varredura)[1], {"estoque_item"})
+        self.assertEqual(varridas_postgresql({"Node Type": "Limit", "Plans": [varredura]})[1], set())
+        busca = {**varredura, "Index Cond": "(descricao > 'a')"}
+        self.assertEqual(varridas_postgresql(busca)[1], set())
+
+
+class GerarDadosTests(TestCase):
+    OPCOES = {"itens": 20, "estoques": 2, "movimentacoes": 300, "dias": 3, "inventarios": 1, "linhas_inventario": 5}
+
+    def setUp(self):
+        limpar_caches()
+
+    def gerar(self, **opcoes):
+        call_command("gerar_dados", stdout=StringIO(), **{**self.OPCOES, **opcoes})
+
+    def test_movimentacoes_geradas_nao_ficam_no_futuro(self):
+        self.gerar()
+        ultima = Movimentacao.objects.aggregate(ultima=Max("data_movimentacao"))["ultima"]
+        self.assertLess(timezone.localdate(ultima), timezone.localdate())
+
+    def test_recusa_gerar_o_dia_de_hoje(self):
+        with self.assertRaises(CommandError):
+            self.gerar(ate=timezone.localdate().isoformat())
+
+    def test_limpar_desconta_os_saldos_apagados_do_estoque_real(self):
+        usuario = Usuario.objects.create_user(username="operador", email="operador@example.com", password="x")
+        deposito = registro.estoque_padrao()
+        item = Item.objects.create(codigo="P-1", descricao="Parafuso", unidade_medida="un", valor_unitario=Decimal("2"))
+        registrar_movimentacao(usuario=usuario, item=item, estoque=deposito, tipo_movimentacao=ENTRADA, quantidade=7)
+        self.gerar()
+        self.assertGreater(Estoque.objects.annotate(total=Estoque._total_expr()).get(pk=deposito.pk).total, 7)
+
+        GerarDados(stdout=StringIO())._limpar()
+        self.assertEqual(Estoque.objects.annotate(total=Estoque._total_expr()).get(pk=deposito.pk).total, 7)
+        self.assertEqual(reconciliar_totais(corrigir=False), [])
+
+    def test_mesma_seed_gera_os_mesmos_dados(self):
+        def gerados():
+            return list(
+                Movimentacao.objects.order_by("pk").values_list(
+                    "item__codigo", "estoque__localizacao", "tipo_movimentacao", "quantidade", "data_movimentacao"
+                )
+            )
+
+        self.gerar()
+        primeira = gerados()
+        self.gerar(limpar=True)
+        self.assertEqual(gerados(), primeira)
+        self.assertEqual(reconciliar_totais(corrigir=False), [])
+
+    def test_benchmark_grava_o_resultado_e_acusa_regressao(self):
+        self.gerar()
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, "atual.json")
+            call_command("benchmark", repeticoes=2, aquecimento=0, sem_cache=True, saida=saida, stdout=StringIO())
+            with open(saida, encoding="utf-8") as arquivo:
+                resultado = json.load(arquivo)
+            self.assertEqual(set(resultado["cenarios"]), set(CENARIOS))
+            self.assertEqual(Movimentacao.objects.count(), resultado["volumes"]["movimentacoes"])
+
+            # Menos consultas na linha de base: a medição atual é uma regressão
+            resultado["cenarios"]["dashboard"]["consultas"] -= 1
+            linha_de_base = os.path.join(pasta, "base.json")
+            with open(linha_de_base, "w", encoding="utf-8") as arquivo:
+                json.dump(resultado, arquivo)
+            with self.assertRaisesMessage(CommandError, "pioraram"):
+                call_command(
+                    "benchmark",
+                    "dashboard",
+                    repeticoes=2,
+                    aquecimento=0,
+                    sem_cache=True,
+                    comparar=linha_de_base,
+                    tolerancia=100,
+                    stdout=StringIO(),
+                )
+
+
+class EstoqueSaveTests(MovimentacaoBaseTests):
+    def test_salvar_instancia_antiga_nao_desfaz_a_consolidacao(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        lido = Estoque.objects.get(pk=self.estoque.pk)
+        Estoque.consolidar_parciais()
+        lido.nivel_minimo = 4
+        lido.save()
+
+        estoque = Estoque.objects.get(pk=self.estoque.pk)
+        self.assertEqual((estoque.qtde_atual, estoque.nivel_minimo, estoque.total_atual()), (10, 4, 10))
+
+    def test_variacoes_vao_para_parcelas_sorteadas(self):
+        with mock.patch("estoque.models.random.randrange", side_effect=[0, 3, 3]):
+            Estoque.aplicar_deltas({self.estoque.pk: 5})
+            Estoque.aplicar_deltas({self.estoque.pk: 4})
+            Estoque.aplicar_deltas({self.estoque.pk: -2})
+        parcelas = dict(self.estoque.parciais.values_list("fatia", "qtde"))
+        self.assertEqual(parcelas, {0: 5, 3: 2})
+        self.assertEqual(Estoque.objects.annotate(total=Estoque._total_expr()).get(pk=self.estoque.pk).total, 7)
+        Estoque.consolidar_parciais([self.estoque.pk])
+        self.assertEqual(Estoque.objects.get(pk=self.estoque.pk).qtde_atual, 7)
+
+
+class ConcorrenciaTests(SimpleTestCase):
+    def setUp(self):
+        # Dentro de um atomic() externo o erro é repassado sem repetir; aqui a função roda fora dele
+        fora_de_transacao = mock.patch(
+            "estoque.concorrencia.transaction.get_connection", return_value=mock.Mock(in_atomic_block=False)
+        )
+        fora_de_transacao.start()
+        self.addCleanup(fora_de_transacao.stop)
+        pausa = mock.patch("estoque.concorrencia.time.sleep")
+        self.sleep = pausa.start()
+        self.addCleanup(pausa.stop)
+
+    def falhando(self, *erros):
+        return mock.Mock(side_effect=[*erros, "ok"], __name__="gravar")
+
+    def test_conflito_transitorio(self):
+        self.assertTrue(concorrencia.conflito_transitorio(OperationalError("database is locked")))
+        deadlock = OperationalError("deadlock detected")
+        deadlock.__cause__ = Exception("deadlock detected")
+        deadlock.__cause__.pgcode = "40P01"
+        self.assertTrue(concorrencia.conflito_transitorio(deadlock))
+        self.assertFalse(concorrencia.conflito_transitorio(OperationalError("no such table: estoque_item")))
+
+    def test_repete_com_espera_crescente_ate_conseguir(self):
+        antes = concorrencia.estatisticas()
+        funcao = self.falhando(OperationalError("database is locked"), OperationalError("database is locked"))
+        with mock.patch("estoque.concorrencia.random.uniform", side_effect=lambda inicio, fim: fim):
+            resultado = concorrencia.repetir_em_conflito(funcao, espera_inicial=0.1, espera_maxima=0.15)()
+        self.assertEqual(resultado, "ok")
+        self.assertEqual(funcao.call_count, 3)
+        self.assertEqual([chamada.args[0] for chamada in self.sleep.call_args_list], [0.1, 0.15])
+        self.assertEqual(concorrencia.estatisticas()["repeticoes"], antes["repeticoes"] + 2)
+
+    def test_desiste_depois_das_tentativas(self):
+        antes = concorrencia.estatisticas()
+        funcao = self.falhando(*[OperationalError("database is locked")] * 3)
+        with self.assertRaises(OperationalError):
+            concorrencia.repetir_em_conflito(funcao, tentativas=3)()
+        self.assertEqual(funcao.call_count, 3)
+        self.assertEqual(concorrencia.estatisticas()["esgotadas"], antes["esgotadas"] + 1)
+
+    def test_outros_erros_nao_sao_repetidos(self):
+        funcao = self.falhando(OperationalError("no such table: estoque_item"))
+        with self.assertRaises(OperationalError):
+            concorrencia.repetir_em_conflito(funcao)()
+        self.assertEqual(funcao.call_count, 1)
+
+    def test_dentro_de_transacao_externa_repassa_o_erro(self):
+        funcao = self.falhando(OperationalError("database is locked"))
+        em_transacao = mock.Mock(in_atomic_block=True)
+        with mock.patch("estoque.concorrencia.transaction.get_connection", return_value=em_transacao):
+            with self.assertRaises(OperationalError):
+                concorrencia.repetir_em_conflito(funcao)()
+        self.assertEqual(funcao.call_count, 1)
+
+
+class BuscaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="operador", email="operador@example.com", password="x")
+        for codigo, descricao in (
+            ("ABC-2", "Bucha de nylon"),
+            ("Z-1", "Abc adesivo"),
+            ("ABC", "Arruela lisa"),
+            ("Z-2", "Abd parafuso"),
+            ("Z-3", "Lâmpada LED"),
+        ):
+            Item.objects.create(codigo=codigo, descricao=descricao, unidade_medida="un", valor_unitario=Decimal("1"))
+
+    def codigos(self, itens):
+        return [item.codigo for item in itens]
+
+    def test_codigo_exato_depois_prefixo_do_codigo_depois_descricao(self):
+        self.assertEqual(self.codigos(buscar_itens("abc")), ["ABC", "ABC-2", "Z-1"])
+
+    def test_prefixo_ignora_acentos_e_nao_passa_do_intervalo(self):
+        self.assertEqual(self.codigos(buscar_itens("LÂMP")), ["Z-3"])
+        self.assertEqual(self.codigos(buscar_itens("abd")), ["Z-2"])
+        self.assertEqual(self.codigos(buscar_itens("lampada led")), ["Z-3"])
+        self.assertEqual(buscar_itens("parafuso lampada"), [])
+
+    def test_listagem_de_itens_mantem_a_relevancia(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse("item_list"), {"q": "abc"})
+        self.assertEqual(self.codigos(resposta.context["itens"]), ["ABC", "ABC-2", "Z-1"])
+
+    def test_indice_acompanha_a_alteracao_do_item(self):
+        item = Item.objects.get(codigo="Z-2")
+        item.descricao = "Rebite de alumínio"
+        item.save()
+        self.assertEqual(buscar_itens("parafuso"), [])
+        self.assertEqual(self.codigos(buscar_itens("rebite alum")), ["Z-2"])
+
+    def test_autocomplete_devolve_os_rotulos_na_ordem_de_relevancia(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse("api_item_search"), {"q": "abc"})
+        rotulos = [resultado["text"] for resultado in resposta.json()["results"]]
+        self.assertEqual(rotulos, ["ABC - Arruela lisa", "ABC-2 - Bucha de nylon", "Z-1 - Abc adesivo"])
+
+    def test_prefixo_por_intervalo_no_sqlite_e_startswith_nos_demais_bancos(self):
+        with mock.patch.object(connection, "vendor", "sqlite"):
+            self.assertEqual(_prefixo("abz"), Q(termo__gte="abz", termo__lt="ab{"))
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            self.assertEqual(_prefixo("abz"), Q(termo__startswith="abz"))
+
+
+class PaginacaoItensTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="operador", email="operador@example.com", password="x")
+        # Descrições repetidas: o desempate pelo id precisa manter cada item em uma única página
+        Item.objects.bulk_create(
+            Item(codigo=f"I-{numero:03d}", descricao=f"Item {numero % 7}", unidade_medida="un", valor_unitario=1)
+            for numero in range(TAMANHO_PAGINA + 5)
+        )
+        cls.ordem = list(Item.objects.order_by("descricao", "pk").values_list("pk", flat=True))
+
+    def test_percorre_todas_as_paginas_e_volta(self):
+        paginas, cursor = [], None
+        while True:
+            pagina = paginar_por_chave(Item.objects.all(), campos=["descricao"], apos=cursor, tamanho=5, crescente=True)
+            paginas.append(pagina)
+            if not pagina.proxima:
+                break
+            cursor = pagina.proxima
+        self.assertEqual([item.pk for pagina in paginas for item in pagina], self.ordem)
+        self.assertIsNone(paginas[0].anterior)
+
+        anterior = paginar_por_chave(
+            Item.objects.all(), campos=["descricao"], antes=paginas[2].anterior, tamanho=5, crescente=True
+        )
+        self.assertEqual([item.pk for item in anterior], [item.pk for item in paginas[1]])
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        pagina = paginar_por_chave(Item.objects.all(), campos=["descricao"], apos="lixo", tamanho=5, crescente=True)
+        self.assertEqual([item.pk for item in pagina], self.ordem[:5])
+
+    def test_listagem_de_itens_e_paginada(self):
+        self.client.force_login(self.usuario)
+        primeira = self.client.get(reverse("item_list"))
+        segunda = self.client.get(reverse("item_list"), {"apos": primeira.context["pagina"].proxima})
+        self.assertEqual([item.pk for item in primeira.context["itens"]], self.ordem[:TAMANHO_PAGINA])
+        self.assertEqual([item.pk for item in segunda.context["itens"]], self.ordem[TAMANHO_PAGINA:])
+        self.assertIsNone(segunda.context["pagina"].proxima)
+
+
+class MovimentacaoLoteTests(MovimentacaoBaseTests):
+    def setUp(self):
+        limpar_caches()
+        self.client.force_login(self.usuario)
+
+    def enviar(self, linhas):
+        return self.client.post(
+            reverse("api_movimentacoes_lote"), json.dumps({"movimentacoes": linhas}), content_type="application/json"
+        )
+
+    def linha(self, item, tipo, quantidade):
+        return {"item": item.pk, "estoque": self.estoque.pk, "tipo_movimentacao": tipo, "quantidade": quantidade}
+
+    def test_lote_grava_saldos_e_totais(self):
+        resposta = self.enviar(
+            [
+                self.linha(self.parafuso, ENTRADA, 10),
+                self.linha(self.parafuso, SAIDA, 4),
+                self.linha(self.porca, ENTRADA, 3),
+            ]
+        )
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()["registradas"], 3)
+        self.assertEqual((self.saldo(self.parafuso), self.saldo(self.porca)), (6, 3))
+        self.parafuso.refresh_from_db()
+        self.assertEqual((self.parafuso.qtde_total, self.parafuso.valor_estoque), (6, Decimal("12.00")))
+        self.assertEqual(Estoque.objects.get(pk=self.estoque.pk).total_atual(), 9)
+        self.assertEqual(reconciliar_totais(corrigir=False), [])
+
+    # A parcela do total é sorteada, e a primeira variação em uma fatia custa duas consultas a mais
+    @mock.patch("estoque.models.random.randrange", return_value=0)
+    def test_consultas_nao_crescem_com_o_tamanho_do_lote(self, _):
+        self.movimentar(self.parafuso, ENTRADA, 100)
+        self.movimentar(self.porca, ENTRADA, 100)
+
+        def consultas(repeticoes):
+            linhas = [self.linha(self.parafuso, SAIDA, 1), self.linha(self.porca, SAIDA, 1)] * repeticoes
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(self.enviar(linhas).status_code, 201)
+            return len(capturadas)
+
+        self.assertEqual(consultas(1), consultas(20))
+
+    def test_linha_invalida_recusa_o_lote_inteiro(self):
+        resposta = self.enviar([self.linha(self.parafuso, ENTRADA, 10), self.linha(self.porca, "DOACAO", 1)])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()["errors"], ["Linha 2: tipo de movimentação inválido."])
+        self.assertFalse(Movimentacao.objects.exists())
+        self.assertEqual(self.client.get(reverse("api_movimentacoes_lote")).status_code, 405)
+
+
+class TotaisIncrementaisTests(MovimentacaoBaseTests):
+    def total(self):
+        return Estoque.objects.annotate(total=Estoque._total_expr()).get(pk=self.estoque.pk).total
+
+    def test_movimentacoes_somam_nas_parcelas_e_a_consolidacao_preserva_o_total(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        self.movimentar(self.porca, ENTRADA, 5)
+        self.movimentar(self.parafuso, SAIDA, 3)
+        self.assertEqual(Estoque.objects.get(pk=self.estoque.pk).qtde_atual, 0)
+        self.assertEqual(self.total(), 12)
+
+        Estoque.consolidar_parciais()
+        self.assertEqual(Estoque.objects.get(pk=self.estoque.pk).qtde_atual, 12)
+        self.assertFalse(EstoqueTotalParcial.objects.exclude(qtde=0).exists())
+        self.assertEqual(self.total(), 12)
+
+    def test_reconciliar_corrige_totais_divergentes(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        Estoque.objects.filter(pk=self.estoque.pk).update(qtde_atual=7)
+        Item.objects.filter(pk=self.parafuso.pk).update(qtde_total=1, valor_estoque=0)
+
+        divergencias = reconciliar_totais(corrigir=True)
+        resumo = {(type(objeto), gravado, real) for objeto, gravado, real in divergencias}
+        self.assertEqual(resumo, {(Estoque, 17, 10), (Item, 1, 10)})
+        self.assertEqual(self.total(), 10)
+        self.parafuso.refresh_from_db()
+        self.assertEqual((self.parafuso.qtde_total, self.parafuso.valor_estoque), (10, Decimal("20.00")))
+        self.assertEqual(reconciliar_totais(corrigir=False), [])
+
+
+class TotaisDoItemTests(MovimentacaoBaseTests):
+    def test_movimentacoes_atualizam_quantidade_e_valor_do_item(self):
+        outro = Estoque.objects.create(localizacao="Almoxarifado 2")
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        registrar_movimentacao(
+            usuario=self.usuario, item=self.parafuso, estoque=outro, tipo_movimentacao=ENTRADA, quantidade=5
+        )
+        self.movimentar(self.parafuso, SAIDA, 2)
+        self.parafuso.refresh_from_db()
+        self.assertEqual((self.parafuso.qtde_total, self.parafuso.valor_estoque), (13, Decimal("26.00")))
+
+    def test_salvar_instancia_antiga_nao_regrava_os_totais(self):
+        lido = Item.objects.get(pk=self.parafuso.pk)
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        lido.descricao = "Parafuso sextavado"
+        lido.save()
+        self.parafuso.refresh_from_db()
+        self.assertEqual((self.parafuso.descricao, self.parafuso.qtde_total), ("Parafuso sextavado", 10))
+
+
+class MovimentacaoListTests(MovimentacaoBaseTests):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        registrar_movimentacoes_em_lote(
+            usuario=cls.usuario,
+            movimentacoes=[
+                {"item": item, "estoque": cls.estoque, "tipo_movimentacao": ENTRADA, "quantidade": 1}
+                for item in [cls.parafuso, cls.porca] * (TAMANHO_PAGINA // 2 + 5)
+            ],
+        )
+        # Metade no mesmo instante: o desempate pelo id não pode repetir nem pular registros entre páginas
+        ontem = timezone.now() - timedelta(days=1)
+        Movimentacao.objects.filter(item=cls.porca).update(data_movimentacao=ontem)
+        cls.ordem = list(Movimentacao.objects.order_by("-data_movimentacao", "-pk").values_list("pk", flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_percorre_as_paginas_sem_repetir_nem_pular(self):
+        vistos, parametros = [], {}
+        while True:
+            resposta = self.client.get(reverse("movimentacao_list"), parametros)
+            vistos += [mov.pk for mov in resposta.context["movimentacoes"]]
+            if not resposta.context["pagina"].proxima:
+                break
+            parametros = {"apos": resposta.context["pagina"].proxima}
+        self.assertEqual(vistos, self.ordem)
+
+    def test_filtros_sao_aplicados_no_banco_e_mantidos_na_navegacao(self):
+        hoje = timezone.localdate().isoformat()
+        resposta = self.client.get(reverse("movimentacao_list"), {"item": self.porca.pk, "data_fim": hoje})
+        self.assertEqual({mov.item_id for mov in resposta.context["movimentacoes"]}, {self.porca.pk})
+        self.assertIn(f"item={self.porca.pk}", resposta.context["filtros_query"])
+
+        resposta = self.client.get(reverse("movimentacao_list"), {"data_inicio": hoje, "tipo": ENTRADA})
+        self.assertEqual({mov.item_id for mov in resposta.context["movimentacoes"]}, {self.parafuso.pk})
+
+
+class ExportacaoMovimentacoesTests(MovimentacaoBaseTests):
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        self.movimentar(self.porca, ENTRADA, 4)
+        self.movimentar(self.parafuso, SAIDA, 3)
+
+    def exportar(self, **parametros):
+        resposta = self.client.get(reverse("movimentacao_exportar"), parametros)
+        self.assertTrue(resposta.streaming)
+        return resposta, b"".join(resposta.streaming_content)
+
+    def test_csv_em_fluxo_com_os_filtros_da_listagem(self):
+        resposta, conteudo = self.exportar(item=self.parafuso.pk)
+        self.assertIn("attachment;", resposta["Content-Disposition"])
+        self.assertTrue(conteudo.startswith("\ufeff".encode()))
+        linhas = list(csv.reader(StringIO(conteudo.decode("utf-8-sig")), delimiter=";"))
+        self.assertEqual(linhas[0][:3], ["Data", "Tipo", "Código"])
+        self.assertEqual(
+            [(linha[1], linha[2], linha[5]) for linha in linhas[1:]], [("Saída", "P-1", "3"), ("Entrada", "P-1", "10")]
+        )
+
+    def test_xlsx_em_fluxo_abre_com_as_mesmas_linhas(self):
+        resposta, conteudo = self.exportar(formato="xlsx")
+        self.assertTrue(resposta["Content-Disposition"].endswith('.xlsx"'))
+        linhas = list(ler_xlsx(BytesIO(conteudo)))
+        self.assertEqual(linhas[0][:3], ["Data", "Tipo", "Código"])
+        self.assertEqual([(linha[2], linha[5]) for linha in linhas[1:]], [("P-1", "3"), ("P-2", "4"), ("P-1", "10")])
+
+
+class HistoricoBaseTests(MovimentacaoBaseTests):
+    """Parafuso: entra 10 a R$ 2 há 10 dias, sai 4 há 5, entra 6 a R$ 5 há 2 e sai 2 hoje."""
+
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        self.movimentar_em(10, ENTRADA, 10)
+        self.movimentar_em(5, SAIDA, 4)
+        self.parafuso.valor_unitario = Decimal("5.00")
+        self.parafuso.save(update_fields=["valor_unitario"])
+        self.movimentar_em(2, ENTRADA, 6)
+        self.movimentar(self.parafuso, SAIDA, 2)
+        # As datas foram reescritas depois de gravadas: o resumo diário é refeito a partir das movimentações
+        for _ in resumo_diario.reconstruir(self.dia(15), self.hoje):
+            pass
+
+    def dia(self, dias_atras):
+        return self.hoje - timedelta(days=dias_atras)
+
+    def movimentar_em(self, dias_atras, tipo, quantidade):
+        movimentacao = self.movimentar(self.parafuso, tipo, quantidade)
+        meio_dia = timezone.make_aware(datetime.combine(self.dia(dias_atras), time(12)))
+        Movimentacao.objects.filter(pk=movimentacao.pk).update(data_movimentacao=meio_dia)
+
+
+class SaldosNaDataTests(HistoricoBaseTests):
+    ESPERADOS = {11: None, 10: (10, "20.00"), 5: (6, "12.00"), 2: (12, "42.00"), 0: (10, "35.00")}
+
+    def conferir(self):
+        for dias_atras, esperado in self.ESPERADOS.items():
+            with self.subTest(dias_atras=dias_atras):
+                saldos = saldos_em(self.dia(dias_atras), valorizar=True)
+                par = saldos.get((self.parafuso.pk, self.estoque.pk))
+                obtido = par and (par[0], par[1].quantize(Decimal("0.01")))
+                self.assertEqual(obtido, esperado and (esperado[0], Decimal(esperado[1])))
+
+    def test_saldos_a_partir_do_saldo_atual(self):
+        self.conferir()
+
+    def test_saldos_a_partir_de_um_fechamento(self):
+        gravar_fechamento(self.dia(7))
+        gravar_fechamento(self.dia(3))
+        self.conferir()
+
+    def test_cmv_do_periodo_bate_com_o_valor_das_saidas(self):
+        cmv = relatorio_cmv(self.dia(6), self.dia(1))
+        self.assertEqual(cmv["valor_estoque_inicial"], Decimal("20.00"))
+        self.assertEqual(cmv["valor_compras_liquidas"], Decimal("30.00"))
+        self.assertEqual(cmv["valor_estoque_final_contado"], Decimal("42.00"))
+        self.assertEqual((cmv["custo_uso"], cmv["valor_saidas"]), (Decimal("8.00"), Decimal("8.00")))
+        detalhe = [(item.codigo, item.quantidade_atual, item.custo_medio) for item in cmv["itens"]]
+        self.assertEqual(detalhe, [("P-1", 12, Decimal("3.50"))])
+
+    def test_relatorio_cmv_na_tela(self):
+        self.client.force_login(self.usuario)
+        periodo = {"data_inicio": self.dia(6).isoformat(), "data_fim": self.dia(1).isoformat()}
+        self.assertEqual(self.client.get(reverse("relatorio_cmv"), periodo).context["custo_uso"], Decimal("8.00"))
+        invertido = {"data_inicio": periodo["data_fim"], "data_fim": periodo["data_inicio"]}
+        self.assertNotIn("custo_uso", self.client.get(reverse("relatorio_cmv"), invertido).context)
+
+
+class ResumoDiarioTests(HistoricoBaseTests):
+    def resumo(self):
+        return sorted(
+            MovimentacaoDiaria.objects.values_list(
+                "data", "item_id", "estoque_id", "tipo_movimentacao", "quantidade", "valor", "movimentacoes"
+            )
+        )
+
+    def test_resumo_mantido_pelas_movimentacoes_bate_com_a_reconstrucao(self):
+        registrar_movimentacoes_em_lote(
+            usuario=self.usuario,
+            movimentacoes=[
+                {"item": self.porca, "estoque": self.estoque, "tipo_movimentacao": ENTRADA, "quantidade": 8},
+                {"item": self.parafuso, "estoque": self.estoque, "tipo_movimentacao": SAIDA, "quantidade": 1},
+            ],
+        )
+        inventario = Inventario.objects.create(usuario=self.usuario)
+        InventarioItem.objects.create(inventario=inventario, item=self.porca, qtde_contada=5)
+        encerrar_inventario(inventario=inventario, estoque=self.estoque, usuario=self.usuario)
+        self.movimentar(self.porca, ENTRADA, 2)
+
+        incremental = self.resumo()
+        lotes = list(resumo_diario.reconstruir(self.dia(15), self.hoje, dias_por_lote=7))
+        self.assertEqual([(primeiro, ultimo) for primeiro, ultimo, _ in lotes][-1], (self.dia(1), self.hoje))
+        self.assertEqual(self.resumo(), incremental)
+
+    def test_consultas_de_periodo(self):
+        totais = resumo_diario.totais(self.dia(10), self.hoje, item=self.parafuso)
+        self.assertEqual(totais[ENTRADA], {"quantidade": 16, "valor": Decimal("50.00"), "movimentacoes": 2})
+        self.assertEqual(totais[SAIDA], {"quantidade": 6, "valor": Decimal("15.00"), "movimentacoes": 2})
+        self.assertEqual(totais[AJUSTE]["movimentacoes"], 0)
+
+        variacoes = resumo_diario.variacoes_por_dia(self.dia(10), self.hoje, estoque=self.estoque)
+        self.assertEqual(variacoes, {self.dia(10): 10, self.dia(5): -4, self.dia(2): 6, self.hoje: -2})
+
+        serie = resumo_diario.serie(self.dia(3), self.dia(1), item=self.parafuso)
+        self.assertEqual([dia["data"] for dia in serie], [self.dia(3), self.dia(2), self.dia(1)])
+        self.assertEqual(serie[1][ENTRADA], {"quantidade": 6, "valor": Decimal("30.00")})
+        self.assertEqual(serie[0][ENTRADA], {"quantidade": 0, "valor": Decimal("0.00")})
+
+class RecalculoCustosTests(HistoricoBaseTests):
+    def custos(self):
+        return {
+            "movimentacoes": list(
+                self.parafuso.movimentacoes.order_by("data_movimentacao").values_list("custo_unitario", flat=True)
+            ),
+            "custo_medio": ItemEstoque.objects.get(item=self.parafuso, estoque=self.estoque).custo_medio,
+            "valor_estoque": Item.objects.get(pk=self.parafuso.pk).valor_estoque,
+            "resumo": sorted(MovimentacaoDiaria.objects.filter(item=self.parafuso).values_list("data", "valor")),
+            "fechamentos": sorted(SaldoFechamento.objects.values_list("data", "valor")),
+        }
+
+    def test_refaz_os_custos_a_partir_das_movimentacoes(self):
+        gravar_fechamento(self.dia(7))
+        gravar_fechamento(self.dia(3))
+        corretos = self.custos()
+        self.assertEqual(corretos["movimentacoes"], [Decimal("2"), Decimal("2"), Decimal("5"), Decimal("3.5")])
+        self.assertEqual(corretos["fechamentos"], [(self.dia(7), Decimal("20.00")), (self.dia(3), Decimal("12.00"))])
+
+        # Custos corrompidos: as entradas mantêm o preço gravado, o resto é refeito
+        Movimentacao.objects.filter(tipo_movimentacao=SAIDA).update(custo_unitario=0)
+        ItemEstoque.objects.update(custo_medio=99)
+        MovimentacaoDiaria.objects.update(valor=0)
+        SaldoFechamento.objects.update(valor=0)
+        Item.objects.update(valor_estoque=0)
+
+        lotes = list(custos.recalcular(itens_por_lote=1))
+        self.assertEqual(lotes, [(1, 4, 2), (1, 0, 0)])
+        self.assertEqual(self.custos(), corretos)
+
+    def test_comando_recalcular_custos(self):
+        Movimentacao.objects.filter(tipo_movimentacao=SAIDA).update(custo_unitario=0)
+        saida = StringIO()
+        call_command("recalcular_custos", itens_por_lote=1, stdout=saida)
+        self.assertIn("2 de 4 movimentações alteradas", saida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("recalcular_custos", itens_por_lote=0, stdout=StringIO())
+
+class SerieSaldoTests(HistoricoBaseTests):
+    def setUp(self):
+        super().setUp()
+        limpar_caches()
+        self.client.force_login(self.usuario)
+
+    def serie(self, **parametros):
+        return self.client.get(reverse("api_item_serie_saldo", args=[self.parafuso.pk]), parametros).json()
+
+    def test_reduzir_preserva_picos_e_termina_hoje(self):
+        dias = [self.dia(dias_atras) for dias_atras in range(4, -1, -1)]
+        reduzida = serie_saldo.reduzir(list(zip(dias, [1, 5, 2, 0, 3])), 2)
+        self.assertEqual(reduzida["dias_por_ponto"], 3)
+        self.assertEqual(
+            reduzida["pontos"],
+            [
+                {"data": dias[1].isoformat(), "saldo": 5, "minimo": 1, "maximo": 5},
+                {"data": dias[4].isoformat(), "saldo": 3, "minimo": 0, "maximo": 3},
+            ],
+        )
+
+    def test_serie_diaria_em_cache_ate_o_item_ser_movimentado(self):
+        pontos = self.serie(dias=11, pontos=11)["pontos"]
+        saldos = [ponto["saldo"] for ponto in pontos]
+        self.assertEqual(saldos, [10] * 5 + [6] * 3 + [12] * 2 + [10])
+        self.assertEqual(pontos[-1]["data"], self.hoje.isoformat())
+
+        with self.assertNumQueries(0):
+            serie_saldo.serie(self.parafuso.pk, dias=11, pontos=11)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movimentar(self.parafuso, ENTRADA, 3)
+        self.assertEqual(self.serie(dias=11, pontos=11)["pontos"][-1]["saldo"], 13)
+
+    def test_parametros_invalidos(self):
+        url = reverse("api_item_serie_saldo", args=[self.parafuso.pk])
+        self.assertEqual(self.client.get(url, {"dias": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"pontos": serie_saldo.MAXIMO_PONTOS + 1}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_item_serie_saldo", args=[0])).status_code, 404)
+
+    def test_detalhe_com_historico_paginado(self):
+        # Só o histórico interessa aqui: linhas gravadas direto, sem passar pelos saldos
+        Movimentacao.objects.bulk_create(
+            Movimentacao(
+                item=self.parafuso, estoque=self.estoque, usuario=self.usuario, tipo_movimentacao=ENTRADA, quantidade=1
+            )
+            for _ in range(TAMANHO_PAGINA)
+        )
+        url = reverse("item_detail", args=[self.parafuso.pk])
+        primeira = self.client.get(url).context["pagina"]
+        self.assertEqual(len(primeira), TAMANHO_PAGINA)
+        segunda = self.client.get(url, {"apos": primeira.proxima}).context["pagina"]
+        self.assertEqual(len(segunda), 4)
+        self.assertIsNone(segunda.proxima)
+
+        resposta = self.client.get(url, {"estoque": registro.estoque_padrao().pk})
+        self.assertEqual(len(resposta.context["pagina"]), 0)
+        self.assertEqual([saldo["qtde"] for saldo in resposta.context["saldos"]], [10])
+
+class ReposicaoTests(MovimentacaoBaseTests):
+    PARAMETROS = {"janela": 10, "prazo": 5, "cobertura": 10}
+
+    def setUp(self):
+        limpar_caches()
+        self.hoje = timezone.localdate()
+        self.fornecedor = Fornecedor.objects.create(nome="Parafusos SA")
+        Item.objects.filter(pk=self.parafuso.pk).update(qtde_total=6, fornecedor=self.fornecedor)
+        Item.objects.filter(pk=self.porca.pk).update(qtde_total=1, estoque_minimo=5, estoque_maximo=8)
+        inativo = Item.objects.create(
+            codigo="P-3", descricao="Bucha", unidade_medida="un", valor_unitario=Decimal("1"), ativo=False
+        )
+        # Parafuso: 2 por dia em toda a janela; as saídas de hoje e as de itens inativos ficam de fora
+        saidas = [(self.parafuso, dias_atras, 2) for dias_atras in range(1, 11)]
+        saidas += [(self.parafuso, 0, 500), (inativo, 1, 50)]
+        MovimentacaoDiaria.objects.bulk_create(
+            MovimentacaoDiaria(
+                data=self.hoje - timedelta(days=dias_atras),
+                item=item,
+                estoque=self.estoque,
+                tipo_movimentacao=SAIDA,
+                quantidade=quantidade,
+                movimentacoes=1,
+            )
+            for item, dias_atras, quantidade in saidas
+        )
+
+    def test_sugestoes_por_fornecedor(self):
+        resultado = reposicao.calcular(fator=0, hoje=self.hoje, **self.PARAMETROS)
+        periodo = (resultado["inicio"], resultado["fim"])
+        self.assertEqual(periodo, (self.hoje - timedelta(days=10), self.hoje - timedelta(days=1)))
+        self.assertEqual((resultado["total_sugestoes"], resultado["valor_total"]), (2, 55.0))
+        grupos = {grupo["fornecedor"]: grupo["itens"] for grupo in resultado["fornecedores"]}
+        parafuso, = grupos["Parafusos SA"]
+        # Consumo de 2 por dia: ponto de pedido 10, alvo de 10 + 2 x 10 dias de cobertura
+        self.assertEqual(
+            {chave: parafuso[chave] for chave in ("consumo_diario", "dias_cobertura", "ponto_pedido", "quantidade")},
+            {"consumo_diario": 2.0, "dias_cobertura": 3.0, "ponto_pedido": 10, "quantidade": 24},
+        )
+        porca, = grupos["Sem fornecedor"]
+        # Sem consumo, mas abaixo do mínimo: repõe até o máximo
+        self.assertEqual((porca["ponto_pedido"], porca["quantidade"], porca["dias_cobertura"]), (5, 7, None))
+
+    def test_relatorio_fica_em_cache(self):
+        primeiro = reposicao.relatorio(**self.PARAMETROS)
+        Item.objects.filter(pk=self.porca.pk).update(qtde_total=100)
+        self.assertEqual(reposicao.relatorio(**self.PARAMETROS), primeiro)
+        self.assertEqual(reposicao.relatorio(recalcular=True, **self.PARAMETROS)["total_sugestoes"], 1)
+
+    def test_relatorio_na_tela(self):
+        self.client.force_login(self.usuario)
+        url = reverse("relatorio_reposicao")
+        resposta = self.client.get(url, {**self.PARAMETROS, "fornecedor": self.fornecedor.pk})
+        self.assertEqual([grupo["fornecedor"] for grupo in resposta.context["grupos"]], ["Parafusos SA"])
+        resposta = self.client.get(url, {**self.PARAMETROS, "janela": 3})
+        self.assertNotIn("resultado", resposta.context)
+        self.assertEqual(self.ultima_mensagem(resposta), "Parâmetros inválidos; verifique os limites de cada campo.")
+
+class ClassificacaoTests(MovimentacaoBaseTests):
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        self.bucha = Item.objects.create(codigo="P-3", descricao="Bucha", unidade_medida="un", valor_unitario=1)
+        self.arruela = Item.objects.create(codigo="P-4", descricao="Arruela", unidade_medida="un", valor_unitario=1)
+        # Três semanas completas antes de hoje, uma quantidade de saída por semana
+        saidas = {self.parafuso: [10, 20, 10], self.porca: [10, 5, 0], self.bucha: [5, 0, 0]}
+        linhas = [
+            MovimentacaoDiaria(
+                data=self.hoje - timedelta(days=21 - 7 * semana),
+                item=item,
+                estoque=self.estoque,
+                tipo_movimentacao=SAIDA,
+                quantidade=quantidade,
+            )
+            for item, semanas in saidas.items()
+            for semana, quantidade in enumerate(semanas)
+            if quantidade
+        ]
+        # As saídas de hoje ainda não entram
+        linhas.append(
+            MovimentacaoDiaria(
+                data=self.hoje, item=self.bucha, estoque=self.estoque, tipo_movimentacao=SAIDA, quantidade=900
+            )
+        )
+        MovimentacaoDiaria.objects.bulk_create(linhas)
+
+    def classes(self):
+        return dict(ClassificacaoItem.objects.values_list("item__codigo", "classe_abc"))
+
+    def test_classes_abc_e_xyz(self):
+        # Valor consumido: 80, 15 e 5; variação semanal baixa, média e alta
+        resumo = classificacao.classificar(janela=21, hoje=self.hoje)
+        self.assertEqual(resumo, {"AX": 1, "BY": 1, "CZ": 2})
+        linhas = {linha.item_id: linha for linha in ClassificacaoItem.objects.all()}
+        self.assertEqual(linhas[self.parafuso.pk].valor_consumo, Decimal("80.00"))
+        self.assertEqual(linhas[self.porca.pk].coeficiente_variacao, 0.8165)
+        self.assertIsNone(linhas[self.arruela.pk].coeficiente_variacao)
+
+        # Recalcular substitui a classificação anterior
+        classificacao.classificar(janela=7, hoje=self.hoje)
+        self.assertEqual(self.classes(), {"P-1": "A", "P-2": "C", "P-3": "C", "P-4": "C"})
+
+    def test_inventario_dos_itens_classe_a(self):
+        self.client.force_login(self.usuario)
+        url = reverse("inventario_create_classe_a")
+        resposta = self.client.post(url)
+        self.assertIn("Classificação ABC/XYZ não calculada", self.ultima_mensagem(resposta))
+
+        classificacao.classificar(janela=21, hoje=self.hoje)
+        resposta = self.client.post(url)
+        inventario = Inventario.objects.get()
+        destino = reverse("inventario_detail", args=[inventario.pk])
+        self.assertRedirects(resposta, destino, fetch_redirect_response=False)
+        self.assertEqual(list(inventario.itens.values_list("item__codigo", "qtde_contada")), [("P-1", None)])
+
+        # Itens inativos ficam de fora
+        Item.objects.filter(pk=self.parafuso.pk).update(ativo=False)
+        _, linhas = criar_inventario_por_classe(usuario=self.usuario)
+        self.assertEqual(linhas, 0)
+        _, linhas = criar_inventario_por_classe(usuario=self.usuario, classe_abc=ClassificacaoItem.ABC.B)
+        self.assertEqual(linhas, 1)
+
+class IndicadoresCacheTests(MovimentacaoBaseTests):
+    def setUp(self):
+        limpar_caches()
+
+    def test_segunda_leitura_vem_do_cache(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        primeira = kpis.indicadores()
+        with self.assertNumQueries(0):
+            self.assertEqual(kpis.indicadores(), primeira)
+
+    def test_movimentacao_invalida_o_estoque_e_o_consolidado_apos_o_commit(self):
+        self.assertEqual(kpis.indicadores(self.estoque.pk)["total_itens"], 0)
+        self.assertEqual(kpis.indicadores()["valor_total"], Decimal("0.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movimentar(self.parafuso, ENTRADA, 10)
+        self.assertEqual(kpis.indicadores(self.estoque.pk)["total_itens"], 1)
+        self.assertEqual(kpis.indicadores()["valor_total"], Decimal("20.00"))
+
+    def test_alteracao_do_item_descarta_todos_os_escopos(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        self.assertEqual(kpis.indicadores(self.estoque.pk)["criticos"], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Estoque.objects.filter(pk=self.estoque.pk).update(nivel_minimo=50)
+            self.parafuso.descricao = "Parafuso sextavado"
+            self.parafuso.save()
+        criticos = kpis.indicadores(self.estoque.pk)["criticos"]
+        self.assertEqual([vinculo.item.descricao for vinculo in criticos], ["Parafuso sextavado"])
+
+
+class CacheLRUTests(SimpleTestCase):
+    def test_descarta_a_entrada_usada_ha_mais_tempo(self):
+        cache = saldo_cache.CacheLRU(maximo=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_entrada_expirada_nao_e_devolvida(self):
+        cache = saldo_cache.CacheLRU(maximo=2, ttl=-1)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+class SaldoApiTests(MovimentacaoBaseTests):
+    def setUp(self):
+        limpar_caches()
+        self.client.force_login(self.usuario)
+        self.movimentar(self.parafuso, ENTRADA, 10)
+
+    def consultar(self, **cabecalhos):
+        return self.client.get(
+            reverse("api_item_saldo"), {"item": self.parafuso.pk, "estoque": self.estoque.pk}, headers=cabecalhos
+        )
+
+    def test_etag_responde_304_ate_o_saldo_mudar(self):
+        resposta = self.consultar()
+        self.assertEqual(resposta.json()["saldo"], 10)
+        etag = resposta["ETag"]
+        self.assertEqual(self.consultar(if_none_match=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movimentar(self.parafuso, SAIDA, 4)
+        resposta = self.consultar(if_none_match=etag)
+        self.assertEqual((resposta.status_code, resposta.json()["saldo"]), (200, 6))
+
+    def test_saldos_repetidos_vem_do_cache(self):
+        par = (self.parafuso.pk, self.estoque.pk)
+        saldo_cache.saldos([par])
+        with self.assertNumQueries(0):
+            self.assertEqual(saldo_cache.saldos([par])[par]["saldo"], 10)
+
+    def test_varios_pares_em_uma_requisicao(self):
+        pares = f"{self.parafuso.pk}:{self.estoque.pk},{self.porca.pk}:{self.estoque.pk},999:{self.estoque.pk}"
+        saldos = self.client.get(reverse("api_item_saldos"), {"pares": pares}).json()["saldos"]
+        self.assertEqual([saldo.get("saldo", saldo.get("error")) for saldo in saldos], [10, 0, "Item não encontrado"])
+        pares = ",".join(f"{numero}:{self.estoque.pk}" for numero in range(LIMITE_PARES_SALDO + 1))
+        self.assertEqual(self.client.get(reverse("api_item_saldos"), {"pares": pares}).status_code, 400)
+
+
+class EstoquePadraoTests(MovimentacaoBaseTests):
+    def setUp(self):
+        limpar_caches()
+
+    def test_resolvido_uma_vez_e_descartado_ao_alterar_um_estoque(self):
+        central = registro.estoque_padrao()
+        self.assertEqual(central.localizacao, registro.LOCALIZACAO_PADRAO)
+        with self.assertNumQueries(0):
+            self.assertEqual(registro.estoque_padrao(), central)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            central.localizacao = "Depósito Norte"
+            central.save()
+        # Sem o Depósito Central, vale o primeiro estoque na ordem de localização
+        self.assertEqual(registro.estoque_padrao(), Estoque.objects.order_by("localizacao").first())
+
+    def test_formulario_renderiza_so_o_item_selecionado(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse("movimentacao_create"))
+        self.assertNotContains(resposta, "P-2 - Porca")
+        self.assertEqual(list(resposta.context["form"].fields["estoque"].queryset), [registro.estoque_padrao()])
+
+        formulario = MovimentacaoForm(initial={"item": self.porca.pk})
+        self.assertIn("P-2 - Porca", str(formulario["item"]))
+        self.assertNotIn("P-1 - Parafuso", str(formulario["item"]))
+
+
+class ContagensInventarioTests(MovimentacaoBaseTests):
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.inventario = Inventario.objects.create(usuario=self.usuario)
+
+    def contadas(self):
+        return dict(self.inventario.itens.values_list("item__codigo", "qtde_contada"))
+
+    def enviar(self, leituras):
+        return self.client.post(
+            reverse("api_inventario_contagens", args=[self.inventario.pk]),
+            json.dumps({"contagens": leituras}),
+            content_type="application/json",
+        )
+
+    def test_coletor_grava_as_leituras_e_devolve_os_codigos_desconhecidos(self):
+        leituras = [{"codigo": "P-1", "qtde": 4}, {"codigo": "X-9", "qtde": 1}, {"codigo": "P-1", "qtde": 6}]
+        resposta = self.enviar(leituras)
+        self.assertEqual(resposta.json(), {"registradas": 1, "nao_encontrados": ["X-9"]})
+        self.assertEqual(self.contadas(), {"P-1": 6})
+
+        resposta = self.enviar([{"codigo": "P-2", "qtde": -1}])
+        self.assertEqual(resposta.status_code, 400)
+
+        encerrar_inventario(inventario=self.inventario, estoque=self.estoque, usuario=self.usuario)
+        self.assertEqual(self.enviar([{"codigo": "P-2", "qtde": 1}]).status_code, 409)
+        self.assertEqual(self.contadas(), {"P-1": 6})
+
+    def test_importacao_de_csv(self):
+        url = reverse("inventario_importar", args=[self.inventario.pk])
+        arquivo = SimpleUploadedFile("contagem.csv", "codigo;quantidade\nP-1;4\nP-2;2\nX-9;1\n".encode())
+        resposta = self.client.post(url, {"arquivo": arquivo})
+        mensagens = [str(mensagem) for mensagem in get_messages(resposta.wsgi_request)]
+        self.assertEqual(mensagens, ["2 contagens importadas.", "1 códigos não encontrados: X-9."])
+        self.assertEqual(self.contadas(), {"P-1": 4, "P-2": 2})
+
+        arquivo = SimpleUploadedFile("contagem.csv", "P-1;9\nP-2;dois\n".encode())
+        self.client.post(url, {"arquivo": arquivo})
+        self.assertEqual(self.contadas(), {"P-1": 4, "P-2": 2})
+
+
+class InventarioDetalheTests(MovimentacaoBaseTests):
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.inventario = Inventario.objects.create(usuario=self.usuario)
+        self.url = reverse("inventario_detail", args=[self.inventario.pk])
+
+    def test_linhas_paginadas(self):
+        itens = Item.objects.bulk_create(
+            Item(codigo=f"L-{n:03d}", descricao=f"Lote {n}", unidade_medida="un", valor_unitario=1) for n in range(55)
+        )
+        indexar_itens(itens)
+        InventarioItem.objects.bulk_create(
+            InventarioItem(inventario=self.inventario, item=item, qtde_contada=1) for item in itens
+        )
+        primeira = self.client.get(self.url)
+        self.assertEqual(len(primeira.context["itens"]), 50)
+        self.assertEqual(primeira.context["resumo"]["linhas"], 55)
+        segunda = self.client.get(self.url, {"pagina": 2})
+        self.assertEqual(len(segunda.context["itens"]), 5)
+        self.assertEqual(len(self.client.get(self.url, {"q": "L-007"}).context["itens"]), 1)
+
+    def test_resumo_e_filtro_de_divergentes(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        bucha = Item.objects.create(codigo="P-3", descricao="Bucha", unidade_medida="un", valor_unitario=1)
+        InventarioItem.objects.create(inventario=self.inventario, item=self.parafuso, qtde_contada=7)
+        InventarioItem.objects.create(inventario=self.inventario, item=self.porca, qtde_contada=3)
+        InventarioItem.objects.create(inventario=self.inventario, item=bucha)
+
+        resposta = self.client.get(
+            reverse("api_inventario_resumo", args=[self.inventario.pk]), {"estoque": self.estoque.pk}
+        )
+        self.assertEqual(
+            resposta.json(),
+            {"linhas": 3, "pendentes": 1, "total_contado": 10, "divergentes": 2, "sobras": 3, "faltas": -3},
+        )
+        resposta = self.client.get(self.url, {"estoque": self.estoque.pk, "divergentes": "1"})
+        divergencias = {linha.item.codigo: linha.divergencia for linha in resposta.context["itens"]}
+        self.assertEqual(divergencias, {"P-1": -3, "P-2": 3})
+
+    def test_contagem_rapida_valida_a_quantidade(self):
+        resposta = self.client.post(self.url, {"codigo_lookup": "P-1", "qtde_lookup": "-2"})
+        self.assertEqual(self.ultima_mensagem(resposta), "Informe uma quantidade inteira não negativa.")
+        self.assertFalse(self.inventario.itens.exists())
+
+        resposta = self.client.post(self.url, {"codigo_lookup": "X-9", "qtde_lookup": "1"})
+        self.assertEqual(self.ultima_mensagem(resposta), "Item não encontrado para o código informado.")
+
+        resposta = self.client.post(self.url, {"codigo_lookup": "P-1", "qtde_lookup": "4"})
+        self.assertEqual(self.ultima_mensagem(resposta), "Contagem registrada para o código P-1.")
+        self.assertEqual(self.inventario.itens.get().qtde_contada, 4)
+
+
+class ImportacaoCatalogoTests(MovimentacaoBaseTests):
+    CABECALHO = ["Código", "Descrição", "Unidade", "Preço", "Fornecedor", "Mínimo", "Máximo"]
+
+    def test_insere_e_atualiza_pelo_codigo(self):
+        self.movimentar(self.parafuso, ENTRADA, 10)
+        Item.objects.filter(pk=self.parafuso.pk).update(estoque_minimo=5)
+        acos = Fornecedor.objects.create(nome="Aços Ltda")
+        resultado = importar_catalogo([
+            self.CABECALHO,
+            ["P-1", "Parafuso sextavado", "un", "1.234,50", "", "", ""],
+            ["N-1", "Arruela lisa", "un", "0,30", "ACOS LTDA", "", "50"],
+            ["N-2", "Rebite", "cx", "12", "Rebites SA", "2", ""],
+            ["", "", "", "", "", "", ""],
+        ])
+        self.assertEqual((resultado.linhas, resultado.criados, resultado.atualizados), (3, 2, 1))
+        self.assertEqual(resultado.fornecedores_criados, 1)
+
+        parafuso = Item.objects.get(pk=self.parafuso.pk)
+        self.assertEqual(parafuso.descricao, "Parafuso sextavado")
+        self.assertEqual(parafuso.valor_unitario, Decimal("1234.50"))
+        # Células vazias mantêm o valor gravado e os totais materializados não são tocados
+        self.assertEqual((parafuso.estoque_minimo, parafuso.qtde_total), (5, 10))
+        self.assertEqual(Item.objects.get(codigo="N-1").fornecedor, acos)
+        self.assertEqual(Item.objects.get(codigo="N-2").fornecedor.nome, "Rebites SA")
+        self.assertEqual([item.codigo for item in buscar_itens("arruela")], ["N-1"])
+
+    def test_linhas_invalidas_sao_relatadas_sem_interromper(self):
+        lotes = []
+        resultado = importar_catalogo(
+            [
+                self.CABECALHO,
+                ["N-1", "Arruela", "un", "abc", "", "", ""],
+                ["", "Sem código", "un", "1", "", "", ""],
+                ["N-2", "Rebite", "un", "1", "", "9", "3"],
+                ["N-3", "Bucha", "un", "1", "", "", ""],
+            ],
+            tamanho_lote=1,
+            ao_gravar_lote=lambda parcial: lotes.append(parcial.criados),
+        )
+        self.assertEqual(resultado.criados, 1)
+        self.assertEqual(
+            resultado.erros,
+            [
+                "Linha 2: valor_unitario: informe um valor numérico",
+                "Linha 3: codigo: informe o código",
+                "Linha 4: Estoque máximo não pode ser menor que o mínimo.",
+            ],
+        )
+        self.assertEqual(lotes, [0, 1])
+        self.assertFalse(Item.objects.filter(codigo__in=["N-1", "N-2"]).exists())
+
+    def test_cabecalho_sem_colunas_obrigatorias(self):
+        with self.assertRaisesMessage(ValidationError, "valor_unitario"):
+            importar_catalogo([["codigo", "descricao", "unidade"], ["N-1", "Arruela", "un"]])
+
+    def test_tela_de_importacao(self):
+        self.client.force_login(self.usuario)
+        arquivo = SimpleUploadedFile("catalogo.csv", "codigo;descricao;unidade;valor\nN-1;Arruela;un;0,30\n".encode())
+        resposta = self.client.post(reverse("item_importar"), {"arquivo": arquivo})
+        self.assertTrue(self.ultima_mensagem(resposta).startswith("1 itens criados e 0 atualizados"))
+        self.assertEqual(Item.objects.get(codigo="N-1").valor_unitario, Decimal("0.30"))
+
+        arquivo = SimpleUploadedFile("catalogo.csv", "codigo;descricao\nN-2;Rebite\n".encode())
+        resposta = self.client.post(reverse("item_importar"), {"arquivo": arquivo})
+        self.assertIn("Colunas obrigatórias ausentes", self.ultima_mensagem(resposta))
+
+
+class MetricasTests(MovimentacaoBaseTests):
+    def setUp(self):
+        metricas.registro.limpar()
+
+    def test_histograma_cumulativo(self):
+        histograma = metricas.Histograma((1, 5))
+        for valor in (0.5, 1, 3, 9):
+            histograma.observar(valor)
+        self.assertEqual(list(histograma.acumulados()), [(1, 2), (5, 3), ("+Inf", 4)])
+        self.assertEqual(histograma.soma, 13.5)
+
+    def test_requisicoes_por_view_metodo_e_status(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse("item_list"))
+        self.client.generic("BREW", reverse("item_list"))
+        self.client.get("/nao-existe/")
+        texto = metricas.registro.texto_prometheus()
+        self.assertIn('almox_http_request_duration_seconds_count{view="item_list",method="GET",status="2xx"} 1', texto)
+        self.assertIn('view="item_list",method="other"', texto)
+        self.assertNotIn("BREW", texto)
+        # O caminho nunca vira rótulo
+        self.assertIn('view="nao_resolvida",method="GET",status="4xx"', texto)
+        self.assertNotIn("nao-existe", texto)
+
+    def test_aviso_acima_do_orcamento_de_consultas(self):
+        def view(request):
+            for _ in range(3):
+                Item.objects.count()
+            return HttpResponse()
+
+        with self.settings(METRICAS_ORCAMENTO_CONSULTAS=2):
+            middleware = metricas.MetricasMiddleware(view)
+        with self.assertLogs("almoxarifado.metricas", "WARNING") as logs:
+            middleware(RequestFactory().get("/"))
+        self.assertIn("fez 3 consultas (orçamento 2)", logs.output[0])
+        self.assertIn("almox_requests_over_query_budget_total{", metricas.registro.texto_prometheus())
+
+    def test_acesso_restrito_a_equipe_ou_token(self):
+        url = reverse("metricas")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.logout()
+        with self.settings(METRICAS_TOKEN="segredo"):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer errado").status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer segredo").status_code, 200)
+        equipe = Usuario.objects.create_user(username="equipe", email="equipe@example.com", password="x", is_staff=True)
+        self.client.force_login(equipe)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SqlitePragmasTests(SimpleTestCase):
+    PRAGMAS = {"journal_mode": "wal", "synchronous": "normal", "busy_timeout": 2500}
+
+    def conexao(self, nome):
+        bruta = sqlite3.connect(nome)
+        self.addCleanup(bruta.close)
+        return mock.Mock(
+            vendor="sqlite", connection=bruta, is_in_memory_db=mock.Mock(return_value=nome == ":memory:")
+        )
+
+    def test_valores_fora_do_formato_sao_recusados(self):
+        with self.settings(SQLITE_PRAGMAS={"synchronous": "normal; DROP TABLE estoque_item"}):
+            with self.assertRaises(ImproperlyConfigured):
+                sqlite.pragmas()
+        with self.settings(SQLITE_PRAGMAS={"cache size": -2000}):
+            with self.assertRaises(ImproperlyConfigured):
+                sqlite.pragmas()
+
+    def test_aplica_os_pragmas_em_cada_conexao(self):
+        with tempfile.TemporaryDirectory() as pasta, self.settings(SQLITE_PRAGMAS=self.PRAGMAS):
+            conexao = self.conexao(os.path.join(pasta, "db.sqlite3"))
+            sqlite.aplicar_pragmas(sender=None, connection=conexao)
+            self.assertEqual(sqlite.estado(conexao), {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 2500})
+
+            # Em memória o journal_mode fica de fora
+            conexao = self.conexao(":memory:")
+            sqlite.aplicar_pragmas(sender=None, connection=conexao)
+            self.assertEqual(sqlite.estado(conexao), {"journal_mode": "memory", "synchronous": 1, "busy_timeout": 2500})
+
+
+class RoteadorReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.roteador = roteador.RoteadorReplica()
+        self.leituras = []
+
+    def requisicao(self, view, metodo="get", **cookies):
+        requisicao = getattr(RequestFactory(), metodo)("/")
+        requisicao.COOKIES.update(cookies)
+        with mock.patch("almoxarifado.roteador.replica_configurada", return_value=True):
+            middleware = roteador.ReplicaMiddleware(
+                lambda request: middleware.process_view(request, view, (), {}) or view(request)
+            )
+        return middleware(requisicao)
+
+    def ler(self):
+        self.leituras.append(self.roteador.db_for_read(Item))
+
+    def test_so_views_de_leitura_em_get_leem_da_replica(self):
+        @roteador.somente_leitura
+        def listagem(request):
+            self.ler()
+            with roteador.primario():
+                self.ler()
+            return HttpResponse()
+
+        def formulario(request):
+            self.ler()
+            return HttpResponse()
+
+        self.requisicao(listagem)
+        self.requisicao(listagem, "post")
+        self.requisicao(formulario)
+        self.assertEqual(self.leituras, ["replica", None, None, None, None])
+        # Fora de uma requisição nada muda
+        self.ler()
+        self.assertIsNone(self.leituras[-1])
+
+    def test_quem_grava_passa_a_ler_do_principal(self):
+        @roteador.somente_leitura
+        def listagem(request):
+            self.ler()
+            self.roteador.db_for_write(Item)
+            self.ler()
+            return HttpResponse()
+
+        resposta = self.requisicao(listagem)
+        self.assertEqual(self.leituras, ["replica", None])
+        cookie = resposta.cookies[roteador.COOKIE_PRIMARIO]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_ATRASO_MAXIMO)
+
+        # Com o cookie, as próximas requisições também leem do principal
+        self.requisicao(lambda request: self.ler() or HttpResponse(), **{roteador.COOKIE_PRIMARIO: "1"})
+        self.assertEqual(self.leituras[-1], None)
+
+    def test_dentro_de_transacao_le_do_principal(self):
+        @roteador.somente_leitura
+        def listagem(request):
+            with mock.patch.object(connections[DEFAULT_DB_ALIAS], "in_atomic_block", True):
+                self.ler()
+            return HttpResponse()
+
+        self.requisicao(listagem)
+        self.assertEqual(self.leituras, [None])
+        self.assertFalse(self.roteador.allow_migrate(roteador.REPLICA, "estoque"))
+        self.assertTrue(self.roteador.allow_migrate(DEFAULT_DB_ALIAS, "estoque"))
@@ -6,13 +6,20 @@ urlpatterns = [
     path("", views.dashboard, name="dashboard"),
     path("itens/", views.item_list, name="item_list"),
     path("itens/novo/", views.item_create, name="item_create"),
+    path("itens/importar/", views.item_importar, name="item_importar"),
+    path("itens/<int:pk>/", views.item_detail, name="item_detail"),
     path("itens/<int:pk>/editar/", views.item_edit, name="item_edit"),
     path("movimentacoes/", views.movimentacao_list, name="movimentacao_list"),
+    path("movimentacoes/exportar/", views.movimentacao_exportar, name="movimentacao_exportar"),
     path("movimentacoes/nova/", views.movimentacao_create, name="movimentacao_create"),
     path("inventarios/", views.inventario_list, name="inventario_list"),
     path("inventarios/novo/", views.inventario_create, name="inventario_create"),
+    path("inventarios/novo-classe-a/", views.inventario_create_classe_a, name="inventario_create_classe_a"),
     path("inventarios/<int:pk>/", views.inventario_detail, name="inventario_detail"),
     path("inventarios/<int:pk>/encerrar/", views.inventario_encerrar, name="inventario_encerrar"),
+    path("inventarios/<int:pk>/importar/", views.inventario_importar, name="inventario_importar"),
+    path("relatorios/cmv/", views.relatorio_cmv, name="relatorio_cmv"),
+    path("relatorios/reposicao/", views.relatorio_reposicao, name="relatorio_reposicao"),
     path("fornecedores/", views.fornecedor_list, name="fornecedor_list"),
     path("fornecedores/novo/", views.fornecedor_create, name="fornecedor_create"),
     path("fornecedores/<int:pk>/editar/", views.fornecedor_edit, name="fornecedor_edit"),
@@ -20,5 +27,11 @@ urlpatterns = [
     # APIs
     path("api/item-search/", views.api_item_search, name="api_item_search"),
     path("api/item-saldo/", views.api_item_saldo, name="api_item_saldo"),
+    path("api/item-saldos/", views.api_item_saldos, name="api_item_saldos"),
+    path("api/itens/<int:pk>/serie-saldo/", views.api_item_serie_saldo, name="api_item_serie_saldo"),
+    path("api/movimentacoes/lote/", views.api_movimentacoes_lote, name="api_movimentacoes_lote"),
+    path("api/inventarios/<int:pk>/contagens/", views.api_inventario_contagens, name="api_inventario_contagens"),
+    path("api/inventarios/<int:pk>/resumo/", views.api_inventario_resumo, name="api_inventario_resumo"),
+    path("api/kpis/estatisticas/", views.api_kpis_estatisticas, name="api_kpis_estatisticas"),
     path("api/fornecedor/", views.api_fornecedor_create, name="api_fornecedor_create"),
 ]
@@ -0,0 +1,38 @@
+"""Leitura de consultas direto para arrays do NumPy, usada pelos cálculos em lote (reposição, classificação)."""
+import numpy as np
+from django.db import connections, router
+
+LINHAS_POR_LEITURA = 50_000
+
+
+def carregar(consulta, tipos):
+    """
+    Executa ``consulta`` (um values_list) no cursor, sem criar objetos do
+    Django, e devolve um array por coluna com os dtypes de ``tipos``.
+
+    As linhas são lidas em blocos de LINHAS_POR_LEITURA.
+    """
+    conexao = connections[router.db_for_read(consulta.model)]
+    sql, params = consulta.query.sql_with_params()
+    blocos = [[] for _ in tipos]
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            linhas = cursor.fetchmany(LINHAS_POR_LEITURA)
+            if not linhas:
+                break
+            for bloco, coluna, tipo in zip(blocos, zip(*linhas), tipos):
+                bloco.append(np.array(coluna, dtype=tipo))
+    return tuple(np.concatenate(bloco) if bloco else np.empty(0, dtype=tipo) for bloco, tipo in zip(blocos, tipos))
+
+
+def posicoes(ids, valores):
+    """
+    Posição de cada valor de ``valores`` no array ordenado ``ids`` e a máscara
+    dos que foram encontrados (os demais devem ser descartados pelo chamador).
+    """
+    posicao = np.searchsorted(ids, valores)
+    if not len(ids):
+        return posicao, np.zeros(len(valores), dtype=bool)
+    encontrados = ids[np.minimum(posicao, len(ids) - 1)] == valores
+    return posicao, encontrados
@@ -1,77 +1,194 @@
-from decimal import Decimal
+import hashlib
+import json
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
+from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import DecimalField, F, Sum, ExpressionWrapper
-from django.db.models.functions import Coalesce
-from django.http import JsonResponse
+from django.db import models, router
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from .forms import FornecedorForm, InventarioForm, InventarioItemForm, ItemForm, MovimentacaoForm
-from .models import Estoque, Fornecedor, Inventario, InventarioItem, Item, ItemEstoque, Movimentacao
-from .services import registrar_movimentacao
-
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
+
+from almoxarifado.roteador import somente_leitura
+
+from . import kpis, reposicao, saldo_cache, serie_saldo
+from .forms import (
+    FornecedorForm,
+    InventarioForm,
+    InventarioItemForm,
+    ItemForm,
+    MovimentacaoFiltroForm,
+    MovimentacaoForm,
+    PeriodoForm,
+    ReposicaoForm,
+)
+from .models import ClassificacaoItem, Estoque, Fornecedor, Inventario, Item, ItemEstoque, Movimentacao
+from .busca import buscar, buscar_itens, relevancia, rotulo
+from .exportacao import CABECALHO_MOVIMENTACOES, csv_em_fluxo, linhas_movimentacoes
+from .importacao import importar_catalogo, ler_contagens_csv, ler_planilha
+from .paginacao import paginar_por_chave
+from .planilhas import PlanilhaInvalida, xlsx_em_fluxo
+from .registro import estoque_padrao
+from .relatorios import linhas_inventario, relatorio_cmv as calcular_relatorio_cmv, resumo_inventario
+from .services import (
+    criar_inventario_por_classe,
+    encerrar_inventario,
+    registrar_contagens,
+    registrar_movimentacao,
+    registrar_movimentacoes_em_lote,
+)
+
+LIMITE_PARES_SALDO = 200
+LIMITE_CONTAGENS_LOTE = 5000
+TAMANHO_PAGINA_INVENTARIO = 50
+LIMITE_ITENS_REPOSICAO = 20
 
 @login_required
+@somente_leitura
 def dashboard(request):
-    itens = Item.objects.annotate(total_qtde=Coalesce(Sum("estoques__qtde"), 0))
-    total_itens = itens.count()
-    valor_total = itens.annotate(
-        total_valor=ExpressionWrapper(
-            F("total_qtde") * F("valor_unitario"),
-            output_field=DecimalField(max_digits=14, decimal_places=2),
-        )
-    ).aggregate(total=Coalesce(Sum("total_valor"), Decimal("0.00"))).get("total")
-
-    criticos = (
-        ItemEstoque.objects.select_related("item", "estoque")
-        .filter(qtde__lt=F("estoque__nivel_minimo"))
-        .order_by("estoque__localizacao", "item__descricao")
-    )
-    ultimas_movimentacoes = (
-        Movimentacao.objects.select_related("item", "estoque", "usuario")
-        .order_by("-data_movimentacao")[:8]
-    )
+    estoques = Estoque.objects.order_by("localizacao")
+    estoque_id = request.GET.get("estoque")
+    estoque_selecionado = next((estoque for estoque in estoques if str(estoque.pk) == estoque_id), None)
 
-    return render(
-        request,
-        "estoque/dashboard.html",
-        {
-            "total_itens": total_itens,
-            "valor_total": valor_total,
-            "criticos": criticos,
-            "ultimas_movimentacoes": ultimas_movimentacoes,
-        },
-    )
+    # MELHORIA: indicadores vêm do cache e só são recalculados após movimentações/alterações
+    contexto = dict(kpis.indicadores(estoque_selecionado.pk if estoque_selecionado else None))
+    contexto.update({"estoques": estoques, "estoque_selecionado": estoque_selecionado})
+    return render(request, "estoque/dashboard.html", contexto)
 
 
 @login_required
+@somente_leitura
 def item_list(request):
     query = request.GET.get("q", "").strip()
     fornecedor_id = request.GET.get("fornecedor")
+    classe_abc = request.GET.get("classe_abc", "")
+    classe_xyz = request.GET.get("classe_xyz", "")
 
-    itens = Item.objects.annotate(total_qtde=Coalesce(Sum("estoques__qtde"), 0))
+    itens = Item.objects.select_related("fornecedor", "classificacao")
+    ordem = ["descricao"]
     if query:
-        itens = itens.filter(
-            models.Q(descricao__icontains=query)
-            | models.Q(codigo__icontains=query)
-            | models.Q(unidade_medida__icontains=query)
-        )
+        # MELHORIA: busca pelos termos indexados em vez de icontains sobre a tabela inteira
+        itens = itens.filter(_filtro_busca(query)).annotate(relevancia=relevancia(query))
+        ordem = ["relevancia", "descricao"]
     if fornecedor_id:
         itens = itens.filter(fornecedor_id=fornecedor_id)
+    if classe_abc in ClassificacaoItem.ABC.values:
+        itens = itens.filter(classificacao__classe_abc=classe_abc)
+    if classe_xyz in ClassificacaoItem.XYZ.values:
+        itens = itens.filter(classificacao__classe_xyz=classe_xyz)
+
+    # MELHORIA: paginação por chave (descrição, id), no índice de descrição, sem contar o catálogo inteiro
+    pagina = paginar_por_chave(
+        itens, campos=ordem, apos=request.GET.get("apos"), antes=request.GET.get("antes"), crescente=True
+    )
+    parametros = request.GET.copy()
+    for chave in ("apos", "antes"):
+        parametros.pop(chave, None)
 
     fornecedores = Fornecedor.objects.order_by("nome")
 
     return render(
         request,
         "estoque/item_list.html",
-        {"itens": itens, "fornecedores": fornecedores, "q": query, "fornecedor_id": fornecedor_id},
+        {
+            "itens": pagina,
+            "pagina": pagina,
+            "filtros_query": parametros.urlencode(),
+            "fornecedores": fornecedores,
+            "q": query,
+            "fornecedor_id": fornecedor_id,
+            "classes_abc": ClassificacaoItem.ABC.choices,
+            "classes_xyz": ClassificacaoItem.XYZ.choices,
+            "classe_abc": classe_abc,
+            "classe_xyz": classe_xyz,
+        },
+    )
+
+
+def _filtro_busca(query, prefixo=""):
+    """Q que restringe aos itens da busca indexada; ``prefixo`` aponta o item a partir de outro modelo."""
+    encontrados = buscar(query)
+    if encontrados is not None:
+        return models.Q(**{f"{prefixo}pk__in": encontrados.values("item_id")})
+    return (
+        models.Q(**{f"{prefixo}descricao__icontains": query})
+        | models.Q(**{f"{prefixo}codigo__icontains": query})
+        | models.Q(**{f"{prefixo}unidade_medida__icontains": query})
     )
 
 
+@login_required
+@somente_leitura
+def item_detail(request, pk):
+    item = get_object_or_404(Item.objects.select_related("fornecedor"), pk=pk)
+    estoques = Estoque.objects.order_by("localizacao")
+    estoque_id = request.GET.get("estoque")
+    estoque_selecionado = next((estoque for estoque in estoques if str(estoque.pk) == estoque_id), None)
+
+    # MELHORIA: saldo de cada estoque em uma consulta agrupada, sem um acesso por estoque
+    saldos = (
+        ItemEstoque.objects.filter(item=item)
+        .values("estoque_id", "estoque__localizacao")
+        .annotate(qtde=models.Sum("qtde"))
+        .order_by("estoque__localizacao")
+    )
+
+    # MELHORIA: histórico paginado por chave (data, id), no índice por item (ou por item e estoque)
+    movimentacoes = Movimentacao.objects.filter(item=item).select_related("estoque", "usuario")
+    if estoque_selecionado:
+        movimentacoes = movimentacoes.filter(estoque=estoque_selecionado)
+    pagina = paginar_por_chave(
+        movimentacoes,
+        campos=["data_movimentacao"],
+        apos=request.GET.get("apos"),
+        antes=request.GET.get("antes"),
+    )
+    filtros = {"estoque": estoque_selecionado.pk} if estoque_selecionado else {}
+    return render(
+        request,
+        "estoque/item_detail.html",
+        {
+            "item": item,
+            "saldos": saldos,
+            "estoque_selecionado": estoque_selecionado,
+            "movimentos": pagina,
+            "pagina": pagina,
+            "filtros_query": urlencode(filtros),
+            "dias_serie": serie_saldo.DIAS_PADRAO,
+        },
+    )
+
+
+@login_required
+def item_importar(request):
+    """Importa o catálogo de itens de um CSV ou XLSX (inserindo ou atualizando pelo código)."""
+    resultado = None
+    if request.method == "POST":
+        arquivo = request.FILES.get("arquivo")
+        if not arquivo:
+            messages.error(request, "Selecione um arquivo CSV ou XLSX para importar.")
+            return redirect("item_importar")
+        try:
+            resultado = importar_catalogo(ler_planilha(arquivo, arquivo.name))
+        except UnicodeDecodeError:
+            messages.error(request, "O arquivo CSV deve estar codificado em UTF-8.")
+        except PlanilhaInvalida as exc:
+            messages.error(request, str(exc))
+        except ValidationError as exc:
+            messages.error(request, " ".join(exc.messages))
+        else:
+            messages.success(
+                request,
+                f"{resultado.criados} itens criados e {resultado.atualizados} atualizados "
+                f"({resultado.linhas_por_segundo:.0f} linhas/s).",
+            )
+    return render(request, "estoque/item_importar.html", {"resultado": resultado})
+
+
 @login_required
 def item_create(request):
     form = ItemForm(request.POST or None)
@@ -94,35 +211,77 @@ def item_edit(request, pk):
 
 
 @login_required
+@somente_leitura
 def movimentacao_list(request):
-    movimentacoes = (
-        Movimentacao.objects.select_related("item", "estoque", "usuario")
-        .order_by("-data_movimentacao")
+    filtros = MovimentacaoFiltroForm(request.GET or None)
+    movimentacoes = Movimentacao.objects.select_related("item", "estoque", "usuario")
+    if filtros.is_valid():
+        movimentacoes = filtros.filtrar(movimentacoes)
+
+    # MELHORIA: paginação por chave (data, id) mantém o custo constante em qualquer página
+    pagina = paginar_por_chave(
+        movimentacoes,
+        campos=["data_movimentacao"],
+        apos=request.GET.get("apos"),
+        antes=request.GET.get("antes"),
+    )
+    parametros = request.GET.copy()
+    for chave in ("apos", "antes"):
+        parametros.pop(chave, None)
+
+    item_filtrado = filtros.cleaned_data.get("item") if filtros.is_bound and filtros.is_valid() else None
+    return render(
+        request,
+        "estoque/movimentacao_list.html",
+        {
+            "movimentacoes": pagina,
+            "pagina": pagina,
+            "filtros": filtros,
+            "filtros_query": parametros.urlencode(),
+            "item_filtrado": item_filtrado,
+        },
     )
-    return render(request, "estoque/movimentacao_list.html", {"movimentacoes": movimentacoes})
+
+
+@login_required
+@somente_leitura
+def movimentacao_exportar(request):
+    """Exporta as movimentações filtradas em CSV ou XLSX, enviando o arquivo à medida que é gerado."""
+    filtros = MovimentacaoFiltroForm(request.GET or None)
+    # O arquivo é gerado depois que a view retorna, já fora do roteamento da requisição: fixa o banco aqui
+    movimentacoes = Movimentacao.objects.using(router.db_for_read(Movimentacao))
+    if filtros.is_valid():
+        movimentacoes = filtros.filtrar(movimentacoes)
+
+    linhas = linhas_movimentacoes(movimentacoes)
+    nome = f"movimentacoes-{timezone.localdate():%Y%m%d}"
+    if request.GET.get("formato") == "xlsx":
+        resposta = StreamingHttpResponse(
+            xlsx_em_fluxo(CABECALHO_MOVIMENTACOES, linhas, nome_aba="Movimentações"),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        nome += ".xlsx"
+    else:
+        resposta = StreamingHttpResponse(
+            csv_em_fluxo(CABECALHO_MOVIMENTACOES, linhas), content_type="text/csv; charset=utf-8"
+        )
+        nome += ".csv"
+    resposta["Content-Disposition"] = f'attachment; filename="{nome}"'
+    return resposta
 
 
 @login_required
 def movimentacao_create(request):
     initial = {}
     # Trava estoque em Depósito Central (ou primeiro disponível)
-    central = (
-        Estoque.objects.filter(localizacao__iexact="Depósito Central").first()
-        or Estoque.objects.first()
-    )
+    # MELHORIA: resolvido uma vez e mantido em cache, em vez de duas consultas por requisição
+    central = estoque_padrao()
     if central:
         initial["estoque"] = central
     if request.GET.get("tipo"):
         initial["tipo_movimentacao"] = request.GET.get("tipo")
 
-    form = MovimentacaoForm(request.POST or None, initial=initial)
-    selected_item_id = ""
-    if request.method == "POST":
-        selected_item_id = request.POST.get("item", "")
-    else:
-        initial_item = form.initial.get("item")
-        if initial_item:
-            selected_item_id = getattr(initial_item, "id", initial_item)
+    form = MovimentacaoForm(request.POST or None, initial=initial, estoque=central)
 
     if request.method == "POST" and form.is_valid():
         try:
@@ -142,7 +301,7 @@ def movimentacao_create(request):
     return render(
         request,
         "estoque/movimentacao_form.html",
-        {"form": form, "selected_item_id": selected_item_id, "central_estoque": central},
+        {"form": form, "central_estoque": central},
     )
 
 
@@ -153,6 +312,7 @@ def logout_view(request):
 
 
 @login_required
+@somente_leitura
 def inventario_list(request):
     inventarios = Inventario.objects.select_related("usuario").order_by("-data_inventario")
     return render(request, "estoque/inventario_list.html", {"inventarios": inventarios})
@@ -170,41 +330,136 @@ def inventario_create(request):
     return render(request, "estoque/inventario_form.html", {"form": form})
 
 
+@login_required
+def inventario_create_classe_a(request):
+    """Cria um inventário já com os itens da classe A, para a contagem cíclica dos mais valiosos."""
+    if request.method != "POST":
+        return redirect("inventario_list")
+    try:
+        inventario, linhas = criar_inventario_por_classe(
+            usuario=request.user, observacao="Contagem cíclica dos itens classe A"
+        )
+    except ValidationError as exc:
+        messages.error(request, exc.messages[0])
+        return redirect("inventario_list")
+    messages.success(request, f"Inventário criado com {linhas} itens classe A. Registre as contagens.")
+    return redirect("inventario_detail", pk=inventario.pk)
+
+
 @login_required
 def inventario_detail(request, pk):
-    inventario = get_object_or_404(Inventario, pk=pk)
+    inventario = get_object_or_404(Inventario.objects.select_related("usuario", "estoque_encerramento"), pk=pk)
     form = InventarioItemForm(request.POST or None)
-    itens = InventarioItem.objects.select_related("item").filter(inventario=inventario)
-    estoques = Estoque.objects.order_by("localizacao")
+
+    if request.method == "POST" and inventario.encerrado_em:
+        messages.error(request, "Inventário encerrado: não é possível registrar novas contagens.")
+        return redirect("inventario_detail", pk=pk)
 
     # Contagem rápida por código
     if request.method == "POST" and request.POST.get("codigo_lookup"):
         codigo = request.POST.get("codigo_lookup").strip()
-        qtde_lookup = int(request.POST.get("qtde_lookup") or 0)
+        qtde_lookup = (request.POST.get("qtde_lookup") or "0").strip()
+        if not qtde_lookup.isdigit():
+            messages.error(request, "Informe uma quantidade inteira não negativa.")
+            return redirect("inventario_detail", pk=pk)
         try:
-            item = Item.objects.get(codigo=codigo)
-            inv_item, _ = InventarioItem.objects.get_or_create(inventario=inventario, item=item, defaults={"qtde_contada": 0})
-            inv_item.qtde_contada = qtde_lookup
-            inv_item.save()
-            messages.success(request, f"Contagem registrada para {item.descricao}.")
-        except Item.DoesNotExist:
+            _, nao_encontrados = registrar_contagens(inventario=inventario, contagens={codigo: int(qtde_lookup)})
+        except ValidationError as exc:
+            # Encerrado por outro usuário depois da leitura acima
+            messages.error(request, exc.message)
+            return redirect("inventario_detail", pk=pk)
+        if nao_encontrados:
             messages.error(request, "Item não encontrado para o código informado.")
+        else:
+            messages.success(request, f"Contagem registrada para o código {codigo}.")
         return redirect("inventario_detail", pk=pk)
 
     if request.method == "POST" and form.is_valid():
-        inv_item = form.save(commit=False)
-        inv_item.inventario = inventario
-        inv_item.save()
+        try:
+            registrar_contagens(
+                inventario=inventario,
+                contagens={form.cleaned_data["item"].codigo: form.cleaned_data["qtde_contada"]},
+            )
+        except ValidationError as exc:
+            messages.error(request, exc.message)
+            return redirect("inventario_detail", pk=pk)
         messages.success(request, "Contagem registrada no inventário.")
         return redirect("inventario_detail", pk=pk)
 
+    estoques = Estoque.objects.order_by("localizacao")
+    estoque = _estoque_conferencia(inventario, request.GET.get("estoque"), estoques)
+    query = request.GET.get("q", "").strip()
+    somente_divergentes = request.GET.get("divergentes") == "1"
+
+    # MELHORIA: só a página atual é carregada; o resumo vem de uma consulta agregada
+    linhas = linhas_inventario(inventario, estoque)
+    if query:
+        linhas = linhas.filter(_filtro_busca(query, prefixo="item__"))
+    if somente_divergentes:
+        linhas = linhas.filter(models.Q(divergencia__lt=0) | models.Q(divergencia__gt=0))
+    pagina = Paginator(linhas.order_by("-pk"), TAMANHO_PAGINA_INVENTARIO).get_page(request.GET.get("pagina"))
+
+    filtros = {"estoque": estoque.pk if estoque else "", "q": query}
+    if somente_divergentes:
+        filtros["divergentes"] = "1"
     return render(
         request,
         "estoque/inventario_detail.html",
-        {"inventario": inventario, "form": form, "itens": itens, "estoques": estoques},
+        {
+            "inventario": inventario,
+            "form": form,
+            "pagina": pagina,
+            "itens": pagina.object_list,
+            "resumo": resumo_inventario(inventario, estoque),
+            "estoques": estoques,
+            "estoque": estoque,
+            "q": query,
+            "somente_divergentes": somente_divergentes,
+            "filtros_query": urlencode(filtros),
+        },
     )
 
 
+def _estoque_conferencia(inventario, estoque_id, estoques):
+    """Estoque contra o qual as contagens são comparadas: o do encerramento, o escolhido ou o padrão."""
+    if inventario.encerrado_em:
+        return inventario.estoque_encerramento
+    if estoque_id:
+        escolhido = next((estoque for estoque in estoques if str(estoque.pk) == estoque_id), None)
+        if escolhido:
+            return escolhido
+    return estoque_padrao()
+
+
+@login_required
+def inventario_importar(request, pk):
+    """Importa contagens de um CSV (código;quantidade) para o inventário."""
+    inventario = get_object_or_404(Inventario, pk=pk)
+    arquivo = request.FILES.get("arquivo")
+    if request.method != "POST" or not arquivo:
+        messages.error(request, "Selecione um arquivo CSV para importar.")
+        return redirect("inventario_detail", pk=pk)
+
+    try:
+        contagens, erros = ler_contagens_csv(arquivo)
+    except UnicodeDecodeError:
+        contagens, erros = {}, ["O arquivo deve estar codificado em UTF-8."]
+    if erros:
+        messages.error(request, "Nada foi importado. " + " ".join(erros))
+        return redirect("inventario_detail", pk=pk)
+
+    try:
+        registradas, nao_encontrados = registrar_contagens(inventario=inventario, contagens=contagens)
+    except ValidationError as exc:
+        messages.error(request, exc.message)
+        return redirect("inventario_detail", pk=pk)
+    messages.success(request, f"{registradas} contagens importadas.")
+    if nao_encontrados:
+        exemplos = ", ".join(nao_encontrados[:10])
+        messages.warning(request, f"{len(nao_encontrados)} códigos não encontrados: {exemplos}.")
+    return redirect("inventario_detail", pk=pk)
+
+
 @login_required
 def inventario_encerrar(request, pk):
     inventario = get_object_or_404(Inventario, pk=pk)
@@ -216,38 +471,63 @@ def inventario_encerrar(request, pk):
         messages.error(request, "Selecione um estoque para aplicar os ajustes.")
         return redirect("inventario_detail", pk=pk)
 
-    ajustes_criados = 0
-    for inv_item in inventario.itens.select_related("item"):
-        saldo = (
-            ItemEstoque.objects.filter(item=inv_item.item, estoque=estoque)
-            .aggregate(total=Coalesce(Sum("qtde"), 0))
-            .get("total")
-            or 0
-        )
-        diff = inv_item.qtde_contada - saldo
-        if diff == 0:
-            continue
-        try:
-            registrar_movimentacao(
-                usuario=request.user,
-                item=inv_item.item,
-                estoque=estoque,
-                tipo_movimentacao=Movimentacao.Tipo.AJUSTE if diff > 0 else Movimentacao.Tipo.SAIDA,
-                quantidade=abs(diff),
-                observacao=f"Ajuste inventário {inventario.id}",
-            )
-            ajustes_criados += 1
-        except ValidationError as exc:
-            messages.error(request, f"Erro ao ajustar {inv_item.item}: {exc.message}")
-    if ajustes_criados:
-        messages.success(request, f"Inventário encerrado com {ajustes_criados} ajustes.")
+    # MELHORIA: diferenças calculadas em uma consulta e ajustes gravados em lote, numa única transação
+    resultado = encerrar_inventario(inventario=inventario, estoque=estoque, usuario=request.user)
+    if resultado.ja_encerrado:
+        messages.info(request, "Inventário já havia sido encerrado; nenhum ajuste foi criado.")
+    elif resultado.ajustes:
+        messages.success(request, f"Inventário encerrado com {resultado.ajustes} ajustes.")
     else:
         messages.info(request, "Inventário encerrado sem ajustes necessários.")
     return redirect("inventario_detail", pk=pk)
 
 
+@login_required
+@somente_leitura
+def relatorio_cmv(request):
+    """Relatório de custo de uso (CMV) pelo inventário periódico."""
+    hoje = timezone.localdate()
+    form = PeriodoForm(request.GET or {"data_inicio": hoje.replace(day=1), "data_fim": hoje})
+    contexto = {"form": form}
+    if form.is_valid():
+        data_inicio, data_fim = form.cleaned_data["data_inicio"], form.cleaned_data["data_fim"]
+        contexto.update(calcular_relatorio_cmv(data_inicio, data_fim))
+        contexto.update({"data_inicio": data_inicio.isoformat(), "data_fim": data_fim.isoformat()})
+    else:
+        contexto.update({"data_inicio": request.GET.get("data_inicio", ""), "data_fim": request.GET.get("data_fim", "")})
+        messages.error(request, " ".join(form.errors.get("__all__", ["Informe um período válido."])))
+    return render(request, "estoque/relatorio_cmv.html", contexto)
+
+
+@login_required
+@somente_leitura
+def relatorio_reposicao(request):
+    """Sugestões de compra por fornecedor, a partir do consumo recente (ver reposicao.py)."""
+    padrao = reposicao.parametros_padrao()
+    form = ReposicaoForm(request.GET or {chave: padrao[chave] for chave in ("janela", "prazo", "cobertura")})
+    contexto = {"form": form}
+    if form.is_valid():
+        # MELHORIA: cálculo vetorizado sobre todos os itens, guardado em cache por alguns minutos
+        resultado = reposicao.relatorio(**form.cleaned_data)
+        fornecedor_id = request.GET.get("fornecedor")
+        grupos = resultado["fornecedores"]
+        if fornecedor_id:
+            grupos = [grupo for grupo in grupos if str(grupo["fornecedor_id"] or 0) == fornecedor_id]
+        else:
+            # Visão geral: só os itens mais urgentes de cada fornecedor; o filtro mostra a lista completa
+            grupos = [
+                {**grupo, "itens": grupo["itens"][:LIMITE_ITENS_REPOSICAO], "ocultos": len(grupo["itens"]) - LIMITE_ITENS_REPOSICAO}
+                for grupo in grupos
+            ]
+        contexto.update({"resultado": resultado, "grupos": grupos, "fornecedor_id": fornecedor_id or ""})
+    else:
+        messages.error(request, "Parâmetros inválidos; verifique os limites de cada campo.")
+    return render(request, "estoque/relatorio_reposicao.html", contexto)
+
+
 # --- CRUD de Fornecedor ---
 @login_required
+@somente_leitura
 def fornecedor_list(request):
     fornecedores = Fornecedor.objects.order_by("nome")
     return render(request, "estoque/fornecedor_list.html", {"fornecedores": fornecedores})
@@ -286,17 +566,18 @@ def fornecedor_delete(request, pk):
 
 # --- APIs auxiliares para UX ---
 @login_required
+@somente_leitura
 def api_item_search(request):
     """Busca rápida para autocomplete de itens."""
     q = request.GET.get("q", "").strip()
-    itens = Item.objects.all()
     if q:
-        itens = itens.filter(models.Q(descricao__icontains=q) | models.Q(codigo__icontains=q))
-    itens = itens.order_by("descricao")[:15]
+        itens = buscar_itens(q, limite=15)
+    else:
+        itens = Item.objects.order_by("descricao")[:15]
     data = [
         {
             "id": item.id,
-            "text": f"{item.codigo} - {item.descricao}" if item.codigo else item.descricao,
+            "text": rotulo(item),
         }
         for item in itens
     ]
@@ -310,26 +591,202 @@ def api_item_saldo(request):
     estoque_id = request.GET.get("estoque")
     if not item_id or not estoque_id:
         return JsonResponse({"error": "Parâmetros faltando"}, status=400)
+    try:
+        par = (int(item_id), int(estoque_id))
+    except ValueError:
+        return JsonResponse({"error": "Parâmetros inválidos"}, status=400)
+
+    dados = saldo_cache.saldos([par])[par]
+    if dados is None:
+        return JsonResponse({"error": "Item não encontrado"}, status=404)
+    return _resposta_condicional(request, dados)
+
+
+@login_required
+def api_item_saldos(request):
+    """
+    Retorna vários saldos em uma requisição: ?pares=item:estoque,item:estoque,...
+    Pares de itens inexistentes voltam com "error" em vez dos dados.
+    """
+    try:
+        pares = [
+            tuple(int(valor) for valor in par.split(":", 1))
+            for par in request.GET.get("pares", "").split(",")
+            if par
+        ]
+    except ValueError:
+        return JsonResponse({"error": "Parâmetros inválidos"}, status=400)
+    if not pares or any(len(par) != 2 for par in pares):
+        return JsonResponse({"error": "Parâmetros faltando"}, status=400)
+    if len(pares) > LIMITE_PARES_SALDO:
+        return JsonResponse({"error": f"Informe no máximo {LIMITE_PARES_SALDO} pares"}, status=400)
+
+    encontrados = saldo_cache.saldos(pares)
+    saldos = []
+    for item_id, estoque_id in pares:
+        dados = encontrados[(item_id, estoque_id)]
+        if dados is None:
+            saldos.append({"item": item_id, "estoque": estoque_id, "error": "Item não encontrado"})
+        else:
+            saldos.append({"item": item_id, "estoque": estoque_id, **dados})
+    return _resposta_condicional(request, {"saldos": saldos})
+
+
+def _resposta_condicional(request, dados):
+    """JsonResponse com ETag do conteúdo; devolve 304 quando o If-None-Match confere."""
+    resposta = JsonResponse(dados)
+    etag = quote_etag(hashlib.md5(resposta.content, usedforsecurity=False).hexdigest())
+    resposta["ETag"] = etag
+    # MELHORIA: no-cache obriga o navegador a revalidar, mas permite reaproveitar o corpo via 304
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=resposta)
+
 
+@login_required
+def api_item_serie_saldo(request, pk):
+    """
+    Saldo diário do item reduzido a poucos pontos, para o gráfico do detalhe:
+    ?dias=365&pontos=90&estoque=<id> (estoque opcional; sem ele, todos).
+    """
     try:
-        item = Item.objects.get(pk=item_id)
-        saldo = (
-            item.estoques.filter(estoque_id=estoque_id)
-            .aggregate(total=Coalesce(Sum("qtde"), 0))
-            .get("total")
-            or 0
+        dias = int(request.GET.get("dias") or serie_saldo.DIAS_PADRAO)
+        pontos = int(request.GET.get("pontos") or serie_saldo.PONTOS_PADRAO)
+        estoque_id = int(request.GET["estoque"]) if request.GET.get("estoque") else None
+    except ValueError:
+        return JsonResponse({"error": "Parâmetros inválidos"}, status=400)
+    if not 1 <= dias <= serie_saldo.MAXIMO_DIAS or not 1 <= pontos <= serie_saldo.MAXIMO_PONTOS:
+        return JsonResponse(
+            {"error": f"Use até {serie_saldo.MAXIMO_DIAS} dias e {serie_saldo.MAXIMO_PONTOS} pontos"}, status=400
         )
-    except Item.DoesNotExist:
+    if not Item.objects.filter(pk=pk).exists():
         return JsonResponse({"error": "Item não encontrado"}, status=404)
 
-    return JsonResponse(
-        {
-            "saldo": saldo,
-            "estoque_minimo": item.estoque_minimo,
-            "estoque_maximo": item.estoque_maximo,
-            "unidade_medida": item.unidade_medida,
-        }
-    )
+    # MELHORIA: série em cache por item, descartada quando o item é movimentado
+    dados = serie_saldo.serie(pk, dias=dias, pontos=pontos, estoque_id=estoque_id)
+    return _resposta_condicional(request, {"item": pk, "estoque": estoque_id, "dias": dias, **dados})
+
+
+@login_required
+def api_movimentacoes_lote(request):
+    """
+    Registra várias movimentações (ex.: linhas de uma nota fiscal) em uma única transação.
+
+    Espera um JSON no formato {"movimentacoes": [{"item": id, "estoque": id,
+    "tipo_movimentacao": "ENTRADA", "quantidade": 10, "observacao": "NF 123"}, ...]}.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Método não permitido"}, status=405)
+    try:
+        linhas = json.loads(request.body).get("movimentacoes")
+    except (ValueError, AttributeError):
+        linhas = None
+    if not isinstance(linhas, list) or not linhas:
+        return JsonResponse({"error": "Informe a lista 'movimentacoes'."}, status=400)
+
+    movimentacoes, erros = _ler_movimentacoes_lote(linhas)
+    if erros:
+        return JsonResponse({"errors": erros}, status=400)
+
+    try:
+        movimentos = registrar_movimentacoes_em_lote(usuario=request.user, movimentacoes=movimentacoes)
+    except ValidationError as exc:
+        return JsonResponse({"errors": exc.messages}, status=400)
+    return JsonResponse({"registradas": len(movimentos), "ids": [mov.pk for mov in movimentos]}, status=201)
+
+
+def _ler_movimentacoes_lote(linhas):
+    """Converte as linhas do JSON em movimentações, resolvendo itens e estoques com uma consulta cada."""
+    def _ids(campo):
+        return {linha.get(campo) for linha in linhas if isinstance(linha, dict) and isinstance(linha.get(campo), int)}
+
+    itens = Item.objects.in_bulk(_ids("item"))
+    estoques = Estoque.objects.in_bulk(_ids("estoque"))
+    movimentacoes, erros = [], []
+    for numero, linha in enumerate(linhas, start=1):
+        if not isinstance(linha, dict):
+            erros.append(f"Linha {numero}: formato inválido.")
+            continue
+        item = itens.get(linha.get("item"))
+        estoque = estoques.get(linha.get("estoque"))
+        tipo = linha.get("tipo_movimentacao")
+        quantidade = linha.get("quantidade")
+        observacao = linha.get("observacao") or ""
+        if item is None:
+            erros.append(f"Linha {numero}: item não encontrado.")
+        elif estoque is None:
+            erros.append(f"Linha {numero}: estoque não encontrado.")
+        elif tipo not in Movimentacao.Tipo.values:
+            erros.append(f"Linha {numero}: tipo de movimentação inválido.")
+        elif not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade <= 0:
+            erros.append(f"Linha {numero}: a quantidade deve ser maior que zero.")
+        elif not isinstance(observacao, str) or len(observacao) > 100:
+            erros.append(f"Linha {numero}: observação deve ter no máximo 100 caracteres.")
+        else:
+            movimentacoes.append(
+                {
+                    "item": item,
+                    "estoque": estoque,
+                    "tipo_movimentacao": tipo,
+                    "quantidade": quantidade,
+                    "observacao": observacao,
+                }
+            )
+    return movimentacoes, erros
+
+
+@login_required
+def api_inventario_contagens(request, pk):
+    """
+    Recebe leituras de coletores para o inventário e grava todas de uma vez.
+
+    Espera um JSON no formato {"contagens": [{"codigo": "ABC-1", "qtde": 3}, ...]};
+    cada leitura substitui a quantidade contada do item. Códigos desconhecidos
+    voltam em "nao_encontrados" sem impedir a gravação das demais leituras.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Método não permitido"}, status=405)
+    inventario = get_object_or_404(Inventario, pk=pk)
+    try:
+        leituras = json.loads(request.body).get("contagens")
+    except (ValueError, AttributeError):
+        leituras = None
+    if not isinstance(leituras, list) or not leituras:
+        return JsonResponse({"error": "Informe a lista 'contagens'."}, status=400)
+    if len(leituras) > LIMITE_CONTAGENS_LOTE:
+        return JsonResponse({"error": f"Envie no máximo {LIMITE_CONTAGENS_LOTE} leituras por requisição."}, status=400)
+
+    contagens, erros = {}, []
+    for numero, leitura in enumerate(leituras, start=1):
+        codigo = leitura.get("codigo") if isinstance(leitura, dict) else None
+        qtde = leitura.get("qtde") if isinstance(leitura, dict) else None
+        if not isinstance(codigo, str) or not codigo.strip():
+            erros.append(f"Leitura {numero}: código inválido.")
+        elif not isinstance(qtde, int) or isinstance(qtde, bool) or qtde < 0:
+            erros.append(f"Leitura {numero}: a quantidade deve ser um inteiro não negativo.")
+        else:
+            contagens[codigo.strip()] = qtde
+    if erros:
+        return JsonResponse({"errors": erros}, status=400)
+
+    try:
+        registradas, nao_encontrados = registrar_contagens(inventario=inventario, contagens=contagens)
+    except ValidationError as exc:
+        return JsonResponse({"error": exc.message}, status=409)
+    return JsonResponse({"registradas": registradas, "nao_encontrados": nao_encontrados})
+
+
+@login_required
+def api_inventario_resumo(request, pk):
+    """Resumo das contagens do inventário, para atualizar a tela enquanto os coletores enviam leituras."""
+    inventario = get_object_or_404(Inventario, pk=pk)
+    estoque = _estoque_conferencia(inventario, request.GET.get("estoque"), Estoque.objects.all())
+    return JsonResponse(resumo_inventario(inventario, estoque))
+
+
+@login_required
+def api_kpis_estatisticas(request):
+    """Acertos e falhas do cache de indicadores do dashboard neste processo."""
+    return JsonResponse(kpis.estatisticas())
 
 
 @login_required